@@ -2,11 +2,12 @@ import json
 import time
 import sys
 import boto3
-import re
 
 from botocore.config import Config
-from .Polly import Reader
+from .Polly import tts_service
 from .config import config
+from .request_builder import current_profile, new_body
+from .sentences import SentenceSegmenter
 
 # 初始化AWS服务客户端
 bedrock_runtime = boto3.client(
@@ -26,18 +27,21 @@ class BedrockModelsWrapper:
     """
 
     @staticmethod
-    def define_body(text, dialogue_list = [], images = []):
+    def define_body(text, dialogue_list = [], images = [], overrides = None, profile = None):
         """
         定义请求体
-        功能描述：根据不同的模型提供者定义请求体
+        功能描述：根据不同的模型提供者定义请求体（每次调用都是新的dict，不会改动全局配置）
         :param text: 输入文本
         :param dialogue_list: 从历史会话管理库中获取的列表，元素为会话块字典{role,content}
         :param images: 输入图片的列表，元素为字典{media_type, data}
+        :param overrides: 仅对本次调用生效的参数，如 {'max_tokens': 32}
+        :param profile: 模型配置快照，默认取当前配置
         :return: 请求体
         """
-        model_id = config['bedrock']['api_request']['modelId']
+        profile = profile if profile is not None else current_profile()
+        model_id = profile['modelId']
         model_provider = model_id.split('.')[0]
-        body = config['bedrock']['api_request']['body']
+        body = new_body(overrides, profile)
 
         if model_provider == 'amazon':
             body['inputText'] = text
@@ -140,29 +144,20 @@ class BedrockModelsWrapper:
 
 # 音频生成器函数（支持中英文断句）-> 保留这个名字属实是有点传承的意味了（笑）
 def to_audio_generator(bedrock_stream):
-    prefix = ''
-    sentence_end_pattern = re.compile(r'([^。！？!?\.]+[。！？!?\.])')  # 捕获完整句子
+    segmenter = SentenceSegmenter()  # 增量断句，每个字符只扫描一次
 
     if bedrock_stream:
         for event in bedrock_stream:
             chunk = BedrockModelsWrapper.get_stream_chunk(event)
             if chunk:
                 text = BedrockModelsWrapper.get_stream_text(chunk)
-                full_text = prefix + text
-                sentences = sentence_end_pattern.findall(full_text)
-                if sentences:
-                    # 找到完整句子后，逐句生成
-                    for sent in sentences:
-                        yield sent
-                    # 将未结束的部分存入 prefix
-                    prefix = sentence_end_pattern.sub('', full_text)
-                else:
-                    prefix = full_text  # 没有匹配到句子，继续累积
+                # 找到完整句子后，逐句生成；未结束的部分留在断句器中
+                yield from segmenter.feed(text)
         
         # 流结束后，处理剩余内容
-        if prefix:
-            print(prefix, flush=True, end='')
-            yield prefix
+        for rest in segmenter.flush():
+            print(rest, flush=True, end='')
+            yield rest
 
         print('\n')
 
@@ -180,23 +175,24 @@ class BedrockWrapper:
         """
         return self.speaking
 
-    def invoke_bedrock(self, text, dialogue_list=[], images=[]):
+    def invoke_bedrock(self, text, dialogue_list=[], images=[], overrides=None):
         """
         流式调用Bedrock模型，边生成边yield文本块
         """
         printer('[DEBUG] Bedrock generation started', 'debug')
         self.speaking = True
 
-        body = BedrockModelsWrapper.define_body(text, dialogue_list, images)
+        profile = current_profile()
+        body = BedrockModelsWrapper.define_body(text, dialogue_list, images, overrides, profile)
         printer(f"[DEBUG] Request body: {body}", 'debug')
 
         try:
             body_json = json.dumps(body)
             response = bedrock_runtime.invoke_model_with_response_stream(
                 body=body_json,
-                modelId=config['bedrock']['api_request']['modelId'],
-                accept=config['bedrock']['api_request']['accept'],
-                contentType=config['bedrock']['api_request']['contentType']
+                modelId=profile['modelId'],
+                accept=profile['accept'],
+                contentType=profile['contentType']
             )
 
             bedrock_stream = response.get('body')
@@ -217,13 +213,41 @@ class BedrockWrapper:
             if "timeout" in str(e).lower():
                 printer('[INFO] Timeout detected, attempting retry...', 'info')
                 # ⚠️ 注意：递归生成器必须用 yield from
-                yield from self.invoke_bedrock(text, dialogue_list, images)
+                yield from self.invoke_bedrock(text, dialogue_list, images, overrides)
 
         time.sleep(1)
         self.speaking = False
         printer('\n[DEBUG] Bedrock generation completed', 'debug')
 
-    def invoke_voice(self, text, dialogue_list = [], images = []):
+    def stream_sentences(self, text, dialogue_list=[], images=[], overrides=None):
+        """
+        供SSE接口使用的流式调用，逐句yield
+        与 invoke_bedrock 不同：异常直接抛给调用方；只有在还没有产出任何句子时才因超时重试
+        （已推送给前端的句子不会重复），结束时也不额外等待
+        """
+        profile = current_profile()
+        body_json = json.dumps(BedrockModelsWrapper.define_body(text, dialogue_list, images, overrides, profile))
+        attempts = config['network']['max_retries']
+        for attempt in range(attempts):
+            started = False
+            try:
+                response = bedrock_runtime.invoke_model_with_response_stream(
+                    body=body_json,
+                    modelId=profile['modelId'],
+                    accept=profile['accept'],
+                    contentType=profile['contentType']
+                )
+                for sentence in to_audio_generator(response.get('body')):
+                    started = True
+                    yield sentence
+                return
+            except Exception as e:
+                if started or 'timeout' not in str(e).lower() or attempt == attempts - 1:
+                    raise
+                printer(f'[INFO] Timeout detected, attempting retry ({attempt + 1}/{attempts - 1})...', 'info')
+                time.sleep(config['network']['retry_delay'])
+
+    def invoke_voice(self, text, dialogue_list = [], images = [], overrides = None):
         """
         调用Bedrock模型
         功能描述：调用Bedrock模型并处理响应
@@ -232,17 +256,19 @@ class BedrockWrapper:
         """
         printer('[DEBUG] Bedrock generation started', 'debug')
         self.speaking = True
+        response_text = ''
         
-        body = BedrockModelsWrapper.define_body(text, dialogue_list, images)
+        profile = current_profile()
+        body = BedrockModelsWrapper.define_body(text, dialogue_list, images, overrides, profile)
         printer(f"[DEBUG] Request body: {body}", 'debug')
 
         try:
             body_json = json.dumps(body)
             response = bedrock_runtime.invoke_model_with_response_stream(
                 body=body_json,
-                modelId=config['bedrock']['api_request']['modelId'],
-                accept=config['bedrock']['api_request']['accept'],
-                contentType=config['bedrock']['api_request']['contentType']
+                modelId=profile['modelId'],
+                accept=profile['accept'],
+                contentType=profile['contentType']
             )
 
             printer('[DEBUG] Capturing Bedrocks response/bedrock_stream', 'debug')
@@ -252,15 +278,19 @@ class BedrockWrapper:
             audio_gen = to_audio_generator(bedrock_stream)
             printer('[DEBUG] Created bedrock stream to audio generator', 'debug')
 
-            reader = Reader()
-            response_text = ''
-            print("[Assistant]:",end="")
-            for audio in audio_gen:
-                print(audio,end='',flush=False)
-                reader.read(audio) # 没有读出来是为何🤔
-                response_text += audio
+            # 流水线朗读：当前句播放时后续句子已在合成
+            reader = tts_service.stream(interrupt=True)
+            try:
+                print("[Assistant]:",end="")
+                for audio in audio_gen:
+                    print(audio,end='',flush=False)
+                    reader.feed(audio)
+                    response_text += audio
 
-            reader.close()
+                reader.close()
+            finally:
+                if not reader.wait(0):
+                    reader.cancel()  # 中途出错或被打断时结束播放任务，不让它占住 tts_service 的工作线程
 
         except Exception as e:
             printer(f'[ERROR] {str(e)}', 'info')
@@ -269,24 +299,32 @@ class BedrockWrapper:
             # 发生异常时尝试重试
             if "timeout" in str(e).lower():
                 printer('[INFO] Timeout detected, attempting retry...', 'info')
-                return self.invoke_bedrock(text, dialogue_list, images)
+                return self.invoke_bedrock(text, dialogue_list, images, overrides)
 
         time.sleep(1)
         self.speaking = False
         printer('\n[DEBUG] Bedrock generation completed', 'debug')
         return response_text
 
-    def invoke_model(self, text, dialogue_list = [], images = []):
-        body = BedrockModelsWrapper.define_body(text, dialogue_list, images)
+    def invoke_model(self, text, dialogue_list = [], images = [], return_usage = False, overrides = None):
+        """
+        非流式调用Bedrock模型
+        :param return_usage: 为True时同时返回模型统计的token用量 (text, usage)
+        :param overrides: 仅对本次调用生效的请求参数，如 {'max_tokens': 32}
+        """
+        profile = current_profile()
+        body = BedrockModelsWrapper.define_body(text, dialogue_list, images, overrides, profile)
         body_json = json.dumps(body)
         response = bedrock_runtime.invoke_model(
             body=body_json,
-            modelId=config['bedrock']['api_request']['modelId'],
-            accept=config['bedrock']['api_request']['accept'],
-            contentType=config['bedrock']['api_request']['contentType']
+            modelId=profile['modelId'],
+            accept=profile['accept'],
+            contentType=profile['contentType']
         )
 
         response_body = json.loads(response['body'].read())
+        if return_usage:
+            return response_body['content'][0]['text'], response_body.get('usage', {})
         return response_body['content'][0]['text']
 
 def printer(text: str, level: str) -> None:
@@ -1,122 +1,327 @@
+import atexit
+import os
+import queue
 import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
 import boto3
-import pyaudio
 from AWS_Service.config import config
+from AWS_Service.sentences import split_sentences
+from AWS_Service.tts_cache import pcm_cache
 
-class Reader(threading.Thread):
-    def __init__(self, text):
-        super().__init__()
-        self.text = text
-        self.polly = boto3.client('polly', region_name=config['region'])
-        self.p = pyaudio.PyAudio()
-        self.audio_stream = None  # AWS Polly返回的音频流
-        self.output_stream = None  # PyAudio输出流
-        self.chunk = 1024
-        self._stop_event = threading.Event()
+PREFETCH_SENTENCES = 2  # 当前句播放时最多提前合成的句数
+READ_PREFETCH = 3  # 朗读整段文本时最多提前合成的片段数
+SYNTH_WORKERS = READ_PREFETCH + 1  # 共享合成线程池大小，即同时进行的Polly请求上限
+BYTES_PER_SECOND = 16000 * 2  # 16kHz 单声道 16bit PCM
+IDLE_TIMEOUT = 60  # 播放任务超过这么多秒既没有新句子也没有 close()，视为调用方已放弃，自动结束
+AUDIO_SINK = os.getenv('NEXT_AUDIO_SINK', 'pyaudio')  # 'pyaudio' 或 'null'（无声卡的服务器/测试）
+_CLOSE = object()  # 输入结束标记
+
+def synthesize_pcm(polly, text, cache=pcm_cache):
+    """合成一段文本，返回完整的PCM音频字节；磁盘缓存中已有时不调用Polly"""
+    voice = dict(config['polly'])  # 取一次快照，避免合成途中切换语音导致缓存键与音频不一致
+    if cache is not None:
+        cached = cache.get(text, voice)
+        if cached is not None:
+            return cached
+    response = polly.synthesize_speech(
+        Text=text,
+        Engine=voice['Engine'],
+        LanguageCode=voice['LanguageCode'],
+        VoiceId=voice['VoiceId'],
+        OutputFormat=voice['OutputFormat'],
+    )
+    with closing(response['AudioStream']) as stream:
+        data = stream.read()
+    if cache is not None:
+        cache.put(text, data, voice)
+    return data
+
+
+class NullAudioSink:
+    """丢弃音频的输出；realtime=True 时按音频时长等待，模拟真实播放的节奏"""
+    def __init__(self, realtime=False):
+        self.realtime = realtime
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        if self.realtime:
+            time.sleep(len(data) / BYTES_PER_SECOND)
+
+    def close(self):
+        pass
+
+
+class PyAudioSink:
+    """进程内唯一的PyAudio实例与输出流，第一次播放时打开，之后一直复用；设备出错时关闭，下次播放重新打开"""
+    def __init__(self):
+        self._pyaudio = None
+        self._stream = None
         self._lock = threading.Lock()
-        self._is_playing = False
 
-    def is_playing(self):
-        """检查是否正在播放"""
+    def write(self, data):
         with self._lock:
-            return self._is_playing
+            if self._stream is None:
+                import pyaudio
+                self._pyaudio = self._pyaudio or pyaudio.PyAudio()
+                self._stream = self._pyaudio.open(format=pyaudio.paInt16, channels=1, rate=16000, output=True)
+            try:
+                self._stream.write(data)
+            except OSError:
+                self._close_stream()
+                raise
 
-    def run(self):
-        """在后台线程中执行语音合成和播放"""
+    def _close_stream(self):
         try:
-            # 获取语音合成响应
-            response = self.polly.synthesize_speech(
-                Text=self.text,
-                Engine=config['polly']['Engine'],
-                LanguageCode=config['polly']['LanguageCode'],
-                VoiceId=config['polly']['VoiceId'],
-                OutputFormat=config['polly']['OutputFormat'],
-            )
-            self.audio_stream = response['AudioStream']
-            
-            # 初始化输出流
-            with self._lock:
-                self.output_stream = self.p.open(
-                    format=pyaudio.paInt16,
-                    channels=1,
-                    rate=16000,
-                    output=True,
-                    start=False
-                )
-                self._is_playing = True
-
-            # 流式播放音频
-            while not self._stop_event.is_set():
-                data = self.audio_stream.read(self.chunk)
-                if not data:
-                    break
-                
-                with self._lock:
-                    if self.output_stream.is_stopped():
-                        self.output_stream.start_stream()
-                    self.output_stream.write(data)
+            self._stream.stop_stream()
+            self._stream.close()
+        except OSError as e:
+            print(f"关闭输出流时忽略错误: {str(e)}")
+        finally:
+            self._stream = None
+
+    def close(self):
+        with self._lock:
+            if self._stream is not None:
+                self._close_stream()
+            if self._pyaudio is not None:
+                self._pyaudio.terminate()
+                self._pyaudio = None
+
+def make_sink(kind=AUDIO_SINK):
+    if kind == 'null':
+        return NullAudioSink()
+    if kind == 'pyaudio':
+        return PyAudioSink()
+    raise ValueError(f"未知的音频输出: {kind}")
+
+
+class SpeechPipeline:
+    """
+    句子级流水线TTS：当前句播放的同时，后面至多 prefetch 句已在并发合成，句与句之间不再有整段Polly往返的空白
+    - feed() 只把句子放进队列，不阻塞调用方（如正在读取的Bedrock流）
+    - 播放严格按 feed 的顺序进行；某句合成失败时跳过该句
+    - cancel() 立即停止播放并丢弃尚未播放的句子；close() 等待所有句子播放完毕
+    - 调用方忘记 close()（如异常路径）时，空闲 idle_timeout 秒后自动结束，不会永远占住 TTSService 的工作线程
+    播放循环 run() 一般由 TTSService 的工作线程执行，也可以 start() 在独立线程中运行
+    """
+    def __init__(self, polly, output_stream, prefetch=PREFETCH_SENTENCES, chunk=1024, executor=None,
+                 cache=pcm_cache, idle_timeout=IDLE_TIMEOUT):
+        """
+        :param polly: Polly客户端
+        :param output_stream: 提供 write(bytes) 的输出（16kHz单声道PCM）
+        :param executor: 用于合成的线程池，默认新建一个只属于本流水线的
+        :param cache: PCM磁盘缓存，None 表示不使用缓存
+        :param idle_timeout: 没有输入也没有 close() 时最多等待的秒数，None 表示一直等待
+        """
+        self.polly = polly
+        self.output_stream = output_stream
+        self.prefetch = prefetch
+        self.chunk = chunk
+        self.cache = cache
+        self.idle_timeout = idle_timeout
+        self._last_input = time.monotonic()
+        self._texts = queue.Queue()
+        self._inflight = deque()  # 已提交合成、按播放顺序排列的Future
+        self._closed = False
+        self._cancelled = threading.Event()
+        self._started = threading.Event()
+        self._finished = threading.Event()
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=prefetch + 1, thread_name_prefix='polly-synth')
+
+    def start(self):
+        threading.Thread(target=self.run, name='speech-player', daemon=True).start()
+        return self
+
+    def feed(self, sentence):
+        if sentence and sentence.strip() and not self._cancelled.is_set():
+            self._last_input = time.monotonic()
+            self._texts.put(sentence)
+
+    def close(self, timeout=None):
+        """输入结束，等待剩余句子播放完"""
+        self._texts.put(_CLOSE)
+        return self.wait(timeout)
+
+    def wait(self, timeout=None):
+        """等待播放结束，返回是否已结束"""
+        return self._finished.wait(timeout)
+
+    def cancel(self):
+        self._cancelled.set()
+        self._texts.put(_CLOSE)
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def is_playing(self):
+        return self._started.is_set() and not self._finished.is_set()
+
+    def _refill(self, block=False):
+        """把等待中的句子提交合成，直到预取窗口（播放中的一句 + prefetch句）填满"""
+        while not self._closed and len(self._inflight) <= self.prefetch:
+            try:
+                text = self._texts.get(timeout=0.1) if block and not self._inflight else self._texts.get_nowait()
+            except queue.Empty:
+                return
+            if text is _CLOSE:
+                self._closed = True
+            else:
+                self._inflight.append(self._executor.submit(synthesize_pcm, self.polly, text, self.cache))
 
+    def run(self):
+        self._started.set()
+        self._last_input = max(self._last_input, time.monotonic())  # 排队等待的时间不计入空闲
+        try:
+            while not self._cancelled.is_set():
+                self._refill(block=True)
+                if not self._inflight:
+                    if self._closed:
+                        break
+                    if self.idle_timeout is not None and time.monotonic() - self._last_input > self.idle_timeout:
+                        print(f"⚠️ 播放任务 {self.idle_timeout} 秒没有输入且未关闭，自动结束")
+                        break
+                    continue
+                try:
+                    pcm = self._inflight.popleft().result()
+                except Exception as e:
+                    print(f"合成出错: {str(e)}")
+                    continue
+                for start in range(0, len(pcm), self.chunk * 2):  # paInt16 每帧2字节
+                    if self._cancelled.is_set():
+                        break
+                    self.output_stream.write(pcm[start:start + self.chunk * 2])
+                    self._refill()
         except Exception as e:
             print(f"播放出错: {str(e)}")
         finally:
-            self._cleanup()
+            for future in self._inflight:
+                future.cancel()
+            self._inflight.clear()
+            if self._own_executor:
+                self._executor.shutdown(wait=False)
+            self._finished.set()
 
-    def stop(self):
-        """安全停止播放"""
-        self._stop_event.set()
+
+class TTSService:
+    """
+    进程级的语音合成与播放服务
+    - 整个进程共用一个Polly客户端（boto3客户端线程安全）和一个输出设备，不再每次朗读都新建客户端、初始化PortAudio
+    - 播放任务（SpeechPipeline）排队交给一个工作线程依次执行，合成在共享线程池中进行
+    """
+    def __init__(self, polly=None, sink=None, prefetch=PREFETCH_SENTENCES, cache=pcm_cache, idle_timeout=IDLE_TIMEOUT):
+        self._polly = polly
+        self._sink = sink
+        self.prefetch = prefetch
+        self.cache = cache
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._pending = deque()  # 已排队、尚未结束的任务，用于打断
+        self._worker = None
+        self._executor = None
+
+    @property
+    def polly(self):
         with self._lock:
-            if self.output_stream:
-                try:
-                    # 先尝试正常停止
-                    if not self.output_stream.is_stopped():
-                        self.output_stream.stop_stream()
-                except OSError as e:
-                    print(f"停止流时忽略错误: {str(e)}")
-                finally:
-                    self._is_playing = False
-
-    def _cleanup(self):
-        """安全清理资源"""
+            if self._polly is None:
+                self._polly = boto3.client('polly', region_name=config['region'])
+            return self._polly
+
+    @property
+    def sink(self):
         with self._lock:
-            try:
-                # 关闭AWS音频流
-                if self.audio_stream:
-                    self.audio_stream.close()
-                
-                # 关闭PyAudio输出流
-                if self.output_stream:
-                    try:
-                        if not self.output_stream.is_stopped():
-                            self.output_stream.stop_stream()
-                    except OSError:
-                        pass
-                    finally:
-                        self.output_stream.close()
-                        self.output_stream = None
-                
-                # 终止PyAudio实例
-                if hasattr(self, 'p'):
-                    try:
-                        self.p.terminate()
-                    except Exception as e:
-                        print(f"终止PyAudio时忽略错误: {str(e)}")
-                
-                self._is_playing = False
-            except Exception as e:
-                print(f"清理过程中发生错误: {str(e)}")
-
-    def __del__(self):
-        """析构函数确保资源释放"""
-        self._cleanup()
+            if self._sink is None:
+                self._sink = make_sink()
+                atexit.register(self._sink.close)
+            return self._sink
+
+    def stream(self, interrupt=False, prefetch=None) -> SpeechPipeline:
+        """
+        新建一个播放任务并排队，返回的流水线可边 feed 边播放
+        :param interrupt: 为True时先打断正在播放和排队中的任务
+        :param prefetch: 本任务提前合成的句数，默认 self.prefetch
+        """
+        polly, sink = self.polly, self.sink
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(SYNTH_WORKERS, self.prefetch + 1),
+                                                    thread_name_prefix='polly-synth')
+                self._worker = threading.Thread(target=self._run, name='tts-service', daemon=True)
+                self._worker.start()
+            if interrupt:
+                for job in self._pending:
+                    job.cancel()
+            while self._pending and self._pending[0].wait(0):
+                self._pending.popleft()
+            job = SpeechPipeline(polly, sink, prefetch or self.prefetch, executor=self._executor,
+                                 cache=self.cache, idle_timeout=self.idle_timeout)
+            self._pending.append(job)
+        self._jobs.put(job)
+        return job
+
+    def speak(self, text, interrupt=False) -> SpeechPipeline:
+        """
+        朗读一段完整的文本：按句切分后并发合成（至多 READ_PREFETCH 段在途），第一段合成完即开始播放，
+        长文本也不会超出 Polly 单次请求的长度限制
+        """
+        job = self.stream(interrupt, prefetch=READ_PREFETCH)
+        for segment in split_sentences(text):
+            job.feed(segment)
+        job.close(timeout=0)
+        return job
+
+    def stop_all(self):
+        with self._lock:
+            for job in self._pending:
+                job.cancel()
+
+    def _run(self):
+        while True:
+            self._jobs.get().run()
+
+tts_service = TTSService()
+
+
+class Reader:
+    """
+    朗读一段文本（/api/read），接口与原先的线程版本一致：start() / stop() / join() / is_playing()
+    实际的合成与播放由进程级的 tts_service 完成，开始新的朗读会打断上一段
+    """
+    def __init__(self, text):
+        self.text = text
+        self._job = None
+
+    def start(self):
+        self._job = tts_service.speak(self.text, interrupt=True)
+
+    def is_playing(self):
+        """检查是否正在播放"""
+        return self._job is not None and self._job.is_playing()
+
+    def stop(self):
+        """停止播放"""
+        if self._job is not None:
+            self._job.cancel()
+
+    def join(self, timeout=None):
+        if self._job is not None:
+            self._job.wait(timeout)
 
 
 if __name__ == "__main__":
     reader = Reader("改进后的稳定版本语音")
     reader.start()
-    
+
     try:
         input('输入回车打断:')
         reader.stop()
     finally:
         reader.join()
-        del reader
\ No newline at end of file
+        del reader
@@ -38,5 +38,19 @@ config = {
         'VoiceId':voiceNameList[voiceIndex],
         'OutputFormat': 'pcm',
         'OutputLanguage':voicePromptList[voiceIndex],
+    },
+    'tts_cache': {
+        'dir': os.getenv('NEXT_TTS_CACHE_DIR', './tools/tts_cache'),  # Polly合成结果（PCM）的磁盘缓存目录
+        'max_bytes': 256 * 1024 * 1024,  # 缓存总大小上限，超出后按最近使用时间淘汰（16kHz PCM 约合2小时语音）
+    },
+    'memory': {
+        'budget_tokens': 4000,   # 每次请求装载的历史记忆token预算
+        'summary_tokens': 800,   # 其中为早期对话摘要预留的预算
+        'min_recent_turns': 2,   # 至少原样保留的最近轮次数
+    },
+    'rag': {
+        'warm_up_on_boot': os.getenv('RAG_WARM_UP', '0') == '1',  # 启动时即在后台加载查询引擎
+        'wait_seconds': 5,       # 开启RAG后引擎仍在加载时，请求最多等待的秒数，超时则本次不使用RAG
+        'retrieval_mode': 'dense',  # dense（默认）/ keyword / hybrid / auto（混合检索，嵌入模型繁忙时只用关键词检索）
     }
 }
\ No newline at end of file
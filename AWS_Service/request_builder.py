@@ -0,0 +1,57 @@
+"""
+Bedrock请求体构建层
+模型配置（profile）是只读快照，修改配置时整体替换（copy-on-write）；
+每次调用都从快照复制出一份新的请求体再叠加本次调用的覆盖项，
+这样并发请求之间不会互相改写 messages / prompt / max_tokens
+"""
+
+import threading
+from types import MappingProxyType
+
+from .config import config
+
+def freeze(obj):
+    """递归转换为只读结构：dict -> MappingProxyType，list -> tuple"""
+    if isinstance(obj, (dict, MappingProxyType)):
+        return MappingProxyType({key: freeze(value) for key, value in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(value) for value in obj)
+    return obj
+
+def thaw(obj):
+    """freeze 的逆操作，返回可以自由修改的新对象"""
+    if isinstance(obj, (dict, MappingProxyType)):
+        return {key: thaw(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [thaw(value) for value in obj]
+    return obj
+
+_update_lock = threading.Lock()
+
+def current_profile():
+    """当前模型配置的只读快照（调用方应在一次请求内只取一次）"""
+    profile = config['bedrock']['api_request']
+    if not isinstance(profile, MappingProxyType):  # 兼容直接给config赋普通dict的脚本
+        profile = freeze(profile)
+    return profile
+
+def update_profile(**body_updates):
+    """修改默认请求参数（如 /api/settings），以新快照整体替换旧快照"""
+    with _update_lock:
+        profile = thaw(current_profile())
+        profile['body'].update(body_updates)
+        config['bedrock']['api_request'] = freeze(profile)
+
+def new_body(overrides=None, profile=None) -> dict:
+    """
+    为一次调用生成全新的请求体
+    :param overrides: 仅对本次调用生效的参数，如 {'max_tokens': 32}
+    :param profile: 模型配置快照，默认为当前配置
+    """
+    profile = profile if profile is not None else current_profile()
+    body = thaw(profile['body'])
+    body.update(overrides or {})
+    return body
+
+# 导入时即把全局配置冻结，之后只能通过 update_profile 修改
+config['bedrock']['api_request'] = freeze(config['bedrock']['api_request'])
@@ -0,0 +1,183 @@
+"""
+流式断句：把模型逐块输出的文本切成适合逐句朗读的片段
+
+SentenceSegmenter 只向前扫描新到达的字符（已扫描过的位置不再重复扫描），缓冲区长度受 max_chars 限制，
+因此即使是很长的无标点片段（代码、公式），总开销也与文本长度成线性关系
+- 中文句末标点（。！？…）直接断句；英文 . ! ? 只有后面跟空白、中文或结束时才断句
+- 小数（3.14）、常见缩写（e.g. / Dr. / etc.）、单个大写字母的人名缩写、行首的列表序号（1. ）不断句
+- 连续的句末标点和紧随其后的右引号、右括号归入同一句
+- 换行处断句；``` 代码块与 `行内代码` 内部不按标点断句；同一行内没有配对的反引号按普通字符处理
+- 当前句（包括代码块和连续的标点）超过 max_chars 仍未结束时，在最近的逗号、空白处（没有则直接在当前位置）强制输出，
+  朗读不会停顿等待
+输出的各段按顺序拼接后与输入完全一致
+"""
+import re
+from typing import List
+
+CJK_TERMINATORS = '\u3002\uff01\uff1f\u2026'  # 。！？…
+EN_TERMINATORS = '.!?'
+TERMINATORS = CJK_TERMINATORS + EN_TERMINATORS
+CLOSERS = '"\')]\u201d\u2019\u300d\u300f\uff09\u3011\u300b'  # 以及 ”’」』）】》
+SOFT_BREAKS = '\uff0c,\uff1b;\uff1a:\u3001 \t\n'  # 中英文逗号、分号、冒号、顿号与空白
+ABBREVIATIONS = {
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'vs', 'etc', 'e.g', 'i.e', 'fig', 'figs', 'eq', 'eqs',
+    'vol', 'al', 'approx', 'inc', 'ltd', 'co', 'dept', 'sec', 'ref', 'cf',
+}
+FENCE = '```'
+MAX_SENTENCE_CHARS = 200  # 单句最长字符数，超过后强制输出
+_WORD_PATTERN = re.compile(r'\w')  # 只有标点或空白的片段不朗读
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+def _is_cjk(char: str) -> bool:
+    return bool(_CJK_PATTERN.match(char))
+
+
+class SentenceSegmenter:
+    def __init__(self, max_chars: int = MAX_SENTENCE_CHARS):
+        self.max_chars = max_chars
+        self._buf = ''  # 从当前句开头起尚未输出的文本
+        self._pos = 0  # 下一个待扫描字符在 _buf 中的位置
+        self._soft = 0  # 最近一个可强制断开的位置
+        self._absorb = 0  # 句末标点已并入到的位置（等待后续输入时记录，避免重复扫描）
+        self._in_fence = False
+
+    def feed(self, text: str) -> List[str]:
+        """输入一段文本，返回其中已经完整的句子"""
+        self._buf += text
+        out = []
+        self._scan(out, final=False)
+        return out
+
+    def flush(self) -> List[str]:
+        """输入结束，返回剩余的全部内容"""
+        out = []
+        self._scan(out, final=True)
+        if self._buf:
+            out.append(self._buf)
+        self._buf, self._pos, self._soft, self._absorb = '', 0, 0, 0
+        self._in_fence = False
+        return out
+
+    def _emit(self, out: List[str], end: int):
+        out.append(self._buf[:end])
+        self._buf = self._buf[end:]
+        self._soft = max(0, self._soft - end)
+
+    def _sentence_dot(self, i: int) -> bool:
+        """位于 i 的英文句点是否是句末"""
+        buf = self._buf
+        start = i
+        while start > 0 and (buf[start - 1].isalnum() or buf[start - 1] == '.') and not _is_cjk(buf[start - 1]):
+            start -= 1
+        word = buf[start:i]
+        if not word:
+            return True
+        if word.lower() in ABBREVIATIONS:
+            return False
+        if len(word) == 1 and word.isupper():
+            return False  # 人名缩写，如 J. Smith
+        if word.isdigit() and not buf[buf.rfind('\n', 0, start) + 1:start].strip():
+            return False  # 行首的列表序号
+        return True
+
+    def _boundary(self, i: int, final: bool):
+        """
+        判断位于 i 的字符处是否断句
+        :return: 句子结束位置；None 表示不断句；-1 表示需要更多输入才能判断
+        """
+        buf = self._buf
+        char = buf[i]
+        if char in CJK_TERMINATORS:
+            return i + 1
+        if char in EN_TERMINATORS:
+            if i + 1 >= len(buf):
+                return i + 1 if final else -1
+            nxt = buf[i + 1]
+            if not (nxt.isspace() or _is_cjk(nxt) or nxt in CLOSERS or nxt in TERMINATORS):
+                return None  # 3.14、example.com、Node.js
+            if char == '.' and nxt not in TERMINATORS and not self._sentence_dot(i):
+                return None
+            return i + 1
+        if char == '\n':
+            return i + 1
+        return None
+
+    def _code_end(self, i: int, final: bool):
+        """
+        位于 i 的反引号是否开启行内代码
+        :return: 代码结束后的位置；None 表示同一行内（max_chars 以内）没有配对的反引号，按普通字符处理；-1 表示需要更多输入
+        """
+        buf = self._buf
+        line_end = buf.find('\n', i + 1)
+        limit = min(len(buf) if line_end == -1 else line_end, self.max_chars)
+        close = buf.find('`', i + 1, limit)
+        if close != -1:
+            return close + 1
+        if line_end != -1 or final or len(buf) >= self.max_chars:
+            return None
+        return -1
+
+    def _scan(self, out: List[str], final: bool):
+        i = self._pos
+        while i < len(self._buf):
+            buf = self._buf
+            char = buf[i]
+            step = i + 1
+
+            if char == '`':
+                if not final and len(buf) - i < len(FENCE) and FENCE.startswith(buf[i:]):
+                    break  # 可能是被拆开的 ```，等待后续输入
+                if buf.startswith(FENCE, i):
+                    if self._in_fence:
+                        self._in_fence = False
+                        self._emit(out, i + len(FENCE))  # 代码块结束处断句
+                        i = 0
+                        continue
+                    self._in_fence = True
+                    if _WORD_PATTERN.search(buf, 0, i):
+                        self._emit(out, i)  # 代码块前的文字先输出
+                        i = 0
+                    i += len(FENCE)
+                    continue
+
+            end = None
+            if self._in_fence:
+                pass
+            elif char == '`':
+                step = self._code_end(i, final)
+                if step == -1:
+                    break  # 还不知道是否有配对的反引号
+                step = step or i + 1  # 行内代码整体跳过，内部不断句
+            else:
+                end = self._boundary(i, final)
+                if end == -1:
+                    break
+            if end is not None:
+                # 连续的句末标点与右引号、右括号归入本句，但不超过 max_chars
+                end = max(end, self._absorb)
+                while end < len(buf) and end < self.max_chars and (buf[end] in TERMINATORS or buf[end] in CLOSERS):
+                    end += 1
+                if end == len(buf) and end < self.max_chars and not final:
+                    self._absorb = end  # 后面可能还有标点或引号，等待后续输入，下次从这里继续
+                    break
+                self._absorb = 0
+                if end >= self.max_chars or _WORD_PATTERN.search(buf, 0, end):
+                    self._emit(out, end)
+                    i = 0
+                else:
+                    i = end  # 只有标点或空白，并入下一句
+                continue
+
+            i = step
+            if char in SOFT_BREAKS:
+                self._soft = i
+            if i >= self.max_chars:
+                cut = self._soft or i
+                self._emit(out, cut)
+                i -= cut
+        self._pos = i
+
+def split_sentences(text: str, max_chars: int = MAX_SENTENCE_CHARS) -> List[str]:
+    """把一整段文本切成按顺序朗读的片段（与流式朗读的断句一致，去掉只有标点或空白的片段）"""
+    segmenter = SentenceSegmenter(max_chars)
+    return [part for part in segmenter.feed(text) + segmenter.flush() if _WORD_PATTERN.search(part)]
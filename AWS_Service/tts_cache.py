@@ -0,0 +1,112 @@
+"""
+Polly 合成结果的磁盘缓存
+同一段文本、同一组语音参数（VoiceId、Engine、LanguageCode、OutputFormat）的PCM只合成一次，
+重复朗读（如再次点击朗读同一条回答）直接从磁盘播放，不再调用Polly
+
+目录结构：<root>/<键的前两位>/<键>.pcm，键为文本与语音参数的 sha256
+总大小超过 max_bytes 时按最近使用时间淘汰；命中时会更新文件的修改时间，重启后淘汰顺序依然有效
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from AWS_Service.config import config
+
+VOICE_FIELDS = ('VoiceId', 'Engine', 'LanguageCode', 'OutputFormat')
+
+class PcmCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 键 -> 文件大小，从最久未使用到最近使用
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self._scan()
+
+    @staticmethod
+    def key(text: str, voice: dict = None) -> str:
+        voice = voice if voice is not None else config['polly']
+        payload = json.dumps([text.strip()] + [voice[field] for field in VOICE_FIELDS], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.pcm"
+
+    def _scan(self):
+        """启动时按修改时间重建LRU顺序"""
+        if not self.root.exists():
+            return
+        files = []
+        for path in self.root.glob('*/*.pcm'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total += size
+
+    def get(self, text: str, voice: dict = None) -> Optional[bytes]:
+        key = self.key(text, voice)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._total -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, text: str, data: bytes, voice: dict = None):
+        if not data or len(data) > self.max_bytes:
+            return
+        key = self.key(text, voice)
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            evicted = []
+            while self._total > self.max_bytes and self._entries:
+                old_key, size = self._entries.popitem(last=False)
+                self._total -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                self._path(old_key).unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'files': len(self._entries),
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+pcm_cache = PcmCache(config['tts_cache']['dir'], config['tts_cache']['max_bytes'])
@@ -1,7 +1,6 @@
 import asyncio
 import json
 import time
-import pyaudio
 import sys
 import boto3
 import sounddevice
@@ -12,6 +11,9 @@ from amazon_transcribe.handlers import TranscriptResultStreamHandler
 from amazon_transcribe.model import TranscriptEvent, TranscriptResultStream
 from AWS_Service.api_request_schema import api_request_list, get_model_ids
 from AWS_Service.config import config
+from AWS_Service.Polly import tts_service
+from AWS_Service.request_builder import new_body
+from AWS_Service.sentences import SentenceSegmenter
 
 model_id = 'anthropic.claude-3-sonnet-20240229-v1:0'
 
@@ -25,9 +27,7 @@ config['bedrock']['api_request']=api_request_list[model_id]
 # 创建新的事件循环
 loop = asyncio.new_event_loop()  # 这里希望用东西代替的啊
 
-# 初始化PyAudio和AWS服务客户端
-p = pyaudio.PyAudio()
-polly = boto3.client('polly', region_name=config['region'])
+# 初始化AWS服务客户端（Polly客户端与音频输出由 tts_service 管理）
 transcribe_streaming = TranscribeStreamingClient(region=config['region'])
 bedrock_runtime = boto3.client(service_name='bedrock-runtime', region_name=config['region'])
 
@@ -74,7 +74,7 @@ class BedrockModelsWrapper:
     def define_body(text):
         model_id = config['bedrock']['api_request']['modelId']
         model_provider = model_id.split('.')[0]
-        body = config['bedrock']['api_request']['body']
+        body = new_body()  # 每次调用生成新的请求体，不改动全局配置
         output_language=config['polly']['OutputLanguage']
 
         if model_provider == 'amazon':
@@ -154,33 +154,24 @@ class BedrockModelsWrapper:
         printer(f'[DEBUG] {chunk_obj}', 'debug')
         return text
 
-import re
 # 音频生成器函数
 def to_audio_generator(bedrock_stream):
-    prefix = ''
-    sentence_end_pattern = re.compile(r'([^。！？!?\.]+[。！？!?\.])')  # 捕获完整句子
+    segmenter = SentenceSegmenter()  # 增量断句，每个字符只扫描一次
 
     if bedrock_stream:
         for event in bedrock_stream:
             chunk = BedrockModelsWrapper.get_stream_chunk(event)
             if chunk:
                 text = BedrockModelsWrapper.get_stream_text(chunk)
-                full_text = prefix + text
-                sentences = sentence_end_pattern.findall(full_text)
-                if sentences:
-                    # 找到完整句子后，逐句生成
-                    for sent in sentences:
-                        print(sent,end="",flush=True)
-                        yield sent
-                    # 将未结束的部分存入 prefix
-                    prefix = sentence_end_pattern.sub('', full_text)
-                else:
-                    prefix = full_text  # 没有匹配到句子，继续累积
+                # 找到完整句子后，逐句生成；未结束的部分留在断句器中
+                for sent in segmenter.feed(text):
+                    print(sent,end="",flush=True)
+                    yield sent
         
         # 流结束后，处理剩余内容
-        if prefix:
-            print(prefix, flush=True, end='')
-            yield prefix
+        for rest in segmenter.flush():
+            print(rest, flush=True, end='')
+            yield rest
 
         print('\n')
 
@@ -217,10 +208,13 @@ class BedrockWrapper:
             printer('[DEBUG] Created bedrock stream to audio generator', 'debug')
 
             reader = Reader()
-            for audio in audio_gen:
-                reader.read(audio)
+            try:
+                for audio in audio_gen:
+                    reader.read(audio)
 
-            reader.close()
+                reader.close()
+            finally:
+                reader.release()
 
         except Exception as e:
             print(e)
@@ -234,36 +228,30 @@ class BedrockWrapper:
 class Reader:
 
     def __init__(self):
-        self.polly = boto3.client('polly', region_name=config['region'])
-        self.audio = p.open(format=pyaudio.paInt16, channels=1, rate=16000, output=True)
-        self.chunk = 1024
+        # 句子级流水线：播放当前句的同时合成后续句子；Polly客户端与输出流由 tts_service 复用
+        self.pipeline = tts_service.stream(interrupt=True)
 
     def read(self, data):
-        response = self.polly.synthesize_speech(
-            Text=data,
-            Engine=config['polly']['Engine'],
-            LanguageCode=config['polly']['LanguageCode'],
-            VoiceId=config['polly']['VoiceId'],
-            OutputFormat=config['polly']['OutputFormat'],
-        )
-
-        stream = response['AudioStream']
-
-        while True:
-            # Check if user signaled to shutdown Bedrock speech
-            # UserInputManager.start_shutdown_executor() will raise Exception. If not ideas but is functional.
-            if UserInputManager.is_executor_set() and UserInputManager.is_shutdown_scheduled():
-                UserInputManager.start_shutdown_executor()
-
-            data = stream.read(self.chunk)
-            self.audio.write(data)
-            if not data:
-                break
+        self._check_shutdown()
+        self.pipeline.feed(data)
 
     def close(self):
-        time.sleep(1)
-        self.audio.stop_stream()
-        self.audio.close()
+        self.pipeline.close(timeout=0)
+        while not self.pipeline.wait(timeout=0.1):
+            self._check_shutdown()
+
+    def release(self):
+        # 没有正常播放完（出错、被打断）时取消播放任务，否则它会一直占住 tts_service 的工作线程
+        if not self.pipeline.wait(0):
+            self.pipeline.cancel()
+
+    def _check_shutdown(self):
+        # Check if user signaled to shutdown Bedrock speech
+        # UserInputManager.start_shutdown_executor() will raise Exception. If not ideas but is functional.
+        if UserInputManager.is_executor_set() and UserInputManager.is_shutdown_scheduled():
+            self.pipeline.cancel()
+            self.pipeline.wait()
+            UserInputManager.start_shutdown_executor()
 
 # 事件处理器类
 class EventHandler(TranscriptResultStreamHandler):
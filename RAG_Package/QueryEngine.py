@@ -1,58 +1,91 @@
-import json
-from pathlib import Path
-from pymilvus import MilvusClient
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-
+from RAG_Package.cache import EmbeddingCache
+from RAG_Package.chunk_store import open_chunk_store
+from RAG_Package.embedding_batcher import EMBED_BATCH_MAX, EmbeddingBatcher
+from RAG_Package.inference_backend import INFERENCE_BACKEND, load_embedder
+from RAG_Package.keyword_index import KeywordIndex, reciprocal_rank_fusion
+from RAG_Package.vector_store import DEFAULT_BACKEND, LOCAL_STORE_DIR, open_vector_store
+
+import functools
 import os
+import threading
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 # 配置
+VECTOR_BACKEND   = DEFAULT_BACKEND      # 'milvus' 或 'local'（环境变量 RAG_VECTOR_BACKEND）
 MILVUS_URI       = "http://0.0.0.0:19530"
 COLLECTION_NAME  = "DL_KDB"
 MODEL_PATH       = "./local_models/bge-m3"
 TOP_K            = 5
 RERANK_TOP_K     = 5
 JSON_PATH    = './JsonDataBase/text_chunks.json'
-
-# 客户端与模型
-client    = MilvusClient(uri=MILVUS_URI)
-embedder  = HuggingFaceEmbedding(model_name=MODEL_PATH)
-
-def load_blocks_from_jsondb(json_path: str) -> list:
-    path = Path(json_path)
-    if not path.exists():
-        raise FileNotFoundError(f"❌ 找不到 text_chunks.json: {json_path}")
-    data = json.loads(path.read_text(encoding="utf-8"))
-    # 在load_blocks_from_jsondb函数中添加
-    for blk in data:
-        meta = blk.get("metadata", {})
-        if not all(k in meta for k in ("file_name", "block_id")):
-            print(f"⚠️ 损坏的元数据块: {json.dumps(blk, indent=2)}")
-    return data
-
-blocks = load_blocks_from_jsondb(JSON_PATH)
+CHUNK_STORE_PATH = './JsonDataBase/text_chunks.bin'
+EMBED_CACHE_SIZE = 4096                 # 查询向量缓存条目上限
+EMBED_CACHE_TTL  = 7 * 24 * 3600        # 查询向量缓存过期时间（秒）
+EMBED_CACHE_PATH = './JsonDataBase/query_embedding_cache.pkl'  # 设为None则不落盘
+EMBED_CONCURRENCY = 2 * EMBED_BATCH_MAX # 在途查询嵌入上限（合并成批计算），'auto' 模式下超出时改用关键词检索
+RRF_K            = 60                   # 倒数排名融合的平滑常数
+RETRIEVAL_MODES  = ('dense', 'keyword', 'hybrid', 'auto')
+
+# 向量库与模型
+vector_store = open_vector_store(VECTOR_BACKEND, COLLECTION_NAME, uri=MILVUS_URI, root=LOCAL_STORE_DIR)
+# 后端由环境变量 RAG_INFERENCE_BACKEND 选择；并发查询在几毫秒内合并成一批计算
+embedder  = EmbeddingBatcher(load_embedder(MODEL_PATH))
+
+# 文本块按 (file_name, block_id) 存放在内存映射的块存储中，text_chunks.json 更新后自动重建
+chunk_store = open_chunk_store(CHUNK_STORE_PATH, source=JSON_PATH)
+# 基于同一块存储的BM25倒排索引，只保存文本块在块存储中的位置；默认的 dense 检索用不到，第一次需要时才构建
+build_keyword_index = functools.partial(KeywordIndex.from_chunk_store, chunk_store)
 
 class QueryEngine:
-    def __init__(self, milvus_client, embedder, collection, reranker=None):
-        self.client = milvus_client
+    def __init__(self, vector_store, embedder, chunk_store, reranker=None, embedding_cache=None,
+                 keyword_index=None, embed_concurrency=EMBED_CONCURRENCY):
+        self.store = vector_store  # MilvusVectorStore 或 LocalVectorStore
         self.embedder = embedder
-        self.collection = collection
+        self.chunks = chunk_store  # 基于(file_name, block_id)的块索引，只读内存映射
         self.reranker = reranker
-
-        # 构建基于(file_name, block_id)的索引
-        self.index = {
-            (blk["metadata"]["file_name"], int(blk["metadata"]["block_id"])): blk
-            for blk in blocks
-        }
-
-    def query(self, text_query: str, top_k: int = TOP_K, use_rerank: bool = False, rerank_top_k: int = RERANK_TOP_K):
-        q_vec = self.embedder.get_text_embedding(text_query)
-
-        res = self.client.search(
-            collection_name=self.collection,
-            data=[q_vec],
-            anns_field="vector",
-            search_params={"metric_type": "L2", "params": {'nlist': 480}},
+        self.embedding_cache = embedding_cache  # 命中时跳过嵌入模型的前向计算
+        self._keyword_index = keyword_index  # BM25 关键词检索，可选；可传入构建函数延迟到第一次使用时构建
+        self._keyword_lock = threading.Lock()
+        self._embed_slots = threading.BoundedSemaphore(embed_concurrency)
+
+    @property
+    def keyword_index(self):
+        index = self._keyword_index
+        if index is None or isinstance(index, KeywordIndex):
+            return index
+        with self._keyword_lock:  # 并发的第一批关键词查询只构建一次
+            if not isinstance(self._keyword_index, KeywordIndex):
+                self._keyword_index = self._keyword_index()
+                print(f"🔎 BM25关键词索引构建完成：{len(self._keyword_index)} 个文本块")
+            return self._keyword_index
+
+    def embed_query(self, text_query: str, wait: bool = True):
+        """
+        计算查询向量
+        :param wait: 为 False 时，若嵌入模型已满负荷（在途调用达到上限）且缓存未命中，直接返回 None
+        """
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.lookup(text_query)
+            if cached is not None:
+                return cached
+        if not self._embed_slots.acquire(blocking=wait):
+            return None
+        try:
+            q_vec = self.embedder.get_text_embedding(text_query)
+        finally:
+            self._embed_slots.release()
+        if self.embedding_cache is not None:
+            self.embedding_cache.store(text_query, q_vec)
+        return q_vec
+
+    @staticmethod
+    def _doc_key(candidate: dict):
+        meta = candidate["metadata"]
+        return meta["file_name"], meta.get("chunk_id", meta["block_id"])
+
+    def _dense_candidates(self, q_vec, top_k: int) -> list:
+        res = self.store.search(
+            [q_vec],
             limit=top_k,
             output_fields=["text", "metadata"]  # 确保metadata字段被请求
         )
@@ -65,7 +98,7 @@ class QueryEngine:
                 blk_id = int(hit_metadata["block_id"])
                 
                 # 从预建索引中获取完整元数据
-                full_block = self.index.get((fname, blk_id))
+                full_block = self.chunks.get(fname, blk_id)
                 if not full_block:
                     continue
                 
@@ -80,6 +113,52 @@ class QueryEngine:
                     "metadata": full_metadata
                 })
 
+        return candidates
+
+
+    def _keyword_candidates(self, text_query: str, top_k: int) -> list:
+        candidates = []
+        for (offset, length), _ in self.keyword_index.search(text_query, top_k):
+            blk = self.chunks.read(offset, length)
+            candidates.append({
+                "text": blk["text"],
+                "id": str(blk["metadata"]["block_id"]),
+                "partition": blk["metadata"]["file_name"],
+                "metadata": blk["metadata"]
+            })
+        return candidates
+
+    def query(self, text_query: str, top_k: int = TOP_K, use_rerank: bool = False, rerank_top_k: int = RERANK_TOP_K,
+              mode: str = 'dense'):
+        """
+        :param mode: 检索方式
+            'dense'   向量检索（默认）
+            'keyword' BM25 关键词检索，不调用嵌入模型
+            'hybrid'  两者各取 top_k，按倒数排名融合
+            'auto'    同 hybrid；嵌入模型满负荷且缓存未命中时退化为 keyword
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"未知的检索方式: {mode}")
+        if mode != 'dense' and self.keyword_index is None:
+            if mode == 'keyword':
+                raise ValueError("未构建关键词索引，无法使用 keyword 检索")
+            mode = 'dense'
+
+        q_vec = None
+        if mode != 'keyword':
+            q_vec = self.embed_query(text_query, wait=mode != 'auto')
+            if q_vec is None:
+                mode = 'keyword'  # 嵌入模型繁忙，走关键词检索的快速路径
+
+        candidates = self._dense_candidates(q_vec, top_k) if q_vec is not None else []
+        if mode in ('keyword', 'hybrid', 'auto'):
+            keyword_candidates = self._keyword_candidates(text_query, top_k)
+            if mode == 'keyword':
+                candidates = keyword_candidates
+            else:
+                candidates = reciprocal_rank_fusion([candidates, keyword_candidates], key=self._doc_key,
+                                                    k=RRF_K, limit=top_k)
+
         # 在重排前添加保护逻辑
         candidates = [c for c in candidates if c]  # 过滤空值
         if not candidates:
@@ -111,20 +190,27 @@ class QueryEngine:
         return results
 
 
-print("📦 向量库总量：", client.get_collection_stats(collection_name=COLLECTION_NAME))
+print("📦 向量库总量：", vector_store.count())
 
 
 # # 加载重排器（如果有）
 # try:
-#     from RAG_Package.reranker import MilvusReranker
+#     from RAG_Package.Reranker import MilvusReranker
 #     reranker = MilvusReranker(model_name="./local_models/bge-reranker-large")
 # except ImportError:
 #     reranker = None
 #     print("[WARNING] 未加载重排器，将禁用重排")
 
 query_engine = QueryEngine(
-    milvus_client=client,
+    vector_store=vector_store,
     embedder=embedder,
-    collection=COLLECTION_NAME,
-    reranker=None  # ✅ 正确参数列表
+    chunk_store=chunk_store,
+    keyword_index=build_keyword_index,
+    reranker=None,  # ✅ 正确参数列表
+    embedding_cache=EmbeddingCache(
+        max_size=EMBED_CACHE_SIZE,
+        ttl=EMBED_CACHE_TTL,
+        persist_path=EMBED_CACHE_PATH,
+        namespace=MODEL_PATH if INFERENCE_BACKEND == 'torch' else f"{MODEL_PATH}:{INFERENCE_BACKEND}"
+    )
 )
\ No newline at end of file
@@ -1,21 +1,37 @@
+import hashlib
 import os
 import torch
-from typing import List, Dict
+from typing import Dict, List, Tuple
 from transformers import AutoModelForSequenceClassification, AutoTokenizer
 
+from RAG_Package.cache import LRUCache
+from RAG_Package.inference_backend import (INFERENCE_BACKEND, INFERENCE_THREADS, OnnxSequenceClassifier,
+                                           check_backend, set_torch_threads)
+
 class MilvusReranker:
-    def __init__(self, model_name: str = "./local_models/bge-reranker-large", device: str = None):
+    def __init__(self, model_name: str = "./local_models/bge-reranker-large", device: str = None,
+                 max_length: int = 512, score_cache_size: int = 20000, token_cache_size: int = 5000,
+                 backend: str = INFERENCE_BACKEND, threads: int = INFERENCE_THREADS):
         """
         初始化Milvus专用的重排器（强制离线模式）
         
         参数:
             model_name: 本地模型路径（必须为已下载的路径）
             device: 指定设备(如'cuda', 'cpu')，默认为自动选择
+            max_length: (query, 文档) 拼接后的最大token数
+            score_cache_size: 打分缓存条目数，键为 (原始查询文本的哈希, 文档ID)
+            token_cache_size: 文档分词结果缓存条目数，键为文档内容哈希
+            backend: 推理后端 'torch' / 'onnx' / 'onnx-int8'，ONNX后端固定在CPU上运行
+            threads: CPU推理线程数
         """
         # 强制设置为离线模式
         os.environ["TRANSFORMERS_OFFLINE"] = "1"
         os.environ["HF_DATASETS_OFFLINE"] = "1"
         
+        check_backend(backend)
+        self.backend = backend
+        if backend != 'torch':
+            device = 'cpu'
         self.device = device if device else 'cuda' if torch.cuda.is_available() else 'cpu'
         
         # 从本地加载分词器和模型（强制不使用网络）
@@ -24,12 +40,84 @@ class MilvusReranker:
             local_files_only=True,
             use_fast=True
         )
-        self.model = AutoModelForSequenceClassification.from_pretrained(
-            model_name,
-            local_files_only=True
-        ).to(self.device)
-        self.model.eval()
+        if backend == 'torch':
+            if os.getenv('RAG_INFERENCE_THREADS'):
+                set_torch_threads(threads)
+            self.model = AutoModelForSequenceClassification.from_pretrained(
+                model_name,
+                local_files_only=True
+            ).to(self.device)
+            self.model.eval()
+        else:
+            self.model = OnnxSequenceClassifier(model_name, backend=backend, threads=threads)
+
+        self.max_length = max_length
+        self.score_cache = LRUCache(score_cache_size)  # 同一查询再次命中相同文档时不再过模型
+        self.token_cache = LRUCache(token_cache_size)  # 文档只分词一次，跨查询复用
+        self._use_token_types = 'token_type_ids' in self.tokenizer.model_input_names
+        self._pair_template = self._probe_pair_template()
+        self._pair_special_tokens = sum(kind == 'special' for kind, _, _ in self._pair_template)
     
+    @staticmethod
+    def _digest(text: str) -> str:
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def _doc_id(cls, doc: Dict) -> str:
+        """文档ID：分区 + chunk_id，再加内容哈希，重新索引后内容变化的文档不会命中旧分数"""
+        chunk_id = doc.get('metadata', {}).get('chunk_id', doc.get('id'))
+        return f"{doc.get('partition')}#{chunk_id}#{cls._digest(doc['text'])[:16]}"
+
+    def _probe_pair_template(self) -> List[Tuple[str, int, int]]:
+        """
+        从一对探针文本的编码推出 (query, 文档) 的拼接格式，BERT 的 [CLS] q [SEP] d [SEP]、
+        XLM-R 的 <s> q </s></s> d </s> 等通用；新版 transformers 的分词器没有 build_inputs_with_special_tokens
+        :return: [('special', 特殊符号ID, token_type) 或 ('segment', 0查询/1文档, token_type)]
+        """
+        encoded = self.tokenizer('q', 'd', return_special_tokens_mask=True, return_token_type_ids=True)
+        token_types = encoded.get('token_type_ids') or [0] * len(encoded['input_ids'])
+        template, previous_special = [], True
+        for token_id, special, token_type in zip(encoded['input_ids'], encoded['special_tokens_mask'], token_types):
+            if special:
+                template.append(('special', token_id, token_type))
+            elif previous_special:
+                template.append(('segment', sum(kind == 'segment' for kind, _, _ in template), token_type))
+            previous_special = special
+        if [value for kind, value, _ in template if kind == 'segment'] != [0, 1]:
+            raise ValueError(f"无法识别分词器的句对拼接格式: {encoded['input_ids']}")
+        return template
+
+    def _pair_features(self, query_ids: List[int], doc_ids: List[int]) -> Dict[str, List[int]]:
+        """按拼接格式组合已分好词的查询和文档，不再重新分词"""
+        input_ids, token_type_ids = [], []
+        for kind, value, token_type in self._pair_template:
+            ids = [value] if kind == 'special' else (query_ids, doc_ids)[value]
+            input_ids.extend(ids)
+            token_type_ids.extend([token_type] * len(ids))
+        feature = {'input_ids': input_ids}
+        if self._use_token_types:
+            feature['token_type_ids'] = token_type_ids
+        return feature
+
+    def _doc_tokens(self, texts: List[str]) -> List[List[int]]:
+        """文档分词（不加特殊符号），已分过词的直接取缓存，其余一次批量分词"""
+        digests = [self._digest(text) for text in texts]
+        tokens = [self.token_cache.get(digest) for digest in digests]
+        missing = [i for i, ids in enumerate(tokens) if ids is None]
+        if missing:
+            encoded = self.tokenizer([texts[i] for i in missing], add_special_tokens=False)['input_ids']
+            for i, ids in zip(missing, encoded):
+                tokens[i] = ids
+                self.token_cache.put(digests[i], ids)
+        return tokens
+
+    def _score_features(self, features: List[Dict]) -> List[float]:
+        if self.backend != 'torch':
+            return self.model(self.tokenizer.pad(features, padding=True, return_tensors="np"))
+        inputs = self.tokenizer.pad(features, padding=True, return_tensors="pt").to(self.device)
+        with torch.no_grad():
+            return self.model(**inputs).logits.view(-1).float().cpu().tolist()
+
     def rerank_documents(
         self,
         query: str,
@@ -55,61 +143,48 @@ class MilvusReranker:
             重排后的文档列表，每个文档包含:
                 - text: 文档内容
                 - score: 重排分数
-                - metadata: 包含id和partition的字典
+                - metadata: 原文档的metadata，并附加id和partition
                 - is_truncated: 是否被截断（新增字段）
+
+        查询只分词一次，文档分词结果和打分都有缓存；需要过模型的 (query, 文档) 对按长度排序后再分批，
+        同一批内长度接近，padding 更少
         """
         if not retrieved_documents:
             return []
-        
-        # 准备文档数据
-        docs_text = [doc['text'] for doc in retrieved_documents]
-        pairs = [(query, doc_text) for doc_text in docs_text]
-        
-        # 分批计算得分
-        all_scores = []
-        truncation_info = []  # 记录截断情况
-        
-        for i in range(0, len(pairs), batch_size):
-            batch_pairs = pairs[i:i + batch_size]
-            
-            # 第一步：获取截断信息（不传递给模型）
-            trunc_check = self.tokenizer(
-                batch_pairs,
-                padding=True,
-                truncation="only_second",
-                max_length=512,
-                return_overflowing_tokens=True,
-                return_tensors="pt"
-            )
-            batch_truncated = trunc_check.get("num_truncated_tokens", [0]*len(batch_pairs))
-            truncation_info.extend(batch_truncated)
-            
-            if verbose and sum(batch_truncated) > 0:
-                print(f"Batch {i//batch_size}: {sum(t > 0 for t in batch_truncated)}/{len(batch_pairs)} 文档被截断")
-            
-            # 第二步：实际编码（不返回overflowing_tokens）
-            inputs = self.tokenizer(
-                batch_pairs,
-                padding=True,
-                truncation="only_second",
-                max_length=512,
-                return_tensors="pt"
-            ).to(self.device)
-            
-            # 计算得分
-            with torch.no_grad():
-                batch_scores = self.model(**inputs).logits.view(-1).float().cpu()
-                all_scores.extend(batch_scores.tolist())
-        
+
+        query_ids = self.tokenizer(query, add_special_tokens=False)['input_ids']
+        doc_budget = max(1, self.max_length - self._pair_special_tokens - len(query_ids))  # 只截断文档部分
+        query_key = self._digest(query)  # 模型区分大小写和全半角，缓存键必须是原始查询文本
+        doc_keys = [(query_key, self._doc_id(doc)) for doc in retrieved_documents]
+
+        scores = [self.score_cache.get(key) for key in doc_keys]
+        doc_tokens = self._doc_tokens([doc['text'] for doc in retrieved_documents])
+        truncation_info = [max(0, len(ids) - doc_budget) for ids in doc_tokens]
+
+        # 未命中缓存的文档按长度分桶打分
+        pending = sorted((i for i, score in enumerate(scores) if score is None), key=lambda i: len(doc_tokens[i]))
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            features = [self._pair_features(query_ids, doc_tokens[i][:doc_budget]) for i in batch]
+
+            if verbose:
+                truncated = sum(truncation_info[i] > 0 for i in batch)
+                if truncated:
+                    print(f"Batch {start // batch_size}: {truncated}/{len(batch)} 文档被截断")
+
+            for i, score in zip(batch, self._score_features(features)):
+                scores[i] = score
+                self.score_cache.put(doc_keys[i], score)
+
         # 组合结果并添加元数据
         scored_documents = []
-        for idx, (score, truncated) in enumerate(zip(all_scores, truncation_info)):
-            original_doc = retrieved_documents[idx]
+        for original_doc, score, truncated in zip(retrieved_documents, scores, truncation_info):
             scored_documents.append({
                 'text': original_doc['text'],
                 'score': float(score),
                 'is_truncated': truncated > 0,
                 'metadata': {
+                    **original_doc.get('metadata', {}),
                     'id': original_doc['id'],
                     'partition': original_doc['partition'],
                     'truncated_tokens': truncated if verbose else None
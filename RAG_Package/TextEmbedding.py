@@ -2,30 +2,20 @@ import json
 from pathlib import Path
 
 from llama_index.core.text_splitter import TokenTextSplitter
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from RAG_Package.embedding_pipeline import EMBED_BATCH_SIZE, insert_embedded
+from RAG_Package.inference_backend import load_embedder
 
-from pymilvus import (
-    connections,
-    FieldSchema,
-    CollectionSchema,
-    DataType,
-    Collection,
-    utility
-)
+from RAG_Package.scale_embedding import COLLECTION_NAME, VECTOR_BACKEND, milvus_row, open_store
 
 import os
 os.environ["TOKENIZERS_PARALLELISM"] = "false" # 禁用Tokenizer的并行
 
 # -------------------- 配置参数 --------------------
 CONTENT_LIST_JSON = './Data/Paper/MinerU_Res/AlexNet/AlexNet_content_list.json'
-MILVUS_HOST = '0.0.0.0'
-MILVUS_PORT = '19530'
-COLLECTION_NAME = 'DL_KDB'
 LOCAL_MODEL_DIR = './local_models/bge-m3'
-VECTOR_DIM = 1024
 
 # 本地嵌入模型
-embedding = HuggingFaceEmbedding(model_name=LOCAL_MODEL_DIR)
+embedding = load_embedder(LOCAL_MODEL_DIR, embed_batch_size=EMBED_BATCH_SIZE)
 
 def process_content_list_docs(
     content_list_path: str,
@@ -131,44 +121,18 @@ def process_content_list_docs(
     return text_chunks, raw_data,all_contents
 
 
-def create_milvus_collection(collection_name: str):
-    if utility.has_collection(collection_name):
-        utility.drop_collection(collection_name)
-
-    fields = [
-        FieldSchema(name='id', dtype=DataType.INT64, is_primary=True, auto_id=True),
-        FieldSchema(name='text', dtype=DataType.VARCHAR, max_length=4096),
-        FieldSchema(name='metadata', dtype=DataType.JSON, nullable=True),
-        FieldSchema(name='vector', dtype=DataType.FLOAT_VECTOR, dim=VECTOR_DIM)
-    ]
-    schema = CollectionSchema(fields=fields, description='Deep Learning Knowledge DB')
-    col = Collection(name=collection_name, schema=schema, using='default')
-    col.create_index(
-        field_name='vector',
-        index_params={'index_type':'IVF_FLAT','metric_type':'L2','params':{'nlist':480}} # 480 ≈ 4x√15000
-    )
-    col.load()
-    return col
-
-
-def store_in_milvus(chunks: list):
-    connections.connect(alias='default', host=MILVUS_HOST, port=MILVUS_PORT)
-    collection = create_milvus_collection(COLLECTION_NAME)
-
-    texts, metas, vecs = [], [], []
-    for chunk in chunks:
-        texts.append(chunk['text'])
-        metas.append(chunk['metadata'])
-        vecs.append(embedding.get_text_embedding(chunk['text']))
-
-    batch_size = 500
-    for i in range(0, len(texts), batch_size):
-        collection.insert([texts[i:i+batch_size],
-                           metas[i:i+batch_size],
-                           vecs[i:i+batch_size]])
-    collection.flush()
-    collection.load()
-    print(f"🚀 成功存储 {len(texts)} 条记录到 Milvus 集合 '{COLLECTION_NAME}'")
+def store_in_milvus(chunks, batch_size: int = EMBED_BATCH_SIZE):
+    """
+    全量重建向量库：按长度分桶批量嵌入，边嵌入边写入；chunks 可以是列表或生成器
+    与 scale_embedding 共用同一个 schema（"file_name#chunk_id" 字符串主键）和 VectorStore 写入，
+    因此单文件建的库也能被增量索引更新，RAG_VECTOR_BACKEND=local 时写入本地向量库
+    """
+    store = open_store(drop_existing=True)
+
+    total = insert_embedded(store, chunks, embedding, batch_size=batch_size, make_row=milvus_row)
+    store.flush()
+    store.load()
+    print(f"🚀 成功存储 {total} 条记录到向量库 '{COLLECTION_NAME}'（{VECTOR_BACKEND}）")
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,124 @@
+import atexit
+import os
+import pickle
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional
+
+_MISSING = object()
+
+class LRUCache:
+    """
+    线程安全的LRU缓存，可选TTL过期，带命中/未命中计数
+    """
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        self.max_size = max_size  # 最多缓存条目数
+        self.ttl = ttl  # 过期时间（秒），None 表示不过期
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (写入时间, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and self.ttl is not None and time.time() - entry[0] > self.ttl:
+                del self._data[key]
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value, created_at: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (created_at or time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+class EmbeddingCache(LRUCache):
+    """
+    查询向量缓存：以归一化后的查询文本为键，重复的问题直接跳过嵌入模型
+    可选持久化到磁盘（进程退出时写入，启动时加载），文件中记录模型名，换模型后自动失效
+    """
+    def __init__(self, max_size: int = 4096, ttl: Optional[float] = None,
+                 persist_path: Optional[str] = None, namespace: str = ''):
+        super().__init__(max_size, ttl)
+        self.persist_path = persist_path
+        self.namespace = namespace  # 一般为嵌入模型路径
+        if persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """全角转半角、统一大小写、合并空白"""
+        text = unicodedata.normalize('NFKC', text)
+        return re.sub(r'\s+', ' ', text).strip().lower()
+
+    def lookup(self, text: str) -> Optional[List[float]]:
+        return self.get(self.normalize(text))
+
+    def store(self, text: str, vector: List[float]):
+        self.put(self.normalize(text), vector)
+
+    def get_or_compute(self, text: str, compute: Callable[[str], List[float]]) -> List[float]:
+        vector = self.lookup(text)
+        if vector is None:
+            vector = compute(text)
+            self.store(text, vector)
+        return vector
+
+    def load(self):
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'rb') as f:
+                payload = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"⚠️ 查询向量缓存加载失败，将重新构建: {e}")
+            return
+        if payload.get('namespace') != self.namespace:
+            return  # 嵌入模型已更换，旧向量作废
+        now = time.time()
+        for key, (created_at, vector) in payload.get('entries', []):
+            if self.ttl is None or now - created_at <= self.ttl:
+                self.put(key, vector, created_at)
+        print(f"📦 已加载 {len(self)} 条查询向量缓存")
+
+    def save(self):
+        if not self.persist_path:
+            return
+        with self._lock:
+            entries = list(self._data.items())
+        directory = os.path.dirname(self.persist_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.persist_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'namespace': self.namespace, 'entries': entries}, f)
+        os.replace(tmp_path, self.persist_path)
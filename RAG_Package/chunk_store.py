@@ -0,0 +1,133 @@
+"""
+紧凑的文本块存储：把 text_chunks.json 转成一个带哈希表的二进制文件，按 (file_name, block_id) O(1) 查找
+
+文件布局（小端序）：
+- 文件头   magic(4s) version(I) count(I) table_size(I) data_offset(Q)
+- 哈希表   table_size 个槽位，每个槽位 hash(Q) offset(Q) length(I) + 4字节填充，开放寻址、线性探测
+- 数据区   每个文本块一行 JSON（UTF-8，换行分隔），由槽位的 offset/length 定位；
+           同一个块切分出的所有文本块都保留在数据区中（可顺序遍历），哈希表指向其中最后一个
+
+查询时整个文件只读内存映射（mmap），多个工作进程共享同一份页缓存，只有命中的块才会被解析成 dict
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+MAGIC = b'NXCS'
+VERSION = 2  # 2: 数据区改为换行分隔的记录，可顺序遍历
+HEADER = struct.Struct('<4sIIIQ')
+SLOT = struct.Struct('<QQI4x')
+
+def key_hash(file_name: str, block_id: int) -> int:
+    digest = hashlib.blake2b(f"{file_name}\0{int(block_id)}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') | 1  # 0 表示空槽位
+
+def build_chunk_store(blocks: Iterable[dict], path: str) -> int:
+    """
+    写入块存储文件（先写临时文件再替换，正在读取旧文件的进程不受影响）
+    同一个 (file_name, block_id) 出现多次时保留最后一个，与原先 dict 索引的行为一致
+    :return: 写入的键数
+    """
+    data = bytearray()
+    entries = {}
+    for blk in blocks:
+        meta = blk.get('metadata', {})
+        if not all(k in meta for k in ('file_name', 'block_id')):
+            print(f"⚠️ 损坏的元数据块: {json.dumps(blk, ensure_ascii=False)[:200]}")
+            continue
+        payload = json.dumps(blk, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        entries[(meta['file_name'], int(meta['block_id']))] = (len(data), len(payload))
+        data += payload + b'\n'
+
+    table_size = 1
+    while table_size < len(entries) * 2:  # 装载因子不超过 0.5
+        table_size *= 2
+    table = bytearray(table_size * SLOT.size)
+    mask = table_size - 1
+    for (file_name, block_id), (offset, length) in entries.items():
+        h = key_hash(file_name, block_id)
+        i = h & mask
+        while SLOT.unpack_from(table, i * SLOT.size)[0] != 0:
+            i = (i + 1) & mask
+        SLOT.pack_into(table, i * SLOT.size, h, offset, length)
+
+    data_offset = HEADER.size + len(table)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries), table_size, data_offset))
+        f.write(table)
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(entries)
+
+
+class ChunkStore:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self._table_size, self._data_offset = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"❌ 不是有效的块存储文件: {path}")
+        self._mask = self._table_size - 1
+
+    def get(self, file_name: str, block_id: int) -> Optional[dict]:
+        h = key_hash(file_name, block_id)
+        i = h & self._mask
+        while True:
+            slot_hash, offset, length = SLOT.unpack_from(self._mm, HEADER.size + i * SLOT.size)
+            if slot_hash == 0:
+                return None
+            if slot_hash == h:
+                blk = self.read(offset, length)
+                meta = blk['metadata']
+                if meta['file_name'] == file_name and int(meta['block_id']) == int(block_id):
+                    return blk
+            i = (i + 1) & self._mask
+
+    def read(self, offset: int, length: int) -> dict:
+        """按数据区内的偏移读取一个文本块"""
+        start = self._data_offset + offset
+        return json.loads(self._mm[start:start + length])
+
+    def records(self) -> Iterator[Tuple[int, int, dict]]:
+        """按写入顺序遍历数据区中的全部文本块，产出 (offset, length, 文本块)"""
+        pos, end = self._data_offset, len(self._mm)
+        while pos < end:
+            stop = self._mm.find(b'\n', pos)
+            stop = end if stop < 0 else stop
+            yield pos - self._data_offset, stop - pos, json.loads(self._mm[pos:stop])
+            pos = stop + 1
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._mm.close()
+
+
+def _file_version(path: str) -> Optional[int]:
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size or header[:4] != MAGIC:
+        return None
+    return HEADER.unpack(header)[1]
+
+
+def open_chunk_store(path: str, source: str = None) -> ChunkStore:
+    """
+    打开块存储；若文件不存在、比源 JSON 旧或是旧版本格式，则先从 source（text_chunks.json）重建
+    """
+    if source and Path(source).exists():
+        if (not Path(path).exists() or os.path.getmtime(path) < os.path.getmtime(source)
+                or _file_version(path) != VERSION):
+            blocks = json.loads(Path(source).read_text(encoding='utf-8'))
+            count = build_chunk_store(blocks, path)
+            print(f"🗂️ 已从 {source} 重建块存储，共 {count} 个块")
+    elif not Path(path).exists():
+        raise FileNotFoundError(f"❌ 找不到 text_chunks.json: {source}")
+    return ChunkStore(path)
@@ -0,0 +1,110 @@
+"""
+批量嵌入流水线：
+- 文本块按近似token长度分桶后再组成批次，同一批次内长度接近，减少padding浪费
+- 嵌入一批、写入一批：编码在当前线程进行，Milvus写入在后台线程进行，两者重叠执行，
+  内存中只保留有限个批次，不需要先把全部向量算完
+"""
+import itertools
+import queue
+import re
+import threading
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+_CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]')
+
+EMBED_BATCH_SIZE = 64    # 每次送入嵌入模型的文本块数
+BUCKET_WINDOW = 16       # 每次读入 BUCKET_WINDOW 个批次的文本块，在窗口内按长度排序再切分
+INSERT_BATCH_SIZE = 500  # 每次写入Milvus的行数
+MAX_PENDING_INSERTS = 2  # 等待写入的批次上限，超过时嵌入阶段等待
+
+def approx_tokens(text: str) -> int:
+    """近似token数：中文按字计，其余按空白分词计"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + len(_CJK_RE.sub(' ', text).split())
+
+def length_bucketed_batches(
+    chunks: Iterable[dict],
+    batch_size: int = EMBED_BATCH_SIZE,
+    bucket_window: int = BUCKET_WINDOW,
+    length_fn: Callable[[str], int] = approx_tokens,
+) -> Iterator[List[dict]]:
+    """
+    将文本块流切分为批次；每个窗口内按长度排序，使同一批次的文本长度相近
+    只缓存一个窗口的文本块，可直接消费生成器
+    """
+    it = iter(chunks)
+    while True:
+        window = list(itertools.islice(it, batch_size * bucket_window))
+        if not window:
+            return
+        window.sort(key=lambda chunk: length_fn(chunk['text']))
+        for i in range(0, len(window), batch_size):
+            yield window[i:i + batch_size]
+
+def embed_batches(
+    chunks: Iterable[dict],
+    embedder,
+    batch_size: int = EMBED_BATCH_SIZE,
+    bucket_window: int = BUCKET_WINDOW,
+) -> Iterator[Tuple[List[dict], List[List[float]]]]:
+    """逐批生成 (文本块列表, 对应向量列表)"""
+    for batch in length_bucketed_batches(chunks, batch_size, bucket_window):
+        vectors = embedder.get_text_embedding_batch([chunk['text'] for chunk in batch])
+        yield batch, vectors
+
+def insert_embedded(
+    collection,
+    chunks: Iterable[dict],
+    embedder,
+    batch_size: int = EMBED_BATCH_SIZE,
+    bucket_window: int = BUCKET_WINDOW,
+    insert_batch_size: int = INSERT_BATCH_SIZE,
+    make_row: Callable[[dict, List[float]], list] = None,
+    write: str = 'insert',
+) -> int:
+    """
+    嵌入文本块并流式写入Milvus集合，返回写入的行数
+    :param make_row: 文本块+向量 -> 按集合字段顺序排列的一行，默认 [text, metadata, vector]
+    :param write: 写入方式，'insert' 或 'upsert'（按主键覆盖已有记录）
+    """
+    make_row = make_row or (lambda chunk, vector: [chunk['text'], chunk['metadata'], vector])
+    write_rows = getattr(collection, write)
+    pending = queue.Queue(maxsize=MAX_PENDING_INSERTS)
+    errors = []
+
+    def writer():
+        while True:
+            rows = pending.get()
+            if rows is None:
+                return
+            if errors:
+                continue  # 已经出错，丢弃剩余批次，只负责把队列排空
+            try:
+                write_rows([list(column) for column in zip(*rows)])
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=writer, name='milvus-insert', daemon=True)
+    thread.start()
+
+    total, rows = 0, []
+    try:
+        for batch, vectors in embed_batches(chunks, embedder, batch_size, bucket_window):
+            if errors:
+                break
+            rows.extend(make_row(chunk, vector) for chunk, vector in zip(batch, vectors))
+            if len(rows) >= insert_batch_size:
+                pending.put(rows)
+                total += len(rows)
+                rows = []
+                print(f"⏳ 已嵌入 {total} 条记录")
+        if rows and not errors:
+            pending.put(rows)
+            total += len(rows)
+    finally:
+        pending.put(None)
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return total
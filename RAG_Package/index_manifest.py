@@ -0,0 +1,89 @@
+"""
+增量索引清单（manifest）：
+记录每个 *_content_list.json 的内容哈希以及它产生的每个文本块的主键和内容哈希，
+下次索引时据此判断哪些文件需要重新解析、哪些文本块需要重新嵌入、哪些需要从Milvus删除
+"""
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List
+
+MANIFEST_VERSION = 2  # 2: 主键改为 content_list 相对语料根目录的路径 + chunk_id
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_hash(chunk: dict) -> str:
+    payload = json.dumps({'text': chunk['text'], 'metadata': chunk['metadata']},
+                         ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def chunk_key(chunk: dict) -> str:
+    """文本块在Milvus中的主键：content_list 相对语料根目录的路径（file_key）+ chunk_id，不同子目录下的同名文件互不覆盖"""
+    metadata = chunk['metadata']
+    return f"{metadata['file_key']}#{metadata['chunk_id']}"
+
+
+class IndexManifest:
+    def __init__(self, path: str, settings: dict):
+        """
+        :param path: 清单文件路径
+        :param settings: 影响嵌入结果的参数（模型、分块大小、集合名等），与上次不同则需要全量重建
+        """
+        self.path = path
+        self.settings = settings
+        self.files: Dict[str, dict] = {}  # file_key -> {'hash', 'file_name', 'chunks': {主键: 内容哈希}}
+        self.rebuild = True  # 没有可用的旧清单时需要全量重建
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 索引清单读取失败，将全量重建: {e}")
+            return
+        if payload.get('version') != MANIFEST_VERSION or payload.get('settings') != self.settings:
+            print("⚠️ 索引参数已变化，将全量重建")
+            return
+        self.files = payload.get('files', {})
+        self.rebuild = False
+
+    def unchanged(self, file_key: str, digest: str) -> bool:
+        entry = self.files.get(file_key)
+        return entry is not None and entry['hash'] == digest
+
+    def chunk_hashes(self) -> Dict[str, str]:
+        """上次索引时所有文本块的 主键 -> 内容哈希"""
+        return {key: digest for entry in self.files.values() for key, digest in entry['chunks'].items()}
+
+    def removed(self, new_files: Dict[str, dict]) -> List[str]:
+        """新文件表中已经不存在的文本块主键（需要从Milvus删除）"""
+        new_keys = {key for entry in new_files.values() for key in entry['chunks']}
+        return sorted(set(self.chunk_hashes()) - new_keys)
+
+    def save(self, new_files: Dict[str, dict]):
+        """写入新的清单（先写临时文件再替换，中途失败不会留下半份清单）"""
+        self.files = new_files
+        self.rebuild = False
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'settings': self.settings, 'files': new_files},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+def group_by_file_key(entries: Iterable[dict]) -> Dict[str, list]:
+    """把上次输出的 text_chunks / raw_data 按 metadata.file_key 分组，用于复用未变化文件的解析结果"""
+    groups: Dict[str, list] = {}
+    for entry in entries:
+        groups.setdefault(entry['metadata']['file_key'], []).append(entry)
+    return groups
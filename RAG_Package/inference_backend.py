@@ -0,0 +1,181 @@
+"""
+CPU 推理后端：bge-m3 嵌入模型与 bge-reranker-large 重排模型可在以下后端之间切换
+- torch      原有的 PyTorch 全精度推理（默认）
+- onnx       导出的 ONNX 模型，onnxruntime 执行
+- onnx-int8  ONNX 模型经动态量化（权重 int8），体积约为 1/4，CPU 上通常快 2~3 倍，召回略有损失
+
+通过环境变量选择：
+    RAG_INFERENCE_BACKEND=onnx-int8   后端
+    RAG_INFERENCE_THREADS=8           推理线程数（默认使用一半的逻辑核，约等于物理核数）
+
+ONNX 模型需要先导出（需要 torch；onnxruntime 为可选依赖，只有非 torch 后端才用到）：
+    python -m RAG_Package.inference_backend export --model ./local_models/bge-m3 --kind embedding
+    python -m RAG_Package.inference_backend export --model ./local_models/bge-reranker-large --kind reranker
+导出结果放在 <模型目录>-onnx 下，同时复制分词器
+"""
+import argparse
+import os
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+BACKENDS = ('torch', 'onnx', 'onnx-int8')
+INFERENCE_BACKEND = os.getenv('RAG_INFERENCE_BACKEND', 'torch')
+INFERENCE_THREADS = int(os.getenv('RAG_INFERENCE_THREADS', '0')) or max(1, (os.cpu_count() or 2) // 2)
+ONNX_FILE = 'model.onnx'
+ONNX_INT8_FILE = 'model_int8.onnx'
+ONNX_OPSET = 14
+
+def onnx_model_dir(model_path: str) -> str:
+    return f"{str(model_path).rstrip('/')}-onnx"
+
+def onnx_model_file(model_path: str, backend: str) -> Path:
+    return Path(onnx_model_dir(model_path)) / (ONNX_INT8_FILE if backend == 'onnx-int8' else ONNX_FILE)
+
+def check_backend(backend: str):
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的推理后端: {backend}，可选 {BACKENDS}")
+
+def set_torch_threads(threads: int = INFERENCE_THREADS):
+    import torch
+    torch.set_num_threads(threads)
+
+def create_session(path, threads: int = INFERENCE_THREADS):
+    """创建只用 CPU 的 onnxruntime 会话，线程数固定为 threads，避免多个模型互相抢核"""
+    import onnxruntime as ort
+    if not Path(path).exists():
+        raise FileNotFoundError(f"❌ 找不到ONNX模型: {path}，请先运行 python -m RAG_Package.inference_backend export")
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(str(path), sess_options=options, providers=['CPUExecutionProvider'])
+
+
+class OnnxEmbedding:
+    """
+    ONNX 版 bge-m3 稠密向量：取 [CLS] 向量并做 L2 归一化，与 HuggingFaceEmbedding 的输出一致
+    提供 QueryEngine / 入库流程用到的 get_text_embedding、get_text_embedding_batch 等接口
+    """
+    def __init__(self, model_path: str, backend: str = 'onnx', threads: int = INFERENCE_THREADS,
+                 embed_batch_size: int = 10, max_length: int = 8192):
+        from transformers import AutoTokenizer
+        self.model_name = model_path
+        self.embed_batch_size = embed_batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(onnx_model_dir(model_path), local_files_only=True)
+        self.session = create_session(onnx_model_file(model_path, backend), threads)
+        self._input_names = [i.name for i in self.session.get_inputs()]
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors='np')
+        hidden = self.session.run(None, {name: inputs[name].astype(np.int64) for name in self._input_names})[0]
+        cls = hidden[:, 0]
+        cls = cls / np.maximum(np.linalg.norm(cls, axis=1, keepdims=True), 1e-12)
+        return cls.tolist()
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+    get_query_embedding = get_text_embedding
+
+    def get_text_embedding_batch(self, texts: List[str], show_progress: bool = False, **kwargs) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.embed_batch_size):
+            vectors.extend(self._encode(texts[start:start + self.embed_batch_size]))
+        return vectors
+
+
+class OnnxSequenceClassifier:
+    """ONNX 版重排模型，输入为分词器 pad 后的 numpy 张量，输出每对 (query, 文档) 的 logit"""
+    def __init__(self, model_path: str, backend: str = 'onnx', threads: int = INFERENCE_THREADS):
+        self.session = create_session(onnx_model_file(model_path, backend), threads)
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, inputs) -> List[float]:
+        logits = self.session.run(None, {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names})[0]
+        return logits.reshape(-1).astype(np.float32).tolist()
+
+
+def load_embedder(model_path: str, backend: str = INFERENCE_BACKEND, threads: int = INFERENCE_THREADS, **kwargs):
+    """
+    按后端加载嵌入模型
+    :param kwargs: 透传给 HuggingFaceEmbedding / OnnxEmbedding（如 embed_batch_size）
+    """
+    check_backend(backend)
+    if backend == 'torch':
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        if os.getenv('RAG_INFERENCE_THREADS'):
+            set_torch_threads(threads)
+        return HuggingFaceEmbedding(model_name=model_path, **kwargs)
+    embedder = OnnxEmbedding(model_path, backend=backend, threads=threads, **kwargs)
+    print(f"⚙️ 嵌入模型使用 {backend} 后端，{threads} 线程")
+    return embedder
+
+
+def export_onnx(model_path: str, kind: str, quantize: bool = True) -> Path:
+    """
+    导出 ONNX 模型（batch、序列长度两个维度可变），并可选做动态 int8 量化
+    bge-m3 超过 2GB，导出和量化都使用外部数据格式保存权重
+    :param kind: 'embedding' 输出最后一层隐状态；'reranker' 输出分类 logit
+    """
+    import torch
+    from transformers import AutoModel, AutoModelForSequenceClassification, AutoTokenizer
+
+    out_dir = Path(onnx_model_dir(model_path))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+    tokenizer.save_pretrained(out_dir)
+
+    if kind == 'embedding':
+        base = AutoModel.from_pretrained(model_path, local_files_only=True)
+        forward = lambda input_ids, attention_mask: base(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        output_name = 'last_hidden_state'
+        output_axes = {0: 'batch', 1: 'sequence'}  # [batch, sequence, hidden]
+    else:
+        base = AutoModelForSequenceClassification.from_pretrained(model_path, local_files_only=True)
+        forward = lambda input_ids, attention_mask: base(input_ids=input_ids, attention_mask=attention_mask).logits
+        output_name = 'logits'
+        output_axes = {0: 'batch'}  # [batch, num_labels]
+    base.eval()
+
+    class _Wrapper(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.base = base
+
+        def forward(self, input_ids, attention_mask):
+            return forward(input_ids, attention_mask)
+
+    sample = tokenizer(['导出样例', 'export sample'], padding=True, return_tensors='pt')
+    fp32_path = out_dir / ONNX_FILE
+    with torch.no_grad():
+        torch.onnx.export(
+            _Wrapper(), (sample['input_ids'], sample['attention_mask']), str(fp32_path),
+            input_names=['input_ids', 'attention_mask'], output_names=[output_name],
+            dynamic_axes={'input_ids': {0: 'batch', 1: 'sequence'},
+                          'attention_mask': {0: 'batch', 1: 'sequence'},
+                          output_name: output_axes},
+            opset_version=ONNX_OPSET,
+        )
+    print(f"✅ 已导出 {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = out_dir / ONNX_INT8_FILE
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8, use_external_data_format=True)
+        print(f"✅ 已量化 {int8_path}")
+    return out_dir
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='导出 ONNX / int8 推理模型')
+    sub = parser.add_subparsers(dest='command', required=True)
+    export_parser = sub.add_parser('export', help='导出ONNX模型并做int8量化')
+    export_parser.add_argument('--model', required=True, help='本地模型目录')
+    export_parser.add_argument('--kind', choices=['embedding', 'reranker'], required=True)
+    export_parser.add_argument('--no-quantize', action='store_true', help='只导出fp32模型')
+    args = parser.parse_args()
+    export_onnx(args.model, args.kind, quantize=not args.no_quantize)
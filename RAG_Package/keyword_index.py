@@ -0,0 +1,127 @@
+"""
+BM25 关键词检索与倒排索引
+- 英文/数字按词切分并转小写，带下划线、连字符的术语（如 conv3_1、batch-norm）同时保留整体和各部分
+- 中文优先使用 jieba 的搜索引擎模式分词（若已安装），否则按字二元组切分
+- 倒排列表以 numpy 数组保存，一次查询只涉及查询词对应的列表
+与向量检索的结果通过倒数排名融合（RRF）合并
+"""
+import re
+import unicodedata
+from collections import Counter
+from typing import Callable, Hashable, Iterable, List, Tuple
+
+import numpy as np
+
+try:
+    import jieba  # 可选依赖
+    jieba.setLogLevel(60)
+except ImportError:
+    jieba = None
+
+_WORD_RE = re.compile(r'[a-z0-9]+(?:[_\-.][a-z0-9]+)*')
+_PART_RE = re.compile(r'[_\-.]')
+_CJK_RUN_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]+')
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of', 'on', 'or',
+    'that', 'the', 'this', 'to', 'was', 'we', 'were', 'which', 'with',
+    '的', '了', '和', '是', '在', '与', '及',
+}
+
+def tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize('NFKC', text).lower()
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        if word in STOPWORDS:
+            continue
+        tokens.append(word)
+        parts = _PART_RE.split(word)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part and part not in STOPWORDS)
+    for run in _CJK_RUN_RE.findall(text):
+        if jieba is not None:
+            tokens.extend(word for word in jieba.cut_for_search(run) if word not in STOPWORDS)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class KeywordIndex:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.refs = []  # 文档编号 -> 调用方的引用（如块存储中的偏移）
+        self.postings = {}  # 词 -> (文档编号数组, 词频数组)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.avg_len = 0.0
+
+    @classmethod
+    def build(cls, docs: Iterable[Tuple[Hashable, str]], **kwargs) -> 'KeywordIndex':
+        """
+        :param docs: (引用, 文本) 序列
+        """
+        index = cls(**kwargs)
+        postings = {}
+        lengths = []
+        for doc_id, (ref, text) in enumerate(docs):
+            counts = Counter(tokenize(text))
+            index.refs.append(ref)
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+        index.postings = {
+            term: (np.array([d for d, _ in plist], dtype=np.int32), np.array([tf for _, tf in plist], dtype=np.float32))
+            for term, plist in postings.items()
+        }
+        index.doc_len = np.array(lengths, dtype=np.float32)
+        index.avg_len = float(index.doc_len.mean()) if lengths else 0.0
+        return index
+
+    @classmethod
+    def from_chunk_store(cls, chunk_store, **kwargs) -> 'KeywordIndex':
+        """从块存储构建，引用为 (offset, length)，命中后再按需读取文本块"""
+        return cls.build((((offset, length), blk.get('text', '')) for offset, length, blk in chunk_store.records()), **kwargs)
+
+    def __len__(self):
+        return len(self.refs)
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[Hashable, float]]:
+        """返回按 BM25 分数降序的 (引用, 分数)"""
+        n = len(self.refs)
+        if n == 0:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / (self.avg_len or 1.0))
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            docs, tfs = posting
+            idf = np.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return []
+        k = min(limit, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.refs[i], float(scores[i])) for i in top]
+
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], key: Callable[[dict], Hashable],
+                           k: int = 60, limit: int = None) -> List[dict]:
+    """
+    倒数排名融合：score(d) = Σ 1 / (k + rank)，只依赖名次，不需要对齐不同检索器的分数尺度
+    同一文档在多个列表中出现时保留先出现的那条记录
+    """
+    scores, docs = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            doc_key = key(doc)
+            scores[doc_key] = scores.get(doc_key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(doc_key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[doc_key] for doc_key in ranked[:limit]]
@@ -1,8 +1,16 @@
+import argparse
 import json
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
 
 from llama_index.core.text_splitter import TokenTextSplitter
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from RAG_Package.embedding_pipeline import EMBED_BATCH_SIZE, insert_embedded
+from RAG_Package.inference_backend import load_embedder
+from RAG_Package.vector_store import DEFAULT_BACKEND, LOCAL_STORE_DIR, LocalVectorStore, VectorStore, open_vector_store
+from RAG_Package.chunk_store import build_chunk_store
+from RAG_Package.index_manifest import IndexManifest, chunk_hash, chunk_key, file_hash, group_by_file_key
 
 from pymilvus import (
     connections,
@@ -23,20 +31,35 @@ MILVUS_PORT = '19530'
 COLLECTION_NAME = 'DL_KDB'
 LOCAL_MODEL_DIR = './local_models/bge-m3'
 VECTOR_DIM = 1024
+VECTOR_BACKEND = DEFAULT_BACKEND  # 'milvus' 或 'local'（环境变量 RAG_VECTOR_BACKEND）
+CHUNK_SIZE = 300
+CHUNK_OVERLAP = 34
+OUT_DIR = './JsonDataBase'
+MANIFEST_PATH = './JsonDataBase/index_manifest.json'
+DELETE_BATCH_SIZE = 500
+PARSE_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # 解析进程数，留一个核给嵌入阶段
 
-# 本地嵌入模型
-embedding = HuggingFaceEmbedding(model_name=LOCAL_MODEL_DIR)
+# 本地嵌入模型（首次使用时加载，解析子进程导入本模块时不会重复加载模型）
+embedding = None
+
+def get_embedding():
+    global embedding
+    if embedding is None:
+        embedding = load_embedder(LOCAL_MODEL_DIR, embed_batch_size=EMBED_BATCH_SIZE)
+    return embedding
 
 
 def process_content_list_docs(
     content_list_path: str,
     chunk_size: int = 300,
     chunk_overlap: int = 34,
+    base_dir: str = None,
 ) -> tuple[list, list]:
     """
     处理单个 content_list.json:
     - 解析 text 块并切分为 text_chunks
     - 保留 equation、table、image 等 block 为 raw_data
+    :param base_dir: 语料根目录，metadata.file_key 记为相对它的路径（默认为文件名）
     返回 (text_chunks, raw_data)
     """
     path = Path(content_list_path)
@@ -54,6 +77,7 @@ def process_content_list_docs(
     )
 
     file_name = path.stem.replace('_content_list', '')
+    file_key = path.relative_to(base_dir).as_posix() if base_dir else path.name
     text_chunks = []
     raw_data = []
 
@@ -62,6 +86,7 @@ def process_content_list_docs(
         page = block.get('page_idx', 0)
         metadata = {
             'file_name': file_name,
+            'file_key': file_key,
             'page': page,
             'block_id': block_id,
             'type': btype
@@ -117,20 +142,57 @@ def process_content_list_docs(
     return text_chunks, raw_data
 
 
+def parse_content_lists(
+    jobs: Iterable[Tuple[object, Optional[str]]],
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    workers: int = PARSE_WORKERS,
+    max_pending: int = None,
+    base_dir: str = None,
+) -> Iterator[Tuple[object, Optional[tuple]]]:
+    """
+    多进程解析 content_list.json，按输入顺序逐个产出 (tag, (text_chunks, raw_data))
+    :param jobs: (tag, 路径) 序列；路径为 None 表示无需解析（结果为 None），仍按原顺序产出
+    :param max_pending: 同时在途的任务数上限，默认为进程数的2倍，避免结果堆积在内存中
+    :param base_dir: 语料根目录，见 process_content_list_docs
+    """
+    max_pending = max_pending or workers * 2
+    if workers <= 1:
+        for tag, path in jobs:
+            yield tag, (process_content_list_docs(path, chunk_size, chunk_overlap, base_dir) if path else None)
+        return
+
+    done = Future()
+    done.set_result(None)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for tag, path in jobs:
+            future = pool.submit(process_content_list_docs, path, chunk_size, chunk_overlap, base_dir) if path else done
+            pending.append((tag, future))
+            if len(pending) >= max_pending:
+                tag, future = pending.popleft()
+                yield tag, future.result()
+        while pending:
+            tag, future = pending.popleft()
+            yield tag, future.result()
+
+
 def process_all_content_lists(
     content_list_dir: str,
     chunk_size: int = 300,
     chunk_overlap: int = 34,
+    workers: int = PARSE_WORKERS,
 ) -> tuple[list, list]:
     """
-    扫描文件夹，对每个 *_content_list.json 调用处理函数，并合并结果
+    扫描文件夹，多进程处理每个 *_content_list.json，并按文件路径顺序合并结果
     """
     base_path = Path(content_list_dir)
     all_text_chunks = []
     all_raw_data = []
 
-    for json_file in base_path.rglob('*_content_list.json'):
-        tc, rd = process_content_list_docs(str(json_file), chunk_size, chunk_overlap)
+    paths = sorted(base_path.rglob('*_content_list.json'))
+    jobs = ((p, str(p)) for p in paths)
+    for _, (tc, rd) in parse_content_lists(jobs, chunk_size, chunk_overlap, workers, base_dir=str(base_path)):
         all_text_chunks.extend(tc)
         all_raw_data.extend(rd)
 
@@ -138,12 +200,17 @@ def process_all_content_lists(
     return all_text_chunks, all_raw_data
 
 
-def create_milvus_collection(collection_name: str):
+def create_milvus_collection(collection_name: str, drop_existing: bool = True):
     if utility.has_collection(collection_name):
+        if not drop_existing:
+            col = Collection(name=collection_name, using='default')
+            col.load()
+            return col
         utility.drop_collection(collection_name)
 
     fields = [
-        FieldSchema(name='id', dtype=DataType.INT64, is_primary=True, auto_id=True),
+        # 主键为 "file_key#chunk_id"（file_key 为相对语料根目录的路径），增量索引时据此覆盖或删除文本块
+        FieldSchema(name='pk', dtype=DataType.VARCHAR, is_primary=True, auto_id=False, max_length=512),
         FieldSchema(name='text', dtype=DataType.VARCHAR, max_length=4096),
         FieldSchema(name='metadata', dtype=DataType.JSON, nullable=True),
         FieldSchema(name='vector', dtype=DataType.FLOAT_VECTOR, dim=VECTOR_DIM)
@@ -158,48 +225,157 @@ def create_milvus_collection(collection_name: str):
     return col
 
 
-def store_in_milvus(chunks: list):
+def has_keyed_schema(collection_name: str) -> bool:
+    """集合是否存在且使用字符串主键（旧版本的自增主键集合无法增量更新）"""
+    if not utility.has_collection(collection_name):
+        return False
+    return any(field.name == 'pk' for field in Collection(name=collection_name, using='default').schema.fields)
+
+
+def open_store(drop_existing: bool) -> VectorStore:
+    """打开写入目标：按本模块 schema 建好的 Milvus 集合，或本地向量库"""
+    if VECTOR_BACKEND == 'local':
+        return LocalVectorStore(LOCAL_STORE_DIR, VECTOR_DIM, reset=drop_existing)
     connections.connect(alias='default', host=MILVUS_HOST, port=MILVUS_PORT)
-    collection = create_milvus_collection(COLLECTION_NAME)
-
-    texts, metas, vecs = [], [], []
-    for chunk in chunks:
-        texts.append(chunk['text'])
-        metas.append(chunk['metadata'])
-        vecs.append(embedding.get_text_embedding(chunk['text']))
-
-    batch_size = 500
-    for i in range(0, len(texts), batch_size):
-        collection.insert([
-            texts[i:i+batch_size],
-            metas[i:i+batch_size],
-            vecs[i:i+batch_size]
-        ])
-    collection.flush()
-    collection.load()
-    print(f"🚀 成功存储 {len(texts)} 条记录到 Milvus 集合 '{COLLECTION_NAME}'")
+    create_milvus_collection(COLLECTION_NAME, drop_existing=drop_existing)
+    return open_vector_store('milvus', COLLECTION_NAME, uri=f"http://{MILVUS_HOST}:{MILVUS_PORT}")
 
 
-if __name__ == '__main__':
-    try:
-        # 1. 批量读取并处理所有 content_list.json
-        text_chunks, raw_data = process_all_content_lists(CONTENT_LIST_DIR)
+def store_ready() -> bool:
+    """已有可增量更新的向量库"""
+    if VECTOR_BACKEND == 'local':
+        return LocalVectorStore.exists(LOCAL_STORE_DIR)
+    connections.connect(alias='default', host=MILVUS_HOST, port=MILVUS_PORT)
+    return has_keyed_schema(COLLECTION_NAME)
+
+
+def milvus_row(chunk: dict, vector: list) -> list:
+    return [chunk_key(chunk), chunk['text'], chunk['metadata'], vector]
+
+
+def store_in_milvus(chunks, batch_size: int = EMBED_BATCH_SIZE):
+    """全量重建：按长度分桶批量嵌入，边嵌入边写入Milvus；chunks 可以是列表或生成器"""
+    store = open_store(drop_existing=True)
+
+    total = insert_embedded(store, chunks, get_embedding(), batch_size=batch_size, make_row=milvus_row)
+    store.flush()
+    store.load()
+    print(f"🚀 成功存储 {total} 条记录到向量库 '{COLLECTION_NAME}'（{VECTOR_BACKEND}）")
 
-        # 2. 确保输出目录存在
-        out_dir = Path('./JsonDataBase')
-        out_dir.mkdir(exist_ok=True)
 
-        # 3. 保存合并后的文本 chunks 和 RawData
-        with open(out_dir / 'text_chunks.json', 'w', encoding='utf-8') as f:
-            json.dump(text_chunks, f, ensure_ascii=False, indent=2)
-        with open(out_dir / 'raw_data.json', 'w', encoding='utf-8') as f:
-            json.dump(raw_data, f, ensure_ascii=False, indent=2)
+def load_json(path: Path, default):
+    if not path.is_file():
+        return default
+    return json.loads(path.read_text(encoding='utf-8'))
+
 
-        print(f"✅ 已将 {len(text_chunks)} 文本 chunks 保存到 {out_dir / 'text_chunks.json'}")
-        print(f"✅ 已将 {len(raw_data)} RawData 条目 保存到 {out_dir / 'raw_data.json'}")
+def save_json(path: Path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
 
-        # 4. 将所有文本 chunks 存入 Milvus
-        store_in_milvus(text_chunks)
+
+def index_content_lists(
+    content_list_dir: str = CONTENT_LIST_DIR,
+    out_dir: str = OUT_DIR,
+    manifest_path: str = MANIFEST_PATH,
+    full: bool = False,
+    batch_size: int = EMBED_BATCH_SIZE,
+    workers: int = PARSE_WORKERS,
+) -> tuple[list, list]:
+    """
+    增量索引：
+    - 内容哈希未变的 content_list.json 不重新解析，直接沿用上次输出的 chunks / RawData
+    - 其余文件在进程池中解析，解析完一个文件就把其中新增或变化的文本块交给嵌入阶段 upsert
+    - 全部文件处理完后删除已经不存在的文本块
+    - 清单缺失、索引参数变化、集合为旧结构或 full=True 时全量重建
+    返回 (text_chunks, raw_data)
+    """
+    out_path = Path(out_dir)
+    out_path.mkdir(exist_ok=True)
+
+    manifest = IndexManifest(manifest_path, settings={
+        'backend': VECTOR_BACKEND,
+        'collection': COLLECTION_NAME,
+        'model': LOCAL_MODEL_DIR,
+        'vector_dim': VECTOR_DIM,
+        'chunk_size': CHUNK_SIZE,
+        'chunk_overlap': CHUNK_OVERLAP,
+    })
+    rebuild = full or manifest.rebuild or not store_ready()
+    if rebuild:
+        manifest.files = {}
+        previous_text, previous_raw = {}, {}
+    else:
+        previous_text = group_by_file_key(load_json(out_path / 'text_chunks.json', []))
+        previous_raw = group_by_file_key(load_json(out_path / 'raw_data.json', []))
+    old_chunks = manifest.chunk_hashes()
+
+    text_chunks, raw_data, files = [], [], {}
+    stats = {'reused': 0, 'changed': 0}
+
+    def jobs():
+        """(文件信息, 需要解析的路径或None)，内容未变的文件不进入进程池"""
+        base_path = Path(content_list_dir)
+        for json_file in sorted(base_path.rglob('*_content_list.json')):
+            file_key = json_file.relative_to(base_path).as_posix()
+            file_name = json_file.stem.replace('_content_list', '')
+            digest = file_hash(str(json_file))
+            reuse = manifest.unchanged(file_key, digest) and (file_key in previous_text or file_key in previous_raw)
+            yield (file_key, file_name, digest), (None if reuse else str(json_file))
+
+    def changed_chunks():
+        for (file_key, file_name, digest), parsed in parse_content_lists(jobs(), CHUNK_SIZE, CHUNK_OVERLAP, workers,
+                                                                           base_dir=content_list_dir):
+            if parsed is None:
+                tc, rd = previous_text.get(file_key, []), previous_raw.get(file_key, [])
+                chunks = manifest.files[file_key]['chunks']
+                stats['reused'] += 1
+            else:
+                tc, rd = parsed
+                chunks = {chunk_key(chunk): chunk_hash(chunk) for chunk in tc}
+
+            files[file_key] = {'hash': digest, 'file_name': file_name, 'chunks': chunks}
+            text_chunks.extend(tc)
+            raw_data.extend(rd)
+            for chunk in tc:
+                if old_chunks.get(chunk_key(chunk)) != chunks[chunk_key(chunk)]:
+                    stats['changed'] += 1
+                    yield chunk
+
+    store = open_store(drop_existing=rebuild)
+    total = insert_embedded(
+        store, changed_chunks(), get_embedding(),
+        batch_size=batch_size, make_row=milvus_row, write='insert' if rebuild else 'upsert'
+    )
+
+    removed = manifest.removed(files)
+    for i in range(0, len(removed), DELETE_BATCH_SIZE):
+        store.delete(removed[i:i + DELETE_BATCH_SIZE])
+    store.flush()
+    store.load()
+    print(f"🔎 {len(files)} 个文件（{stats['reused']} 个未变化），{stats['changed']} 个文本块重新嵌入，{len(removed)} 个被删除")
+
+    # Milvus 更新完成后再写清单，中途失败时下次运行会重新处理这些文本块
+    save_json(out_path / 'text_chunks.json', text_chunks)
+    save_json(out_path / 'raw_data.json', raw_data)
+    build_chunk_store(text_chunks, str(out_path / 'text_chunks.bin'))
+    manifest.save(files)
+    print(f"🚀 写入 {total} 条、删除 {len(removed)} 条记录，向量库 '{COLLECTION_NAME}'（{VECTOR_BACKEND}）已更新")
+    return text_chunks, raw_data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='将 content_list.json 增量索引到 Milvus')
+    parser.add_argument('--dir', default=CONTENT_LIST_DIR, help='content_list.json 所在目录')
+    parser.add_argument('--full', action='store_true', help='忽略清单，全量重建集合')
+    parser.add_argument('--batch-size', type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=PARSE_WORKERS, help='解析进程数，1 表示在当前进程中解析')
+    args = parser.parse_args()
+
+    try:
+        text_chunks, raw_data = index_content_lists(args.dir, full=args.full, batch_size=args.batch_size, workers=args.workers)
+        print(f"✅ 已将 {len(text_chunks)} 文本 chunks 保存到 {Path(OUT_DIR) / 'text_chunks.json'}")
+        print(f"✅ 已将 {len(raw_data)} RawData 条目 保存到 {Path(OUT_DIR) / 'raw_data.json'}")
 
     except Exception as e:
-        print(f"处理失败: {e}")
\ No newline at end of file
+        print(f"处理失败: {e}")
@@ -0,0 +1,86 @@
+"""
+懒加载的查询引擎服务
+导入 RAG_Package.QueryEngine 需要连接向量库、加载 bge-m3 模型和全部文本块，耗时数十秒；
+这里只在第一次需要时（打开RAG开关，或启动时显式预热）在后台线程中完成加载并预热一次模型，
+Web 服务本身的启动不受影响，加载进度可通过 status() 查询
+"""
+import threading
+import time
+import traceback
+
+IDLE, LOADING, READY, FAILED = 'idle', 'loading', 'ready', 'failed'
+
+def _load_query_engine():
+    from RAG_Package.QueryEngine import query_engine
+    query_engine.embedder.get_text_embedding('预热')  # 第一次前向计算较慢，提前在后台完成
+    return query_engine
+
+class QueryEngineService:
+    def __init__(self, loader=_load_query_engine):
+        self._loader = loader
+        self._state = IDLE
+        self._engine = None
+        self._error = None
+        self._started_at = None
+        self._load_seconds = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def warm_up(self):
+        """开始后台加载（已在加载或已就绪时什么也不做，加载失败后可再次调用重试）"""
+        with self._lock:
+            if self._state in (LOADING, READY):
+                return
+            self._state, self._error = LOADING, None
+            self._started_at = time.time()
+            self._done.clear()
+        threading.Thread(target=self._load, name='rag-warmup', daemon=True).start()
+
+    def _load(self):
+        try:
+            engine = self._loader()
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock:
+                self._state, self._error = FAILED, f"{type(e).__name__}: {e}"
+        else:
+            with self._lock:
+                self._state, self._engine = READY, engine
+                self._load_seconds = time.time() - self._started_at
+            print(f"📚 RAG查询引擎就绪，用时 {self._load_seconds:.1f}s")
+        finally:
+            self._done.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._state == READY
+
+    def status(self) -> dict:
+        with self._lock:
+            status = {'state': self._state, 'ready': self._state == READY}
+            if self._state == LOADING:
+                status['elapsed'] = round(time.time() - self._started_at, 1)
+            if self._load_seconds is not None:
+                status['load_seconds'] = round(self._load_seconds, 1)
+            if self._error:
+                status['error'] = self._error
+            return status
+
+    def get(self, timeout: float = None):
+        """
+        获取查询引擎，未加载时触发加载并最多等待 timeout 秒
+        :raises TimeoutError: 超时仍未就绪
+        :raises RuntimeError: 加载失败
+        """
+        self.warm_up()
+        if not self._done.wait(timeout):
+            raise TimeoutError("RAG查询引擎仍在加载中")
+        if self._state != READY:
+            raise RuntimeError(f"RAG查询引擎加载失败: {self._error}")
+        return self._engine
+
+    def query(self, *args, **kwargs):
+        """与 QueryEngine.query 相同；引擎未就绪时阻塞直到加载完成"""
+        return self.get().query(*args, **kwargs)
+
+query_engine = QueryEngineService()
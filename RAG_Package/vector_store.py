@@ -0,0 +1,461 @@
+"""
+向量库接口与实现：
+- MilvusVectorStore：原有的 Milvus 服务
+- LocalVectorStore：进程内的嵌入式向量库，向量以 float32 矩阵存放在磁盘上并内存映射，
+  支持精确检索与 IVF 近似检索，无需启动 Milvus，适合小规模部署和CI
+
+两者的行格式一致：按列传入 [pk, text, metadata, vector]；检索结果与 MilvusClient.search 相同，
+即每个查询向量对应一个列表，元素为 {'id', 'distance', 'entity': {字段: 值}}，距离为L2距离的平方
+"""
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+MILVUS_URI = "http://0.0.0.0:19530"
+LOCAL_STORE_DIR = './JsonDataBase/vector_store'
+DEFAULT_BACKEND = os.getenv('RAG_VECTOR_BACKEND', 'milvus')  # 'milvus' 或 'local'
+FIELDS = ('pk', 'text', 'metadata', 'vector')
+PAYLOAD_FILE = 'payload.jsonl'
+_DECODER = json.JSONDecoder()
+
+
+class VectorStore:
+    """向量库接口"""
+    def insert(self, columns: list):
+        raise NotImplementedError
+
+    def upsert(self, columns: list):
+        """按主键覆盖已有记录，不存在则插入"""
+        raise NotImplementedError
+
+    def delete(self, keys: Sequence[str]):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def load(self):
+        pass
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def search(self, vectors: list, limit: int, output_fields: Iterable[str] = ('text', 'metadata')) -> List[List[dict]]:
+        raise NotImplementedError
+
+
+class MilvusVectorStore(VectorStore):
+    def __init__(self, client, collection_name: str, search_params: dict = None):
+        self.client = client
+        self.collection_name = collection_name
+        self.search_params = search_params or {"metric_type": "L2", "params": {'nlist': 480}}
+
+    @staticmethod
+    def _rows(columns: list) -> List[dict]:
+        return [dict(zip(FIELDS, row)) for row in zip(*columns)]
+
+    def insert(self, columns: list):
+        self.client.insert(collection_name=self.collection_name, data=self._rows(columns))
+
+    def upsert(self, columns: list):
+        self.client.upsert(collection_name=self.collection_name, data=self._rows(columns))
+
+    def delete(self, keys: Sequence[str]):
+        self.client.delete(collection_name=self.collection_name, ids=list(keys))
+
+    def flush(self):
+        self.client.flush(collection_name=self.collection_name)
+
+    def load(self):
+        self.client.load_collection(collection_name=self.collection_name)
+
+    def count(self) -> int:
+        return int(self.client.get_collection_stats(collection_name=self.collection_name)['row_count'])
+
+    def search(self, vectors: list, limit: int, output_fields: Iterable[str] = ('text', 'metadata')) -> List[List[dict]]:
+        return self.client.search(
+            collection_name=self.collection_name,
+            data=vectors,
+            anns_field="vector",
+            search_params=self.search_params,
+            limit=limit,
+            output_fields=list(output_fields)
+        )
+
+
+class LocalVectorStore(VectorStore):
+    """
+    目录结构：
+    - store.json    维度、行数等元信息
+    - vectors.f32   [容量, 维度] 的 float32 矩阵，np.memmap 映射，按需倍增
+    - payload.jsonl 每行一条 [pk, text, metadata] 的 JSON，与向量按行对齐，只追加写入；
+                    内存中只保留各行的偏移与主键，检索命中后才从磁盘读取文本和元数据
+    - alive.npy     行是否有效（删除/覆盖只打墓碑标记，墓碑过多时在 flush 中压缩）
+    - ivf.npz       IVF 聚类中心与每行所属的倒排列表
+
+    写入在锁内进行；检索读取的是不可变快照，与写入并发时不会读到写了一半的数组
+    """
+    BLOCK_ROWS = 8192  # 精确检索时每次从磁盘读入的行数
+
+    def __init__(self, root: str = LOCAL_STORE_DIR, dim: int = None, nlist: int = None, nprobe: int = 16,
+                 ivf_threshold: int = 4096, reset: bool = False):
+        """
+        :param dim: 向量维度，默认沿用库中记录的维度（新库为1024）
+        :param nlist: IVF 聚类数，默认 4*sqrt(行数)
+        :param nprobe: 近似检索时查找的倒排列表数
+        :param ivf_threshold: 有效行数达到该值后才建立 IVF 索引，此前始终精确检索
+        :param reset: 清空已有数据（全量重建）
+        """
+        self.root = Path(root)
+        if reset and self.root.exists():
+            shutil.rmtree(self.root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ivf_threshold = ivf_threshold
+        self._lock = threading.RLock()
+
+        meta = self._read_json('store.json', {'dim': dim or 1024, 'count': 0})
+        if dim is not None and meta['dim'] != dim:
+            raise ValueError(f"向量维度不匹配：库中为 {meta['dim']}，当前为 {dim}")
+        self.dim = meta['dim']
+        self._count = meta['count']
+        alive_path = self.root / 'alive.npy'
+        self._alive = np.load(alive_path)[:self._count] if alive_path.exists() else np.ones(self._count, dtype=bool)
+        self._offsets, pks = self._open_payload()  # 第 i 行位于 payload.jsonl 的 [offsets[i], offsets[i+1])
+        self._positions = {pk: i for i, pk in enumerate(pks) if self._alive[i]}
+        self._reader = open(self.root / PAYLOAD_FILE, 'rb', buffering=0)
+        self._read_lock = threading.Lock()
+        self._reader_users = {}  # reader -> 正在使用它的检索数；压缩后旧句柄在最后一个检索结束时关闭
+
+        self._vectors = None
+        if (self.root / 'vectors.f32').exists():
+            self._vectors = self._open_vectors()
+        self._norms = self._compute_norms(self._vectors, self._count)
+
+        self._centroids, self._assign, self._trained_on = None, np.full(self._count, -1, dtype=np.int32), 0
+        ivf_path = self.root / 'ivf.npz'
+        if ivf_path.exists():
+            ivf = np.load(ivf_path)
+            if len(ivf['assign']) == self._count:
+                self._centroids, self._assign, self._trained_on = ivf['centroids'], ivf['assign'], int(ivf['trained_on'])
+        self._lists = self._build_lists(self._assign, self._centroids)
+        self._indexed = self._count  # 此前的行都已分配倒排列表（或已删除）
+
+    @staticmethod
+    def exists(root: str = LOCAL_STORE_DIR) -> bool:
+        return (Path(root) / 'store.json').exists()
+
+    # ---------- 文件读写 ----------
+    def _read_json(self, name: str, default):
+        path = self.root / name
+        if not path.exists():
+            return default
+        return json.loads(path.read_text(encoding='utf-8'))
+
+    def _write_json(self, name: str, data):
+        tmp_path = self.root / (name + '.tmp')
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, self.root / name)
+
+    @staticmethod
+    def _encode_row(pk, text, metadata) -> bytes:
+        return (json.dumps([pk, text, metadata], ensure_ascii=False) + '\n').encode('utf-8')
+
+    def _open_payload(self):
+        """
+        扫描 payload.jsonl，返回各行的偏移与主键（只解析主键，不保留文本）；
+        上次 flush 之后追加、尚未提交的行被截掉。旧版本的 payload.json 在这里一次性转换
+        """
+        path = self.root / PAYLOAD_FILE
+        legacy_path = self.root / 'payload.json'
+        if legacy_path.exists() and not path.exists():
+            rows = self._read_json('payload.json', [])[:self._count]
+            with open(path, 'wb') as f:
+                f.writelines(self._encode_row(*row) for row in rows)
+            os.remove(legacy_path)
+
+        offsets, pks = [0], []
+        if path.exists():
+            with open(path, 'rb') as f:
+                for line in f:
+                    if len(pks) == self._count:
+                        break
+                    pks.append(_DECODER.raw_decode(line.decode('utf-8'), 1)[0])  # 行首为 ["pk", ...
+                    offsets.append(offsets[-1] + len(line))
+            if os.path.getsize(path) > offsets[-1]:
+                os.truncate(path, offsets[-1])
+        else:
+            path.touch()
+        if len(pks) < self._count:
+            raise ValueError(f"❌ {path} 只有 {len(pks)} 行，store.json 记录为 {self._count} 行")
+        return np.array(offsets, dtype=np.int64), pks
+
+    def _read_raw(self, reader, offsets: np.ndarray, row: int) -> bytes:
+        start, stop = int(offsets[row]), int(offsets[row + 1])
+        with self._read_lock:
+            reader.seek(start)
+            return reader.read(stop - start)
+
+    def _open_vectors(self):
+        path = self.root / 'vectors.f32'
+        capacity = os.path.getsize(path) // (4 * self.dim)
+        if capacity == 0:
+            return None
+        return np.memmap(path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows: int):
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 1024)
+        if self._vectors is not None:
+            self._vectors.flush()
+        with open(self.root / 'vectors.f32', 'ab') as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._vectors = self._open_vectors()
+
+    def _compute_norms(self, vectors, count: int) -> np.ndarray:
+        norms = np.empty(count, dtype=np.float32)
+        for start in range(0, count, self.BLOCK_ROWS):
+            block = np.asarray(vectors[start:min(start + self.BLOCK_ROWS, count)])
+            norms[start:start + len(block)] = np.einsum('ij,ij->i', block, block)
+        return norms
+
+    # ---------- 写入 ----------
+    def _write(self, columns: list, upsert: bool):
+        pks, texts, metadatas, vectors = columns
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.size == 0:
+            vectors = vectors.reshape(0, self.dim)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f"向量维度不匹配：应为 (n, {self.dim})，实际为 {vectors.shape}")
+        lengths = [len(pks), len(texts), len(metadatas), len(vectors)]
+        if len(set(lengths)) != 1:
+            raise ValueError(f"各列行数不一致（pk, text, metadata, vector）: {lengths}")
+        if not lengths[0]:
+            return
+        with self._lock:
+            if not upsert:
+                duplicated = [pk for pk in pks if pk in self._positions]
+                if duplicated:
+                    raise ValueError(f"主键已存在: {duplicated[:5]}")
+            start, n = self._count, len(pks)
+            self._ensure_capacity(start + n)
+            self._vectors[start:start + n] = vectors
+            lines = [self._encode_row(*row) for row in zip(pks, texts, metadatas)]
+            with open(self.root / PAYLOAD_FILE, 'ab') as f:
+                f.writelines(lines)
+
+            alive = np.concatenate([self._alive, np.ones(n, dtype=bool)])
+            for offset, pk in enumerate(pks):
+                old = self._positions.get(pk)
+                if old is not None:
+                    alive[old] = False
+                self._positions[pk] = start + offset
+            self._offsets = np.concatenate([self._offsets, self._offsets[-1] + np.cumsum([len(line) for line in lines])])
+            self._norms = np.concatenate([self._norms, np.einsum('ij,ij->i', vectors, vectors)])
+            self._assign = np.concatenate([self._assign, np.full(n, -1, dtype=np.int32)])
+            self._alive = alive
+            self._count = start + n
+
+    def insert(self, columns: list):
+        self._write(columns, upsert=False)
+
+    def upsert(self, columns: list):
+        self._write(columns, upsert=True)
+
+    def delete(self, keys: Sequence[str]):
+        with self._lock:
+            alive = self._alive.copy()
+            for key in keys:
+                row = self._positions.pop(key, None)
+                if row is not None:
+                    alive[row] = False
+            self._alive = alive
+
+    def count(self) -> int:
+        return len(self._positions)
+
+    def flush(self):
+        """落盘，并按需压缩墓碑、更新 IVF 索引"""
+        with self._lock:
+            dead = self._count - len(self._positions)
+            if dead > max(1024, self._count // 2):
+                self._compact()
+            self._update_ivf()
+            if self._vectors is not None:
+                self._vectors.flush()
+            np.save(self.root / 'alive.npy', self._alive)
+            if self._centroids is not None:
+                np.savez(self.root / 'ivf.npz', centroids=self._centroids, assign=self._assign,
+                         trained_on=self._trained_on)
+            elif (self.root / 'ivf.npz').exists():
+                os.remove(self.root / 'ivf.npz')
+            self._write_json('store.json', {'dim': self.dim, 'count': self._count})
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive)
+        vectors = np.asarray(self._vectors[keep]) if len(keep) else np.empty((0, self.dim), dtype=np.float32)
+        self._vectors = None
+        os.remove(self.root / 'vectors.f32')
+        self._ensure_capacity(len(keep))
+        if len(keep):
+            self._vectors[:len(keep)] = vectors
+
+        path = self.root / PAYLOAD_FILE
+        tmp_path = self.root / (PAYLOAD_FILE + '.tmp')
+        offsets = [0]
+        with open(tmp_path, 'wb') as f:
+            for row in keep:
+                line = self._read_raw(self._reader, self._offsets, row)
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        os.replace(tmp_path, path)
+        # 正在检索的线程仍持有旧文件的句柄，读到的是旧快照；旧句柄在这些检索结束后关闭
+        old_reader, self._reader = self._reader, open(path, 'rb', buffering=0)
+        if old_reader not in self._reader_users:
+            old_reader.close()
+        self._offsets = np.array(offsets, dtype=np.int64)
+
+        new_rows = np.full(self._count, -1, dtype=np.int64)
+        new_rows[keep] = np.arange(len(keep))
+        self._positions = {pk: int(new_rows[row]) for pk, row in self._positions.items()}
+        self._norms = self._norms[keep]
+        self._assign = self._assign[keep]
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._count = len(keep)
+
+    # ---------- IVF ----------
+    def _update_ivf(self):
+        live = len(self._positions)
+        if live < self.ivf_threshold:
+            self._centroids, self._trained_on = None, 0
+            self._assign = np.full(self._count, -1, dtype=np.int32)
+        elif self._centroids is None or live >= 2 * self._trained_on:
+            self._train_ivf()
+        else:
+            pending = np.flatnonzero(self._assign < 0)
+            self._assign = self._assign.copy()
+            self._assign[pending] = self._nearest_centroids(pending)
+        self._lists = self._build_lists(self._assign, self._centroids)
+        self._indexed = self._count
+
+    def _nearest_centroids(self, rows: np.ndarray) -> np.ndarray:
+        assign = np.empty(len(rows), dtype=np.int32)
+        centroid_norms = np.einsum('ij,ij->i', self._centroids, self._centroids)
+        for start in range(0, len(rows), self.BLOCK_ROWS):
+            block_rows = rows[start:start + self.BLOCK_ROWS]
+            block = np.asarray(self._vectors[block_rows])
+            assign[start:start + len(block_rows)] = np.argmin(centroid_norms - 2 * block @ self._centroids.T, axis=1)
+        return assign
+
+    def _train_ivf(self, iterations: int = 10, seed: int = 0):
+        """在有效行的采样上跑 k-means，再把所有行分配到最近的中心"""
+        live_rows = np.flatnonzero(self._alive)
+        nlist = self.nlist or int(4 * np.sqrt(len(live_rows)))
+        nlist = max(1, min(nlist, len(live_rows) // 39 or 1))
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(live_rows, size=min(len(live_rows), 64 * nlist), replace=False))
+        sample = np.asarray(self._vectors[sample_rows])
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+            labels = np.argmin(centroid_norms - 2 * sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        self._centroids = centroids
+        self._assign = np.full(self._count, -1, dtype=np.int32)
+        self._assign[live_rows] = self._nearest_centroids(live_rows)
+        self._trained_on = len(live_rows)
+
+    @staticmethod
+    def _build_lists(assign: np.ndarray, centroids) -> List[np.ndarray]:
+        if centroids is None:
+            return []
+        order = np.argsort(assign, kind='stable')
+        bounds = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+        return [order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+
+    # ---------- 检索 ----------
+    def search(self, vectors: list, limit: int, output_fields: Iterable[str] = ('text', 'metadata'),
+               exact: bool = False) -> List[List[dict]]:
+        """
+        :param exact: 为 True 时忽略 IVF 索引，逐行精确计算距离
+        """
+        queries = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:  # 取快照，之后的计算不持锁
+            count, data, norms, alive = self._count, self._vectors, self._norms, self._alive
+            offsets, reader = self._offsets, self._reader
+            centroids, lists, indexed = self._centroids, self._lists, self._indexed
+            self._reader_users[reader] = self._reader_users.get(reader, 0) + 1
+        try:
+            if count == 0 or data is None:
+                return [[] for _ in queries]
+
+            output_fields = list(output_fields)
+            if centroids is not None:
+                centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+                unindexed = np.arange(indexed, count)  # 上次 flush 之后写入的行尚未分配倒排列表，一律参与计算
+            results = []
+            for q in queries:
+                if centroids is None or exact:
+                    distances = np.empty(count, dtype=np.float32)
+                    for start in range(0, count, self.BLOCK_ROWS):
+                        stop = min(start + self.BLOCK_ROWS, count)
+                        distances[start:stop] = norms[start:stop] - 2 * (np.asarray(data[start:stop]) @ q)
+                    candidates = np.flatnonzero(alive)
+                    distances = distances[candidates]
+                else:
+                    probes = np.argsort(centroid_norms - 2 * centroids @ q)[:self.nprobe]
+                    candidates = np.concatenate([lists[p] for p in probes] + [unindexed])
+                    candidates = np.sort(candidates[alive[candidates]])
+                    distances = norms[candidates] - 2 * (np.asarray(data[candidates]) @ q)
+
+                k = min(limit, len(candidates))
+                if k == 0:
+                    results.append([])
+                    continue
+                top = np.argpartition(distances, k - 1)[:k]
+                top = top[np.argsort(distances[top])]
+                q_norm = float(q @ q)
+                hits = []
+                for i in top:
+                    pk, text, metadata = json.loads(self._read_raw(reader, offsets, candidates[i]))
+                    values = {'pk': pk, 'text': text, 'metadata': metadata}
+                    hits.append({
+                        'id': pk,
+                        'distance': max(float(distances[i]) + q_norm, 0.0),
+                        'entity': {field: values[field] for field in output_fields if field in values}
+                    })
+                results.append(hits)
+            return results
+        finally:
+            self._release_reader(reader)
+
+    def _release_reader(self, reader):
+        with self._lock:
+            self._reader_users[reader] -= 1
+            if self._reader_users[reader] == 0:
+                del self._reader_users[reader]
+                if reader is not self._reader:  # 压缩时被替换下来的旧句柄
+                    reader.close()
+
+
+def open_vector_store(backend: str = DEFAULT_BACKEND, collection_name: str = 'DL_KDB', uri: str = MILVUS_URI,
+                      root: str = LOCAL_STORE_DIR, dim: int = None, **kwargs) -> VectorStore:
+    """按配置打开向量库：'milvus' 连接 Milvus 服务，'local' 使用本地内存映射文件"""
+    if backend == 'local':
+        return LocalVectorStore(root, dim, **kwargs)
+    if backend == 'milvus':
+        from pymilvus import MilvusClient  # 仅在使用 Milvus 时才需要安装和连接
+        return MilvusVectorStore(MilvusClient(uri=uri), collection_name, **kwargs)
+    raise ValueError(f"未知的向量库类型: {backend}")
@@ -0,0 +1,257 @@
+"""
+异步（ASGI）服务模式
+路由与 main.py 完全一致，业务逻辑和全局状态（对话库、记忆、Bedrock封装）直接复用 main.py；
+区别在于每个请求都是协程：Bedrock / Polly 的阻塞调用放到专用线程池里 await，
+Transcribe 使用其原生的 asyncio SDK，多个对话在同一个事件循环上并发。
+
+启动：hypercorn asgi_main:app --bind 127.0.0.1:5000
+"""
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import amazon_transcribe.exceptions
+from quart import Quart, Response, request, g, jsonify, abort, send_from_directory, send_file
+from quart_cors import cors
+
+import main as wsgi  # 复用同步版本的全局状态与前处理逻辑
+from main import manager, image_store, bedrock, prepare_submit, save_exchange, sse_event, query_engine, remove_dialogue
+from AWS_Service.config import config
+from AWS_Service.request_builder import update_profile
+from AWS_Service.Polly import Reader
+from AWS_Service.Transcribe import TranscribeService
+from tools.image_store import with_image_urls
+
+BLOCKING_WORKERS = 64  # boto3 没有原生异步接口，阻塞调用在这个线程池里执行
+
+app = cors(Quart(__name__, static_folder='static'), allow_origin='*')
+
+@app.before_serving
+async def setup_executor():
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=BLOCKING_WORKERS))
+
+async def run_blocking(func, *args, **kwargs):
+    """在线程池中执行阻塞函数并等待结果"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+async def iterate_blocking(make_iter):
+    """在线程池中消费同步生成器，逐项交给事件循环（用于Bedrock流式输出）"""
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    done = object()
+
+    def worker():
+        try:
+            for item in make_iter():
+                loop.call_soon_threadsafe(items.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(items.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(items.put_nowait, done)
+
+    loop.run_in_executor(None, worker)
+    while True:
+        item = await items.get()
+        if item is done:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+def session_id():
+    """客户端会话标识，规则与 main.session_id 相同"""
+    sid = (request.headers.get('X-Session-Id')
+           or request.args.get('session_id')
+           or request.cookies.get('session_id'))
+    if sid:
+        return sid
+    if 'new_session_id' not in g:
+        g.new_session_id = uuid.uuid4().hex
+    return g.new_session_id
+
+@app.after_request
+async def issue_session_cookie(response):
+    """与 main.issue_session_cookie 相同：请求没有携带会话标识时下发 session_id Cookie"""
+    session_id()
+    if 'new_session_id' in g:
+        response.set_cookie('session_id', g.new_session_id, max_age=wsgi.SESSION_COOKIE_MAX_AGE,
+                            httponly=True, samesite='Lax')
+    return response
+
+@app.route('/')
+async def index():
+    return await send_from_directory(app.static_folder, 'index.html')
+
+@app.route('/<path:path>')
+async def static_proxy(path):
+    return await send_from_directory(app.static_folder, path)
+
+# 1. 创建新对话
+@app.route('/api/create_dialogue', methods=['POST'])
+async def create_dialogue():
+    data = await request.get_json()
+    title = data.get('title', '')
+    timestamp = await run_blocking(manager.create_dialogue, title, session_id=session_id())
+    return jsonify({'id': timestamp}),201
+
+# 2. 获取所有对话列表
+@app.route('/api/dialogue_list', methods=['GET'])
+async def dialogue_list():
+    dialogues = await run_blocking(manager.get_all_dialogues)
+    dialogues.reverse() # 按照从最近到过往的顺序返回
+    return jsonify(dialogues)
+
+# 3. 获取会话内的所有轮次的消息
+@app.route('/api/get_messages/<dialogue_id>', methods=['GET'])
+async def update_messages(dialogue_id):
+    if await run_blocking(manager.select_dialogue, dialogue_id, session_id=session_id()):
+        turns = with_image_urls(await run_blocking(manager.get_turns, dialogue_id))
+        return jsonify(turns),200
+    else:
+        abort(500, description="dialogue doesn't exist")
+
+# 3.1 按摘要读取图片
+@app.route('/api/image/<blob>', methods=['GET'])
+async def get_image(blob):
+    if not image_store.exists(blob):
+        abort(404, description="image doesn't exist")
+    return await send_file(image_store.path(blob), mimetype=image_store.media_type(blob),
+                           conditional=True, cache_timeout=31536000)
+
+# 3.2 删除对话
+@app.route('/api/delete_dialogue', methods=['POST'])
+async def delete_dialogue():
+    data = await request.get_json(silent=True) or {}
+    if not await run_blocking(remove_dialogue, data.get('id'), session_id()):
+        abort(404, description="dialogue doesn't exist")
+    return jsonify({'status':'success'}),200
+
+@app.route('/api/settings', methods=['POST'])
+async def model_schema_settings():
+    try:
+        data = await request.get_json()
+        required_fields = ['temperature', 'top_k', 'top_p', 'max_tokens', 'prompt']
+        if not all(field in data for field in required_fields):
+            return jsonify({'error': '缺少必要的配置字段'}), 400
+
+        update_profile(
+            temperature=data['temperature'],
+            top_k=data['top_k'],
+            top_p=data['top_p'],
+            max_tokens=data['max_tokens'],
+            system=data['prompt'],  # 将 prompt 设置为 system 提示词
+        )
+        return jsonify({"message": "配置更新成功"}), 200
+    except Exception as e:
+        return jsonify({'error': f'配置更新失败: {str(e)}'}), 500
+
+@app.route('/api/update_title',methods=['POST'])
+async def update_title():
+    data = await request.get_json()
+    invoke_text = "为下面的对话总结摘要一个标题，字数限制10个汉字以内：\n" + str([{'speaker':item['speaker'],'content':item['content']} for item in data['content']])
+    ret = await run_blocking(bedrock.invoke_model, invoke_text, overrides={'max_tokens': 32})
+    await run_blocking(manager.update_title, data['id'], ret)
+    return jsonify({'status':'success'}),200
+
+reader = None
+
+@app.route('/api/read',methods=['POST','GET'])
+async def read_content():
+    global reader
+    if request.method == 'POST':
+        data = await request.get_json()
+        reader = Reader(data['content'])
+        reader.start()
+        return jsonify({'status':'success'}),200
+    elif request.method == 'GET':
+        if reader is not None:
+            reader.stop()
+            await run_blocking(reader.join)
+            reader = None
+        return jsonify({'status':'success'}),200
+
+transcriber = None
+transcriber_lock = asyncio.Lock()
+
+@app.route('/api/transcribe', methods=['POST', 'GET'])
+async def toggle_transcribe():
+    global transcriber
+    async with transcriber_lock:
+        if request.method == 'POST':
+            if transcriber is not None: # 终止之前的服务（如果有）
+                await transcriber.stop_transcription()
+            transcriber = TranscribeService(region=config['region'], language_code='zh-CN')
+            await transcriber.start_transcription()
+            return jsonify({'status': 'started', 'tip': 'Call GET to get result'}), 200
+
+        svc, transcriber = transcriber, None
+        if svc is None:
+            return jsonify({'error': 'Timeout waiting for transcription'}), 504
+        try:
+            text = await asyncio.wait_for(svc.stop_transcription(), timeout=30)
+        except asyncio.TimeoutError:
+            return jsonify({'error': 'Timeout waiting for transcription'}), 504
+        except amazon_transcribe.exceptions.BadRequestException as e:
+            print("Error:",e.args)
+            return jsonify({'error': 'Your request timed out because no new audio was received for 15 seconds.'}), 504
+        return jsonify({'text': text}), 200
+
+@app.route('/api/rag_toggle', methods=['POST','OPTIONS'])
+async def rag_toggle():
+    if request.method == 'OPTIONS':
+        return '', 200
+    data = await request.get_json()
+    wsgi.isRAGEnabled = data['rag_enabled']  # prepare_submit 读取的是 main 模块里的开关
+    if wsgi.isRAGEnabled:
+        query_engine.warm_up()
+    return jsonify({'status': 'success', 'rag': query_engine.status()}), 200
+
+@app.route('/api/rag_status', methods=['GET'])
+async def rag_status():
+    return jsonify(query_engine.status()), 200
+
+async def prepare(data):
+    try:
+        return await run_blocking(prepare_submit, data, session_id())
+    except ValueError as e:
+        abort(400, description=str(e))
+
+@app.route('/api/submit', methods=['POST'])
+async def handleSubmit():
+    data = await request.get_json()
+    ctx = await prepare(data)
+    response, model_usage = await run_blocking(
+        bedrock.invoke_model, ctx['request_text'], dialogue_list=ctx['turns_format'],
+        images=ctx['images'], return_usage=True
+    )
+    await run_blocking(save_exchange, ctx['dialogue_id'], data, response)
+    usage = {**ctx['memory_usage'], 'model': model_usage}
+    return jsonify({'query':ctx['request_text'], 'res':response,'memory':ctx['turns_format'],'usage':usage}), 200
+
+@app.route('/api/submit_stream', methods=['POST'])
+async def handleSubmitStream():
+    data = await request.get_json()
+    ctx = await prepare(data)
+
+    async def generate():
+        yield sse_event({'query': ctx['request_text'], 'memory': ctx['turns_format'], 'usage': ctx['memory_usage']}, 'meta')
+        response = ''
+        try:
+            async for sentence in iterate_blocking(lambda: bedrock.stream_sentences(
+                    ctx['request_text'], dialogue_list=ctx['turns_format'], images=ctx['images'])):
+                response += sentence
+                yield sse_event({'text': sentence})
+        except Exception as e:
+            # 生成中断：不保存不完整的回答
+            yield sse_event({'error': str(e), 'res': response}, 'error')
+            return
+        if response:
+            await run_blocking(save_exchange, ctx['dialogue_id'], data, response)
+        yield sse_event({'res': response, 'usage': ctx['memory_usage']}, 'done')
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+if __name__ == '__main__':
+    app.run(debug=True)
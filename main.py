@@ -1,5 +1,5 @@
 import amazon_transcribe.exceptions
-from flask import Flask, request, jsonify, abort, send_from_directory
+from flask import Flask, Response, request, g, jsonify, abort, send_from_directory, send_file, stream_with_context
 from flask_cors import CORS
 
 
@@ -14,16 +14,45 @@ def index():
 def static_proxy(path):
     return send_from_directory(app.static_folder, path)
 
-from tools.dialogue_database import DialogueManager
-
-manager = DialogueManager('./tools/test_db.json')
+from tools.dialogue_database import DialogueManager, DEFAULT_SESSION
+from tools.image_store import ImageBlobStore, with_image_urls
+
+import os
+manager = DialogueManager(os.getenv('NEXT_DB_PATH', './tools/test_db.json')) # 可用环境变量指定数据库（如压测时使用临时库）
+image_store = ImageBlobStore('./tools/image_blobs') # 图片按内容去重存储，轮次中只保存引用
+
+import uuid
+SESSION_COOKIE_MAX_AGE = 30 * 24 * 3600  # 下发的会话Cookie有效期（秒）
+
+def session_id():
+    """
+    客户端会话标识：请求头 X-Session-Id > 查询参数 session_id > Cookie；
+    都没有时生成一个随机标识，由 issue_session_cookie 在响应中下发，之后同一浏览器的请求都落在这个会话上
+    """
+    sid = (request.headers.get('X-Session-Id')
+           or request.args.get('session_id')
+           or request.cookies.get('session_id'))
+    if sid:
+        return sid
+    if 'new_session_id' not in g:
+        g.new_session_id = uuid.uuid4().hex
+    return g.new_session_id
+
+@app.after_request
+def issue_session_cookie(response):
+    """请求没有携带会话标识时下发 session_id Cookie（首次打开页面即获得独立会话）"""
+    session_id()
+    if 'new_session_id' in g:
+        response.set_cookie('session_id', g.new_session_id, max_age=SESSION_COOKIE_MAX_AGE,
+                            httponly=True, samesite='Lax')
+    return response
 
 # 1. 创建新对话
 @app.route('/api/create_dialogue', methods=['POST'])
 def create_dialogue():
     data = request.get_json()
     title = data.get('title', '')
-    timestamp = manager.create_dialogue(title)
+    timestamp = manager.create_dialogue(title, session_id=session_id())
     return jsonify({'id': timestamp}),201 
 
 # 2. 获取所有对话列表
@@ -36,15 +65,39 @@ def dialogue_list():
 # 3. 获取会话内的所有轮次的消息
 @app.route('/api/get_messages/<dialogue_id>', methods=['GET'])
 def update_messages(dialogue_id):
-    if manager.select_dialogue(dialogue_id):
-        turns = manager.get_current_turns()
+    if manager.select_dialogue(dialogue_id, session_id=session_id()):
+        # 图片只返回引用和地址，由前端通过 /api/image/<blob> 按需加载
+        turns = with_image_urls(manager.get_turns(dialogue_id))
         return jsonify(turns),200
     else:
         abort(500, description="dialogue doesn't exist")
 
+# 3.1 按摘要读取图片（内容寻址，永不变化，可长期缓存）
+@app.route('/api/image/<blob>', methods=['GET'])
+def get_image(blob):
+    if not image_store.exists(blob):
+        abort(404, description="image doesn't exist")
+    return send_file(image_store.path(blob), mimetype=image_store.media_type(blob),
+                     conditional=True, etag=blob, max_age=31536000)
+
+# 3.2 删除对话（未指定ID时删除当前会话的当前对话），同时丢弃它的记忆摘要缓存
+def remove_dialogue(dialogue_id=None, sid=DEFAULT_SESSION) -> bool:
+    dialogue_id = dialogue_id or manager.session(sid).get_current_dialogue_id()
+    if not manager.delete_dialogue(dialogue_id):
+        return False
+    memory.forget(dialogue_id)
+    return True
+
+@app.route('/api/delete_dialogue', methods=['POST'])
+def delete_dialogue():
+    data = request.get_json(silent=True) or {}
+    if not remove_dialogue(data.get('id'), session_id()):
+        abort(404, description="dialogue doesn't exist")
+    return jsonify({'status':'success'}),200
+
 @app.route('/api/settings', methods=['POST'])
 def model_schema_settings():
-    from AWS_Service.config import api_request
+    from AWS_Service.request_builder import update_profile
     try:
         # 获取前端发送的 JSON 数据
         data = request.get_json()
@@ -54,12 +107,14 @@ def model_schema_settings():
         if not all(field in data for field in required_fields):
             return jsonify({'error': '缺少必要的配置字段'}), 400
 
-        # 更新模型配置
-        api_request['body']['temperature'] = data['temperature']
-        api_request['body']['top_k'] = data['top_k']
-        api_request['body']['top_p'] = data['top_p']
-        api_request['body']['max_tokens'] = data['max_tokens']
-        api_request['body']['system'] = data['prompt']  # 将 prompt 设置为 system 提示词
+        # 更新模型配置（整体替换只读快照，不影响正在进行的请求）
+        update_profile(
+            temperature=data['temperature'],
+            top_k=data['top_k'],
+            top_p=data['top_p'],
+            max_tokens=data['max_tokens'],
+            system=data['prompt'],  # 将 prompt 设置为 system 提示词
+        )
 
         return jsonify({"message": "配置更新成功"}), 200
     except Exception as e:
@@ -69,11 +124,8 @@ def model_schema_settings():
 def update_title():
     data = request.get_json()
     invoke_text = "为下面的对话总结摘要一个标题，字数限制10个汉字以内：\n" + str([{'speaker':item['speaker'],'content':item['content']} for item in data['content']])
-    temp=config['bedrock']['api_request']['body']['max_tokens']
-    config['bedrock']['api_request']['body']['max_tokens']=32 # 临时改成极小的最长输出
-    ret = bedrock.invoke_model(invoke_text)
+    ret = bedrock.invoke_model(invoke_text, overrides={'max_tokens': 32}) # 仅本次调用使用极小的最长输出
     manager.update_title(data['id'], ret)
-    config['bedrock']['api_request']['body']['max_tokens']=temp
     return jsonify({'status':'success'}),200
 
 from AWS_Service.Polly import Reader
@@ -139,12 +191,21 @@ async def transcribe_worker():
             transcribe_success_flag=False
             return
 
-# 1.3 启动后台线程（使用包装函数）
-worker_thread = threading.Thread(target=transcribe_worker_wrapper, daemon=True)
-worker_thread.start()
+# 1.3 按需启动后台线程（使用包装函数）：第一次调用 /api/transcribe 时才启动，
+# asgi_main 导入本模块复用全局状态时不会多出一个转写线程
+worker_thread = None
+worker_lock = threading.Lock()
+
+def ensure_transcribe_worker():
+    global worker_thread
+    with worker_lock:
+        if worker_thread is None or not worker_thread.is_alive():
+            worker_thread = threading.Thread(target=transcribe_worker_wrapper, name='transcribe-worker', daemon=True)
+            worker_thread.start()
 
 @app.route('/api/transcribe', methods=['POST', 'GET'])
 def toggle_transcribe():
+    ensure_transcribe_worker()
     # 最小会话隔离（示例，需完善）
     if request.method == 'POST':
         command_queue.put('start')
@@ -162,7 +223,9 @@ def toggle_transcribe():
         return jsonify({'text': text}), 200
 
 isRAGEnabled = False # aaa随手弄的全局变量哭了
-# from RAG_Package.QueryEngine import query_engine
+from RAG_Package.service import query_engine # 懒加载，首次打开RAG开关时才在后台加载模型与向量库
+if config['rag']['warm_up_on_boot']:
+    query_engine.warm_up()
 
 @app.route('/api/rag_toggle', methods=['POST','OPTIONS'])
 def rag_toggle():
@@ -172,18 +235,61 @@ def rag_toggle():
     global isRAGEnabled
     data = request.get_json()
     isRAGEnabled = data['rag_enabled']
-    return jsonify({'status': 'success'}), 200
+    if isRAGEnabled:
+        query_engine.warm_up()
+    return jsonify({'status': 'success', 'rag': query_engine.status()}), 200
+
+@app.route('/api/rag_status', methods=['GET'])
+def rag_status():
+    """RAG查询引擎是否就绪（state: idle / loading / ready / failed）"""
+    return jsonify(query_engine.status()), 200
 
 from AWS_Service.BedrockWrapper import BedrockWrapper
 from tools.image_zip import compress_base64_image
+from tools.dialogue_memory import ConversationMemory, estimate_tokens
 bedrock = BedrockWrapper()
+memory = ConversationMemory(bedrock.invoke_model, **config['memory']) # 按token预算装载记忆，早期轮次折叠为摘要
 
 import json
-
-@app.route('/api/submit', methods=['POST'])
-def handleSubmit():
-    data = request.get_json()
-
+from concurrent.futures import ThreadPoolExecutor
+
+rag_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='rag') # RAG子查询的并发执行池
+
+def dedupe_references(items):
+    """按 (file_name, block_id) 去重，保留先出现（排名更靠前）的结果"""
+    seen = set()
+    unique = []
+    for item in items:
+        meta = item.get('metadata', {})
+        key = (meta.get('file_name'), meta.get('block_id'))
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(item)
+    return unique
+
+def gather_rag_references(input_text, images):
+    """
+    检索RAG参考资料
+    有图片时：文本检索与图片摘要互不依赖，并发执行；摘要生成后再用它检索，最后合并去重
+    """
+    if not images:
+        return dedupe_references(query_engine.query(input_text, top_k=10,use_rerank=False,rerank_top_k=3,mode=config['rag']['retrieval_mode']))
+
+    # 如果有图片则降低一点文本ref的权重
+    text_future = rag_executor.submit(query_engine.query, input_text, top_k=1, use_rerank=False, mode=config['rag']['retrieval_mode'])
+    prompt = "Provide summaries for these images, extracting the core elements that cover the images, and output the summary in English. output in 100 words"
+    summary = bedrock.invoke_model(prompt,images=images)
+    image_refs = query_engine.query(summary,top_k=2,use_rerank=False,mode=config['rag']['retrieval_mode'])
+    return dedupe_references(text_future.result() + image_refs)
+
+def prepare_submit(data, sid=DEFAULT_SESSION):
+    """
+    /api/submit 与 /api/submit_stream 共用的前处理：图片压缩、RAG拼接、记忆装载
+    （不依赖Flask的request对象，异步服务 asgi_main.py 也复用这里）
+    :param sid: 客户端会话标识
+    :return: 包含 request_text / images / turns_format / memory_usage / dialogue_id 的字典
+    """
     ## 这里执行图像的预处理，有些图像需要压缩
     images = [compress_base64_image(item['data'],item['media_type']) for item in data['images']]
     if None in images:
@@ -191,61 +297,97 @@ def handleSubmit():
 
     input_text = data['text']
     ## 这里执行RAG的处理流程
-    if isRAGEnabled:
+    use_rag = isRAGEnabled
+    if use_rag:
+        try:
+            query_engine.get(timeout=config['rag']['wait_seconds'])
+        except (TimeoutError, RuntimeError) as e:
+            print(f"⚠️ {e}，本次请求不使用RAG")
+            use_rag = False
+    if use_rag:
         request_text = 'RAG模式：\n' + input_text + '\n'
-        if images: # 如果有图片则降低一点文本ref的权重
-            request_text += "以下是RAG参考资料：\n"
-            out = query_engine.query(input_text, top_k=1, use_rerank=False)
-            for item in out:
-                obj = {
-                        'text': item.get('text', ''),
-                        'file_name': item.get('metadata', {}).get('file_name', 'unknown'),
-                        'page': item.get('metadata', {}).get('page', -1)  # 默认值-1表示缺失
-                    }
-                request_text += json.dumps(obj, ensure_ascii=False) + '\n'
-
-            prompt = "Provide summaries for these images, extracting the core elements that cover the images, and output the summary in English. output in 100 words"
-            summary = bedrock.invoke_model(prompt,images=images)
-            out = query_engine.query(summary,top_k=2,use_rerank=False)
-            for item in out:
-                obj = {
-                        'text': item.get('text', ''),
-                        'file_name': item.get('metadata', {}).get('file_name', 'unknown'),
-                        'page': item.get('metadata', {}).get('page', -1)  # 默认值-1表示缺失
-                    }
-                request_text += json.dumps(obj, ensure_ascii=False) + '\n'
-
-        else:
-            request_text += "以下是RAG参考资料：\n"
-            out = query_engine.query(input_text, top_k=10,use_rerank=False,rerank_top_k=3)
-            for item in out:
-                obj = {
-                        'text': item.get('text', ''),
-                        'file_name': item.get('metadata', {}).get('file_name', 'unknown'),
-                        'page': item.get('metadata', {}).get('page', -1)  # 默认值-1表示缺失
-                    }
-                request_text += json.dumps(obj, ensure_ascii=False) + '\n'
+        request_text += "以下是RAG参考资料：\n"
+        for item in gather_rag_references(input_text, images):
+            obj = {
+                    'text': item.get('text', ''),
+                    'file_name': item.get('metadata', {}).get('file_name', 'unknown'),
+                    'page': item.get('metadata', {}).get('page', -1)  # 默认值-1表示缺失
+                }
+            request_text += json.dumps(obj, ensure_ascii=False) + '\n'
 
         with open('./debug.txt','a',encoding='utf-8') as f:
             print(request_text,file=f,end='\n====================\n')
     else:
         request_text = input_text + '\n'
 
-    # 这个是记忆部分😂
-    cur_turns = []
-    current_char_id=manager.current_dialogue_id
-    if data['reference_id']:
-        manager.select_dialogue(data['reference_id']) # 切换到引用的会话状态
-        cur_turns += manager.get_current_turns()
-    manager.select_dialogue(current_char_id) # 切换回来
-    cur_turns += manager.get_current_turns()
-    # 这个即是装载了的全部记忆
-    turns_format = [{'role':item['speaker'],'content':[{'type':'text','text':item['content']}]} for item in cur_turns]
-
-    response = bedrock.invoke_model(request_text,dialogue_list=turns_format,images=images)
-    manager.add_turn(speaker='user',content=data['text'], images=data['images']) # 这里有个概念命名未对齐的问题🤔content在数据库中仅为text的含义
-    manager.add_turn(speaker='assistant',content=response,images=[])
-    return jsonify({'query':request_text, 'res':response,'memory':turns_format}), 200
+    # 这个是记忆部分😂 引用的对话直接按ID读取，不再来回切换游标
+    current_char_id=manager.session(sid).get_current_dialogue_id()
+    if not current_char_id:
+        raise ValueError("请先创建或选择对话")
+    cur_turns = manager.get_turns(data['reference_id']) + manager.get_turns(current_char_id)
+    # 按预算装载记忆：最近的轮次原文保留，更早的折叠为摘要
+    memory_key = f"{data['reference_id'] or ''}+{current_char_id}"
+    turns_format, memory_usage = memory.build(memory_key, cur_turns)
+
+    return {
+        'request_text': request_text,
+        'images': images,
+        'turns_format': turns_format,
+        'memory_usage': {**memory_usage, 'request_tokens': estimate_tokens(request_text)},
+        'dialogue_id': current_char_id,
+    }
+
+def save_exchange(dialogue_id, data, response):
+    """把本轮的提问和回答写入发起请求时所在的对话（持有对话锁，一问一答不会被其他请求插入）"""
+    manager.add_turns(dialogue_id, [
+        {'speaker': 'user', 'content': data['text'], 'images': image_store.put_all(data['images'])}, # 这里有个概念命名未对齐的问题🤔content在数据库中仅为text的含义
+        {'speaker': 'assistant', 'content': response, 'images': []},
+    ])
+
+@app.route('/api/submit', methods=['POST'])
+def handleSubmit():
+    data = request.get_json()
+    try:
+        ctx = prepare_submit(data, session_id())
+    except ValueError as e:
+        abort(400, description=str(e))
+    response, model_usage = bedrock.invoke_model(ctx['request_text'],dialogue_list=ctx['turns_format'],images=ctx['images'],return_usage=True)
+    save_exchange(ctx['dialogue_id'], data, response)
+    usage = {**ctx['memory_usage'], 'model': model_usage}
+    return jsonify({'query':ctx['request_text'], 'res':response,'memory':ctx['turns_format'],'usage':usage}), 200
+
+def sse_event(payload, event=None):
+    """按 Server-Sent Events 格式编码一条消息"""
+    message = f"event: {event}\n" if event else ''
+    return message + f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+# 流式提交：逐句通过SSE推送给前端，流结束后再写入数据库
+@app.route('/api/submit_stream', methods=['POST'])
+def handleSubmitStream():
+    data = request.get_json()
+    try:
+        ctx = prepare_submit(data, session_id())
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    def generate():
+        yield sse_event({'query': ctx['request_text'], 'memory': ctx['turns_format'], 'usage': ctx['memory_usage']}, 'meta')
+        response = ''
+        try:
+            for sentence in bedrock.stream_sentences(ctx['request_text'], dialogue_list=ctx['turns_format'], images=ctx['images']):
+                response += sentence
+                yield sse_event({'text': sentence})
+        except Exception as e:
+            # 生成中断：不保存不完整的回答
+            yield sse_event({'error': str(e), 'res': response}, 'error')
+            return
+        if response:
+            save_exchange(ctx['dialogue_id'], data, response)
+        yield sse_event({'res': response, 'usage': ctx['memory_usage']}, 'done')
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True, threaded=True) # 请求体按次构建，可以安全地多线程处理并发对话
\ No newline at end of file
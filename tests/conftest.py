@@ -0,0 +1,50 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# 测试从仓库根目录导入 AWS_Service / RAG_Package / tools
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    """导入 main（Flask 应用），对话库和图片库换成临时目录；缺少音频依赖时跳过"""
+    pytest.importorskip("sounddevice")  # main 导入语音转写模块
+    from tools.dialogue_database import DialogueManager
+    from tools.image_store import ImageBlobStore
+
+    monkeypatch.setenv("NEXT_DB_PATH", str(tmp_path / "db.json"))
+    monkeypatch.setenv("NEXT_AUDIO_SINK", "null")
+    main = importlib.import_module("main")
+    monkeypatch.setattr(main, "manager", DialogueManager(str(tmp_path / "db.json")))
+    monkeypatch.setattr(main, "image_store", ImageBlobStore(str(tmp_path / "blobs")))
+    return main
+
+
+TINY_VOCAB = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', '导', '出', '样', '例', '什', '么', '是',
+              'export', 'sample', 'longer', 'query', 'transformer', 'attention', 'is', 'all', 'you', 'need']
+
+
+@pytest.fixture
+def tiny_bert(tmp_path):
+    """随机初始化的小型 BERT（嵌入或重排模型），按本地模型目录的结构保存；返回 (模型目录, 模型)"""
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+
+    def build(kind='embedding'):
+        model_dir = tmp_path / kind
+        model_dir.mkdir()
+        vocab_file = tmp_path / f"{kind}_vocab.txt"
+        vocab_file.write_text('\n'.join(TINY_VOCAB) + '\n', encoding='utf-8')
+        transformers.BertTokenizer(str(vocab_file)).save_pretrained(model_dir)
+        config = transformers.BertConfig(vocab_size=len(TINY_VOCAB), hidden_size=32, num_hidden_layers=2,
+                                         num_attention_heads=2, intermediate_size=64, max_position_embeddings=64,
+                                         num_labels=1)
+        torch.manual_seed(0)
+        model_cls = transformers.BertModel if kind == 'embedding' else transformers.BertForSequenceClassification
+        model = model_cls(config).eval()
+        model.save_pretrained(model_dir)
+        return str(model_dir), model
+    return build
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+import AWS_Service.BedrockWrapper as bedrock_wrapper
+from AWS_Service.BedrockWrapper import BedrockWrapper
+
+
+def _event(text):
+    chunk = {'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': text}}
+    return {'chunk': {'bytes': json.dumps(chunk).encode()}}
+
+
+class FakeRuntime:
+    """按顺序返回预设的流；流是事件列表，遇到 Exception 实例时在该位置抛出"""
+    def __init__(self, *streams):
+        self.streams = list(streams)
+        self.calls = 0
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        self.calls += 1
+        stream = self.streams.pop(0)
+        if isinstance(stream, Exception):
+            raise stream
+
+        def body():
+            for item in stream:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        return {'body': body()}
+
+
+@pytest.fixture
+def runtime(monkeypatch):
+    monkeypatch.setattr(bedrock_wrapper.time, 'sleep', lambda _: None)
+
+    def install(*streams):
+        fake = FakeRuntime(*streams)
+        monkeypatch.setattr(bedrock_wrapper, 'bedrock_runtime', fake)
+        return fake
+    return install
+
+
+def test_stream_sentences_yields_sentences(runtime):
+    runtime([_event('你好，'), _event('世界。Second one! '), _event('tail')])
+    assert list(BedrockWrapper().stream_sentences('hi')) == ['你好，世界。', 'Second one!', ' tail']
+
+
+def test_timeout_before_first_sentence_is_retried(runtime):
+    fake = runtime(Exception('Read timeout on endpoint'), [_event('好的。')])
+    assert list(BedrockWrapper().stream_sentences('hi')) == ['好的。']
+    assert fake.calls == 2
+
+
+def test_error_after_first_sentence_propagates_without_retry(runtime):
+    fake = runtime([_event('第一句。'), _event('第二'), Exception('Read timeout'), ], [_event('不应出现。')])
+    received = []
+    with pytest.raises(Exception, match='timeout'):
+        for sentence in BedrockWrapper().stream_sentences('hi'):
+            received.append(sentence)
+    assert received == ['第一句。']
+    assert fake.calls == 1
+
+
+def test_non_timeout_error_is_not_retried(runtime):
+    fake = runtime(ValueError('bad request'), [_event('不应出现。')])
+    with pytest.raises(ValueError):
+        list(BedrockWrapper().stream_sentences('hi'))
+    assert fake.calls == 1
@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+
+from RAG_Package.chunk_store import HEADER, MAGIC, ChunkStore, build_chunk_store, open_chunk_store
+
+
+def block(file_name, block_id, text):
+    return {'text': text, 'metadata': {'file_name': file_name, 'block_id': block_id}}
+
+
+def test_lookup_and_records(tmp_path):
+    path = str(tmp_path / 'chunks.bin')
+    blocks = [block('a.pdf', 0, '第一块'), block('a.pdf', 1, 'second\nline'), block('b.pdf', 0, 'x'),
+              block('a.pdf', 1, 'replaced')]
+    assert build_chunk_store(blocks, path) == 3
+
+    store = ChunkStore(path)
+    assert len(store) == 3
+    assert store.get('a.pdf', 0)['text'] == '第一块'
+    assert store.get('a.pdf', '1')['text'] == 'replaced'  # 重复的键保留最后一个
+    assert store.get('c.pdf', 0) is None
+
+    records = list(store.records())
+    assert [blk['text'] for _, _, blk in records] == ['第一块', 'second\nline', 'x', 'replaced']
+    for offset, length, blk in records:
+        assert store.read(offset, length) == blk
+    store.close()
+
+
+def test_skips_blocks_without_metadata(tmp_path):
+    path = str(tmp_path / 'chunks.bin')
+    assert build_chunk_store([{'text': 'no meta'}, block('a.pdf', 0, 'ok')], path) == 1
+    assert [blk['text'] for _, _, blk in ChunkStore(path).records()] == ['ok']
+
+
+def test_rejects_other_versions(tmp_path):
+    path = str(tmp_path / 'chunks.bin')
+    build_chunk_store([block('a.pdf', 0, 'ok')], path)
+    with open(path, 'r+b') as f:
+        header = bytearray(f.read(HEADER.size))
+        HEADER.pack_into(header, 0, MAGIC, 1, *HEADER.unpack(header)[2:])
+        f.seek(0)
+        f.write(header)
+    with pytest.raises(ValueError):
+        ChunkStore(path)
+
+
+def test_open_rebuilds_stale_or_old_format(tmp_path):
+    source = tmp_path / 'text_chunks.json'
+    path = str(tmp_path / 'chunks.bin')
+    source.write_text(json.dumps([block('a.pdf', 0, 'v1')]), encoding='utf-8')
+    assert open_chunk_store(path, source=str(source)).get('a.pdf', 0)['text'] == 'v1'
+
+    source.write_text(json.dumps([block('a.pdf', 0, 'v2')]), encoding='utf-8')
+    os.utime(source, (os.path.getmtime(path) + 10,) * 2)
+    assert open_chunk_store(path, source=str(source)).get('a.pdf', 0)['text'] == 'v2'
+
+    with open(path, 'r+b') as f:
+        f.write(HEADER.pack(MAGIC, 1, 0, 1, HEADER.size))
+    os.utime(path, (os.path.getmtime(source) + 10,) * 2)
+    assert open_chunk_store(path, source=str(source)).get('a.pdf', 0)['text'] == 'v2'
+
+    with pytest.raises(FileNotFoundError):
+        open_chunk_store(str(tmp_path / 'missing.bin'), source=str(tmp_path / 'missing.json'))
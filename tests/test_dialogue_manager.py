@@ -0,0 +1,57 @@
+import threading
+import time
+
+from tools.dialogue_database import DialogueManager
+
+
+def test_dialogue_locks_are_released_after_use(tmp_path):
+    manager = DialogueManager(str(tmp_path / "db.json"))
+    for i in range(50):
+        dialogue_id = manager.create_dialogue(f"t{i}", session_id=f"s{i}")
+        manager.add_turns(dialogue_id, [{"speaker": "user", "content": "hi"}])
+    assert manager._dialogue_locks == {}
+
+
+def test_dialogue_lock_serializes_writers(tmp_path):
+    manager = DialogueManager(str(tmp_path / "db.json"))
+    dialogue_id = manager.create_dialogue("t")
+    inside, overlaps = [0], []
+
+    def writer():
+        with manager.dialogue_lock(dialogue_id):
+            inside[0] += 1
+            overlaps.append(inside[0])
+            time.sleep(0.01)
+            inside[0] -= 1
+
+    threads = [threading.Thread(target=writer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == [1] * 8
+    assert manager._dialogue_locks == {}
+
+
+def test_sessions_keep_separate_current_dialogue(tmp_path):
+    manager = DialogueManager(str(tmp_path / "db.json"))
+    first = manager.create_dialogue("a", session_id="s1")
+    second = manager.create_dialogue("b", session_id="s2")
+    manager.add_turn("user", "one", session_id="s1")
+    manager.add_turn("user", "two", session_id="s2")
+    assert [turn["content"] for turn in manager.get_turns(first)] == ["one"]
+    assert [turn["content"] for turn in manager.get_turns(second)] == ["two"]
+
+
+def test_delete_dialogue_clears_cursors_of_every_session(tmp_path):
+    manager = DialogueManager(str(tmp_path / "db.json"))
+    dialogue_id = manager.create_dialogue("a", session_id="s1")
+    other = manager.create_dialogue("b", session_id="s3")
+    assert manager.select_dialogue(dialogue_id, session_id="s2")
+
+    assert manager.delete_dialogue(dialogue_id)
+    assert not manager.delete_dialogue(dialogue_id)
+    assert manager.session("s1").get_current_dialogue_id() is None
+    assert manager.session("s2").get_current_dialogue_id() is None
+    assert manager.delete_current_dialogue(session_id="s3") == other
+    assert manager.get_all_dialogues() == []
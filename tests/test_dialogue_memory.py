@@ -0,0 +1,88 @@
+from tools.dialogue_memory import SUMMARY_SYSTEM, ConversationMemory, estimate_tokens
+
+
+class FakeSummarizer:
+    def __init__(self):
+        self.prompts = []
+        self.overrides = []
+
+    def __call__(self, prompt, overrides=None):
+        self.prompts.append(prompt)
+        self.overrides.append(overrides)
+        return f"摘要{len(self.prompts)}"
+
+
+def make_turns(count, text='这是一个比较长的问题内容' * 5):
+    return [{'speaker': 'user' if i % 2 == 0 else 'assistant', 'content': f"{i}{text}", 'timestamp': str(i)}
+            for i in range(count)]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('你好') == 2
+    assert estimate_tokens('abcdefgh') == 2
+
+
+def test_recent_turns_fit_budget_and_rest_is_summarized():
+    summarizer = FakeSummarizer()
+    memory = ConversationMemory(summarizer, budget_tokens=400, summary_tokens=100, min_recent_turns=2)
+    turns = make_turns(20)
+    messages, usage = memory.build('d1', turns)
+
+    assert usage['folded_turns'] + usage['recent_turns'] == 20
+    assert usage['recent_tokens'] <= 400 - 100
+    assert messages[0]['role'] == 'user' and '摘要' in messages[0]['content'][0]['text']
+    assert messages[2]['content'][0]['text'] == turns[usage['folded_turns']]['content']
+    assert turns[usage['folded_turns']]['speaker'] == 'user'
+    assert all(o == {'system': SUMMARY_SYSTEM, 'max_tokens': 100} for o in summarizer.overrides)
+
+
+def test_folding_is_chunked_and_each_prompt_is_bounded():
+    summarizer = FakeSummarizer()
+    memory = ConversationMemory(summarizer, budget_tokens=400, summary_tokens=100, min_recent_turns=2)
+    turns = make_turns(200)
+    memory.build('d1', turns)
+    assert len(summarizer.prompts) > 1
+    prompt_overhead = estimate_tokens(summarizer.prompts[0].split('【新增对话】')[0]) + 100
+    assert all(estimate_tokens(p) <= 300 + prompt_overhead for p in summarizer.prompts)
+    assert summarizer.prompts[1].count('摘要1') == 1  # 每段都在上一段的摘要上合并
+
+
+def test_summary_is_cached_and_extended_incrementally():
+    summarizer = FakeSummarizer()
+    memory = ConversationMemory(summarizer, budget_tokens=400, summary_tokens=100, min_recent_turns=2)
+    turns = make_turns(20)
+    memory.build('d1', turns)
+    calls = len(summarizer.prompts)
+    memory.build('d1', turns)
+    assert len(summarizer.prompts) == calls
+
+    memory.build('d1', turns + make_turns(22)[20:])
+    assert len(summarizer.prompts) == calls + 1
+    assert f"摘要{calls}" in summarizer.prompts[-1]
+    assert '0这是' not in summarizer.prompts[-1]  # 已折叠的轮次不会再次发送
+
+
+def test_oversized_turn_is_truncated():
+    summarizer = FakeSummarizer()
+    memory = ConversationMemory(summarizer, budget_tokens=400, summary_tokens=100, min_recent_turns=1)
+    turns = make_turns(4, text='长' * 5000)
+    memory.build('d1', turns)
+    assert all(estimate_tokens(p.split('【新增对话】')[1]) <= 300 for p in summarizer.prompts)
+
+
+def test_summary_cache_is_bounded():
+    memory = ConversationMemory(FakeSummarizer(), budget_tokens=400, summary_tokens=100, max_summaries=3)
+    for i in range(10):
+        memory.build(f"d{i}", make_turns(20))
+    assert list(memory._summaries) == ['d7', 'd8', 'd9']
+    memory.forget('d9')
+    assert list(memory._summaries) == ['d7', 'd8']
+
+
+def test_forget_drops_every_summary_involving_the_dialogue():
+    memory = ConversationMemory(FakeSummarizer(), budget_tokens=400, summary_tokens=100)
+    for key in ('d1', 'd2', 'ref+d1', 'd1+d3', 'd2+d3'):
+        memory.build(key, make_turns(20))
+    memory.forget('d1')
+    assert list(memory._summaries) == ['d2', 'd2+d3']
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from RAG_Package.embedding_batcher import EmbeddingBatcher
+
+
+class FakeEmbedder:
+    """向量为 [文本长度, 批次序号]，第一批在 gate 打开前阻塞，便于让后续请求排队"""
+    def __init__(self, gate=None, fail=False):
+        self.gate = gate
+        self.fail = fail
+        self.calls = []
+
+    def get_text_embedding_batch(self, texts, **kwargs):
+        if self.gate is not None and not self.calls:
+            self.calls.append(list(texts))
+            self.gate.wait(5)
+        else:
+            self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("模型出错")
+        return [[float(len(text)), float(len(self.calls))] for text in texts]
+
+
+def test_queued_requests_are_coalesced_into_one_batch():
+    gate = threading.Event()
+    embedder = FakeEmbedder(gate)
+    batcher = EmbeddingBatcher(embedder, max_batch=8, max_wait=0.05)
+    first = batcher.submit('a')
+    while not embedder.calls:  # 第一批已在模型里
+        time.sleep(0.001)
+
+    futures = [batcher.submit(text) for text in ('bb', 'ccc', 'bb', 'dddd')]
+    gate.set()
+    results = [future.result(timeout=5) for future in futures]
+
+    assert first.result(timeout=5) == [1.0, 1.0]
+    assert embedder.calls[1] == ['bb', 'ccc', 'dddd']  # 相同查询只算一次
+    assert results == [[2.0, 2.0], [3.0, 2.0], [2.0, 2.0], [4.0, 2.0]]  # 每个调用方拿到自己的向量
+    assert batcher.stats() == {'batches': 2, 'items': 5, 'avg_batch': 2.5}
+
+
+def test_batch_is_capped_at_max_batch():
+    gate = threading.Event()
+    embedder = FakeEmbedder(gate)
+    batcher = EmbeddingBatcher(embedder, max_batch=3, max_wait=0.05)
+    batcher.submit('x')
+    while not embedder.calls:
+        time.sleep(0.001)
+
+    futures = [batcher.submit('q' * n) for n in range(1, 8)]
+    gate.set()
+    assert [future.result(timeout=5)[0] for future in futures] == [float(n) for n in range(1, 8)]
+    assert [len(call) for call in embedder.calls[1:]] == [3, 3, 1]
+
+
+def test_lone_request_is_flushed_after_max_wait():
+    embedder = FakeEmbedder()
+    batcher = EmbeddingBatcher(embedder, max_batch=16, max_wait=0.05)
+    start = time.monotonic()
+    assert batcher.get_query_embedding('abc') == [3.0, 1.0]
+    elapsed = time.monotonic() - start
+    assert 0.04 <= elapsed < 1.0  # 凑不满一批时最多等待 max_wait
+    assert embedder.calls == [['abc']]
+
+
+def test_model_error_is_raised_to_every_caller_in_the_batch():
+    gate = threading.Event()
+    embedder = FakeEmbedder(gate, fail=True)
+    batcher = EmbeddingBatcher(embedder, max_batch=8, max_wait=0.05)
+    first = batcher.submit('a')
+    while not embedder.calls:
+        time.sleep(0.001)
+    futures = [batcher.submit(text) for text in ('b', 'c')]
+    gate.set()
+
+    for future in [first] + futures:
+        with pytest.raises(RuntimeError, match="模型出错"):
+            future.result(timeout=5)
+    assert batcher.stats()['batches'] == 0
+
+    embedder.fail = False
+    assert batcher.get_text_embedding('ok') == [2.0, 3.0]  # 出错后工作线程继续服务
+
+
+def test_caller_side_batches_bypass_the_queue():
+    embedder = FakeEmbedder()
+    batcher = EmbeddingBatcher(embedder)
+    assert batcher.get_text_embedding_batch(['a', 'bb']) == [[1.0, 1.0], [2.0, 1.0]]
+    assert batcher._worker is None
@@ -0,0 +1,80 @@
+import pickle
+import types
+
+import pytest
+
+import RAG_Package.cache as cache
+from RAG_Package.cache import EmbeddingCache, LRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture(autouse=True)
+def no_atexit(monkeypatch):
+    monkeypatch.setattr(cache, 'atexit', types.SimpleNamespace(register=lambda fn: None))
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(max_size=2)
+    lru.put('a', 1)
+    lru.put('b', 2)
+    assert lru.get('a') == 1  # a 变为最近使用
+    lru.put('c', 3)
+    assert lru.get('b') is None
+    assert (lru.get('a'), lru.get('c')) == (1, 3)
+    assert lru.stats() == {'size': 2, 'max_size': 2, 'hits': 3, 'misses': 1, 'hit_rate': 0.75}
+
+
+def test_entries_expire_after_ttl(clock):
+    lru = LRUCache(max_size=10, ttl=60)
+    lru.put('a', 1)
+    clock[0] += 60
+    assert lru.get('a') == 1
+    clock[0] += 1
+    assert lru.get('a', 'expired') == 'expired'
+    assert len(lru) == 0  # 过期条目在读取时删除
+
+
+def test_lookup_normalizes_query_text():
+    embeddings = EmbeddingCache(max_size=10)
+    embeddings.store('  什么是  Transformer？ ', [1.0])
+    assert embeddings.lookup('什么是 transformer?') == [1.0]  # 全角问号、大小写、空白均归一化
+    calls = []
+    assert embeddings.get_or_compute('什么是 TRANSFORMER？', lambda t: calls.append(t) or [2.0]) == [1.0]
+    assert embeddings.get_or_compute('新问题', lambda t: calls.append(t) or [2.0]) == [2.0]
+    assert calls == ['新问题']
+
+
+def test_persistence_round_trip_keeps_ages_and_drops_expired(tmp_path, clock):
+    path = str(tmp_path / 'nested' / 'cache.pkl')
+    first = EmbeddingCache(max_size=10, ttl=100, persist_path=path, namespace='bge-m3')
+    first.store('old', [1.0])
+    clock[0] += 50
+    first.store('new', [2.0])
+    first.save()
+
+    clock[0] += 60  # old 已存在 110 秒，new 60 秒
+    second = EmbeddingCache(max_size=10, ttl=100, persist_path=path, namespace='bge-m3')
+    assert second.lookup('old') is None
+    assert second.lookup('new') == [2.0]
+    clock[0] += 41
+    assert second.lookup('new') is None  # 沿用原写入时间，不因重新加载而续期
+
+
+def test_persisted_cache_is_ignored_for_other_model_or_corrupt_file(tmp_path, capsys):
+    path = tmp_path / 'cache.pkl'
+    first = EmbeddingCache(persist_path=str(path), namespace='bge-m3')
+    first.store('q', [1.0])
+    first.save()
+    with open(path, 'rb') as f:
+        assert pickle.load(f)['namespace'] == 'bge-m3'
+
+    assert len(EmbeddingCache(persist_path=str(path), namespace='bge-m3:onnx-int8')) == 0
+    path.write_bytes(b'not a pickle')
+    assert len(EmbeddingCache(persist_path=str(path), namespace='bge-m3')) == 0
+    assert '加载失败' in capsys.readouterr().out
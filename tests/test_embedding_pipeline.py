@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+
+from RAG_Package.embedding_pipeline import approx_tokens, insert_embedded, length_bucketed_batches
+
+
+class FakeEmbedder:
+    """向量为 [文本编号]，便于核对文本块与向量是否错位"""
+    def __init__(self, fail_on_call=None):
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def get_text_embedding_batch(self, texts):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("embedding failed")
+        return [[float(text.split()[0])] for text in texts]
+
+
+class FakeCollection:
+    def __init__(self, fail_on_call=None):
+        self.batches = []
+        self.fail_on_call = fail_on_call
+
+    def insert(self, columns):
+        if len(self.batches) + 1 == self.fail_on_call:
+            self.batches.append(None)
+            raise ConnectionError("milvus down")
+        self.batches.append(columns)
+
+    upsert = insert
+
+
+def make_chunks(count):
+    # 长度循环变化，窗口内排序会打乱原始顺序
+    return [{'text': f"{i} " + 'w ' * (i * 7 % 13), 'metadata': {'i': i}} for i in range(count)]
+
+
+def insert_threads():
+    return [t for t in threading.enumerate() if t.name == 'milvus-insert']
+
+
+def test_batches_are_sorted_by_length_within_each_window_only():
+    chunks = make_chunks(50)
+    batches = list(length_bucketed_batches(chunks, batch_size=4, bucket_window=3))
+    assert [len(batch) for batch in batches] == [4] * 12 + [2]
+    for start in range(0, len(batches), 3):
+        window = [chunk for batch in batches[start:start + 3] for chunk in batch]
+        assert {c['metadata']['i'] for c in window} == set(range(start * 4, min(start * 4 + 12, 50)))
+        lengths = [approx_tokens(c['text']) for c in window]
+        assert lengths == sorted(lengths)
+
+
+def test_rows_keep_chunk_vector_pairing_and_write_order():
+    collection = FakeCollection()
+    total = insert_embedded(collection, iter(make_chunks(103)), FakeEmbedder(), batch_size=8, bucket_window=2,
+                            insert_batch_size=20)
+    assert total == 103
+    texts, metadatas, vectors = [sum((b[col] for b in collection.batches), []) for col in range(3)]
+    assert sorted(m['i'] for m in metadatas) == list(range(103))
+    assert all(v == [float(m['i'])] for m, v in zip(metadatas, vectors))
+    # 批次按生成顺序写入：前一个窗口（16块）的文本块总在后一个窗口之前
+    windows = [m['i'] // 16 for m in metadatas]
+    assert windows == sorted(windows)
+    assert all(len(b[0]) >= 20 for b in collection.batches[:-1])
+    assert insert_threads() == []
+
+
+def test_writer_error_stops_embedding_and_is_raised():
+    collection = FakeCollection(fail_on_call=2)
+    embedder = FakeEmbedder()
+    with pytest.raises(ConnectionError, match="milvus down"):
+        insert_embedded(collection, iter(make_chunks(10_000)), embedder, batch_size=10, bucket_window=1,
+                        insert_batch_size=10)
+    assert embedder.calls < 20  # 写入失败后不再继续嵌入剩余的 1000 批
+    assert len(collection.batches) == 2  # 出错后剩余批次被丢弃
+    assert insert_threads() == []
+
+
+def test_embedder_error_shuts_down_writer_after_flushing_queued_rows():
+    collection = FakeCollection()
+    with pytest.raises(RuntimeError, match="embedding failed"):
+        insert_embedded(collection, iter(make_chunks(100)), FakeEmbedder(fail_on_call=4), batch_size=10,
+                        bucket_window=1, insert_batch_size=10)
+    assert len(collection.batches) == 3  # 已经交给写入线程的批次仍会写完
+    assert insert_threads() == []
+
+
+def test_upsert_mode_and_custom_row_layout():
+    collection = FakeCollection()
+    insert_embedded(collection, make_chunks(5), FakeEmbedder(), write='upsert',
+                    make_row=lambda chunk, vector: [f"pk{chunk['metadata']['i']}", chunk['text'], chunk['metadata'], vector])
+    [columns] = collection.batches
+    assert sorted(columns[0]) == [f"pk{i}" for i in range(5)]
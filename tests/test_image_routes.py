@@ -0,0 +1,31 @@
+import base64
+import hashlib
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 16
+
+
+def test_image_route_serves_blob_with_etag(main):
+    digest = main.image_store.put_bytes(PNG)
+    client = main.app.test_client()
+    response = client.get(f"/api/image/{digest}")
+    assert response.status_code == 200
+    assert response.data == PNG and response.mimetype == 'image/png'
+    assert response.headers['ETag'] == f'"{digest}"'
+    assert client.get(f"/api/image/{digest}", headers={'If-None-Match': f'"{digest}"'}).status_code == 304
+
+
+def test_image_route_404_for_missing_or_invalid_blob(main):
+    client = main.app.test_client()
+    assert client.get(f"/api/image/{hashlib.sha256(b'missing').hexdigest()}").status_code == 404
+    assert client.get("/api/image/not-a-digest").status_code == 404
+
+
+def test_get_messages_returns_image_references_with_urls(main):
+    dialogue_id = main.manager.create_dialogue("t")
+    ref = main.image_store.put({'media_type': 'image/png', 'data': base64.b64encode(PNG).decode()})
+    main.manager.add_turns(dialogue_id, [{'speaker': 'user', 'content': '看图', 'images': [ref]}])
+
+    response = main.app.test_client().get(f"/api/get_messages/{dialogue_id}")
+    assert response.status_code == 200
+    [turn] = response.get_json()
+    assert turn['images'] == [{**ref, 'url': f"/api/image/{ref['blob']}"}]
@@ -0,0 +1,56 @@
+import base64
+import hashlib
+
+import pytest
+
+from tools.image_store import ImageBlobStore, with_image_urls
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 16
+JPEG = b'\xff\xd8\xff\xe0' + b'\x01' * 16
+
+
+def upload(data, media_type='image/png', prefix=''):
+    return {'media_type': media_type, 'data': prefix + base64.b64encode(data).decode()}
+
+
+def test_put_dedupes_by_sha256(tmp_path):
+    store = ImageBlobStore(str(tmp_path))
+    first = store.put(upload(PNG))
+    second = store.put(upload(PNG, prefix='data:image/png;base64,'))
+    digest = hashlib.sha256(PNG).hexdigest()
+    assert first == second == {'media_type': 'image/png', 'blob': digest}
+    assert store.path(digest).read_bytes() == PNG
+    assert [p.name for p in tmp_path.rglob('*') if p.is_file()] == [digest]  # 只保存一份，没有残留临时文件
+
+
+def test_put_all_keeps_order_and_passes_references_through(tmp_path):
+    store = ImageBlobStore(str(tmp_path))
+    existing = store.put(upload(JPEG, 'image/jpeg'))
+    refs = store.put_all([upload(PNG), existing, upload(PNG)])
+    assert refs == [store.put(upload(PNG)), existing, store.put(upload(PNG))]
+    assert store.put_all(None) == []
+    assert len([p for p in tmp_path.rglob('*') if p.is_file()]) == 2
+    assert store.media_type(refs[0]['blob']) == 'image/png'
+    assert store.media_type(refs[1]['blob']) == 'image/jpeg'
+
+
+def test_missing_or_invalid_blob(tmp_path):
+    store = ImageBlobStore(str(tmp_path))
+    missing = hashlib.sha256(b'missing').hexdigest()
+    assert not store.exists(missing)
+    with pytest.raises(FileNotFoundError):
+        store.media_type(missing)
+    assert not store.exists('../../etc/passwd')
+    with pytest.raises(ValueError):
+        store.path('../../etc/passwd')
+
+
+def test_with_image_urls_maps_references_and_keeps_inline_images():
+    digest = hashlib.sha256(PNG).hexdigest()
+    inline = {'media_type': 'image/png', 'data': 'aGk='}
+    turns = [{'speaker': 'user', 'content': 'q', 'images': [{'media_type': 'image/png', 'blob': digest}, inline]},
+             {'speaker': 'assistant', 'content': 'a'}]
+    mapped = with_image_urls(turns)
+    assert mapped[0]['images'] == [{'media_type': 'image/png', 'blob': digest, 'url': f'/api/image/{digest}'}, inline]
+    assert mapped[1] == {'speaker': 'assistant', 'content': 'a', 'images': []}
+    assert 'url' not in turns[0]['images'][0]  # 不修改数据库返回的轮次
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from RAG_Package.index_manifest import IndexManifest, chunk_hash, chunk_key, group_by_file_key
+
+
+def chunk(file_key, text="内容", chunk_id="0_chunk_0"):
+    file_name = file_key.rsplit("/", 1)[-1].replace("_content_list.json", "")
+    return {"text": text, "metadata": {"file_name": file_name, "file_key": file_key, "page": 0,
+                                       "block_id": 0, "type": "text", "chunk_id": chunk_id, "chunk_index": 0}}
+
+
+def test_same_file_name_in_different_directories_gets_distinct_keys():
+    a, b = chunk("book_a/intro_content_list.json"), chunk("book_b/intro_content_list.json")
+    assert a["metadata"]["file_name"] == b["metadata"]["file_name"]
+    assert chunk_key(a) != chunk_key(b)
+    assert set(group_by_file_key([a, b])) == {"book_a/intro_content_list.json", "book_b/intro_content_list.json"}
+
+
+def test_removing_one_of_two_same_name_files_only_deletes_its_chunks(tmp_path):
+    a, b = chunk("book_a/intro_content_list.json"), chunk("book_b/intro_content_list.json")
+    path = str(tmp_path / "manifest.json")
+    manifest = IndexManifest(path, settings={"model": "m"})
+    manifest.save({
+        key: {"hash": "h", "file_name": "intro", "chunks": {chunk_key(c): chunk_hash(c)}}
+        for key, c in (("book_a/intro_content_list.json", a), ("book_b/intro_content_list.json", b))
+    })
+
+    reloaded = IndexManifest(path, settings={"model": "m"})
+    assert not reloaded.rebuild
+    kept = {"book_b/intro_content_list.json": reloaded.files["book_b/intro_content_list.json"]}
+    assert reloaded.removed(kept) == [chunk_key(a)]
+
+
+def test_manifest_from_older_version_forces_rebuild(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps({"version": 1, "settings": {"model": "m"}, "files": {}}))
+    assert IndexManifest(str(path), settings={"model": "m"}).rebuild
+
+
+def test_parsed_chunks_are_keyed_by_path_relative_to_corpus_root(tmp_path):
+    scale_embedding = pytest.importorskip("RAG_Package.scale_embedding")
+    for book in ("book_a", "book_b"):
+        (tmp_path / book).mkdir()
+        (tmp_path / book / "intro_content_list.json").write_text(
+            json.dumps([{"type": "text", "text": f"{book} 的正文", "page_idx": 0}]), encoding="utf-8")
+
+    text_chunks, _ = scale_embedding.process_all_content_lists(str(tmp_path), workers=1)
+    assert [c["metadata"]["file_name"] for c in text_chunks] == ["intro", "intro"]
+    assert [chunk_key(c) for c in text_chunks] == ["book_a/intro_content_list.json#0_chunk_0",
+                                                   "book_b/intro_content_list.json#0_chunk_0"]
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("onnxruntime")
+
+from RAG_Package.inference_backend import create_session, export_onnx, onnx_model_file
+
+# 长度都与导出时的样例（6个token）不同
+BATCHES = [['导出'], ['导出样例 export sample longer query export sample', 'query'], ['样例 export'] * 3]
+
+
+def run_both(model_dir, model, kind, texts):
+    tokenizer = transformers.AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
+    inputs = tokenizer(texts, padding=True, return_tensors='np')
+    feeds = {name: inputs[name].astype(np.int64) for name in ('input_ids', 'attention_mask')}
+    session = create_session(onnx_model_file(model_dir, 'onnx'), threads=1)
+    onnx_out = session.run(None, feeds)[0]
+    with torch.no_grad():
+        out = model(**{name: torch.from_numpy(value) for name, value in feeds.items()})
+    torch_out = (out.last_hidden_state if kind == 'embedding' else out.logits).numpy()
+    return session, feeds, onnx_out, torch_out
+
+
+def test_embedding_export_matches_torch_for_any_sequence_length(tiny_bert):
+    model_dir, model = tiny_bert('embedding')
+    export_onnx(model_dir, 'embedding', quantize=False)
+    for texts in BATCHES:
+        session, feeds, onnx_out, torch_out = run_both(model_dir, model, 'embedding', texts)
+        assert session.get_outputs()[0].shape == ['batch', 'sequence', 32]
+        assert onnx_out.shape == feeds['input_ids'].shape + (32,)
+        np.testing.assert_allclose(onnx_out, torch_out, atol=1e-4)
+
+
+def test_reranker_export_matches_torch_for_any_sequence_length(tiny_bert):
+    model_dir, model = tiny_bert('reranker')
+    export_onnx(model_dir, 'reranker', quantize=False)
+    for texts in BATCHES:
+        session, feeds, onnx_out, torch_out = run_both(model_dir, model, 'reranker', texts)
+        assert session.get_outputs()[0].shape == ['batch', 1]
+        np.testing.assert_allclose(onnx_out, torch_out, atol=1e-4)
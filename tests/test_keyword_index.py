@@ -0,0 +1,38 @@
+from RAG_Package.keyword_index import KeywordIndex, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_compound_terms_and_parts():
+    tokens = tokenize('The conv3_1 layer uses Batch-Norm')
+    assert 'the' not in tokens
+    assert {'conv3_1', 'conv3', '1', 'batch-norm', 'batch', 'norm', 'layer'} <= set(tokens)
+
+
+def test_bm25_ranks_matching_documents():
+    docs = [
+        ('a', 'resnet uses batch norm after every convolution'),
+        ('b', 'transformers use layer norm'),
+        ('c', 'batch norm batch norm batch norm'),
+        ('d', 'unrelated text about cooking'),
+    ]
+    index = KeywordIndex.build(docs)
+    assert len(index) == 4
+
+    results = index.search('batch norm', limit=10)
+    refs = [ref for ref, _ in results]
+    assert refs[0] == 'c'
+    assert set(refs) == {'a', 'b', 'c'}
+    assert all(score > 0 for _, score in results)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+    assert [ref for ref, _ in index.search('batch norm', limit=1)] == ['c']
+    assert index.search('nothing matches') == []
+    assert KeywordIndex.build([]).search('norm') == []
+
+
+def test_rrf_merges_by_rank():
+    dense = [{'id': 'x'}, {'id': 'y'}, {'id': 'z'}]
+    keyword = [{'id': 'y', 'from': 'keyword'}, {'id': 'w'}]
+    fused = reciprocal_rank_fusion([dense, keyword], key=lambda doc: doc['id'], k=60)
+    assert [doc['id'] for doc in fused] == ['y', 'x', 'w', 'z']
+    assert 'from' not in fused[0]  # 重复的文档保留先出现的记录
+    assert len(reciprocal_rank_fusion([dense, keyword], key=lambda doc: doc['id'], limit=2)) == 2
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from RAG_Package.service import FAILED, IDLE, LOADING, READY, QueryEngineService
+
+
+class GatedLoader:
+    """在测试放行前一直停在加载中；可以指定前几次加载失败"""
+    def __init__(self, failures=0):
+        self.calls = 0
+        self.failures = failures
+        self.gate = threading.Event()
+        self.engine = object()
+
+    def __call__(self):
+        self.calls += 1
+        self.gate.wait(5)
+        if self.calls <= self.failures:
+            raise OSError("milvus unreachable")
+        return self.engine
+
+
+def test_nothing_is_loaded_until_warm_up():
+    loader = GatedLoader()
+    service = QueryEngineService(loader)
+    assert service.status() == {'state': IDLE, 'ready': False}
+    assert loader.calls == 0 and not service.ready
+
+
+def test_warm_up_moves_through_loading_to_ready_once():
+    loader = GatedLoader()
+    service = QueryEngineService(loader)
+    service.warm_up()
+    service.warm_up()  # 加载中重复调用不会再次加载
+    status = service.status()
+    assert status['state'] == LOADING and 'elapsed' in status
+    with pytest.raises(TimeoutError):
+        service.get(timeout=0.01)
+
+    loader.gate.set()
+    assert service.get(timeout=5) is loader.engine
+    status = service.status()
+    assert status['state'] == READY and status['ready'] and 'load_seconds' in status
+    service.warm_up()
+    assert loader.calls == 1
+
+
+def test_failed_load_reports_error_and_can_be_retried():
+    loader = GatedLoader(failures=1)
+    loader.gate.set()
+    service = QueryEngineService(loader)
+    with pytest.raises(RuntimeError, match="milvus unreachable"):
+        service.get(timeout=5)
+    assert service.status() == {'state': FAILED, 'ready': False, 'error': 'OSError: milvus unreachable'}
+
+    assert service.get(timeout=5) is loader.engine  # get 会重新触发加载
+    assert service.status()['state'] == READY and 'error' not in service.status()
+    assert loader.calls == 2
+
+
+def test_query_waits_for_engine():
+    class Engine:
+        def query(self, text, **kwargs):
+            return [text, kwargs]
+
+    loader = GatedLoader()
+    loader.engine = Engine()
+    service = QueryEngineService(loader)
+    results = []
+    caller = threading.Thread(target=lambda: results.append(service.query('q', top_k=1)))
+    caller.start()
+    caller.join(0.05)
+    assert caller.is_alive() and service.status()['state'] == LOADING
+    loader.gate.set()
+    caller.join(5)
+    assert results == [['q', {'top_k': 1}]]
+
+
+def test_rag_status_and_toggle_routes(main, monkeypatch):
+    loader = GatedLoader()
+    monkeypatch.setattr(main, "query_engine", QueryEngineService(loader))
+    monkeypatch.setattr(main, "isRAGEnabled", False)
+    client = main.app.test_client()
+
+    assert client.get('/api/rag_status').get_json() == {'state': IDLE, 'ready': False}
+    response = client.post('/api/rag_toggle', json={'rag_enabled': True}).get_json()
+    assert response['status'] == 'success' and response['rag']['state'] == LOADING
+
+    loader.gate.set()
+    main.query_engine.get(timeout=5)
+    status = client.get('/api/rag_status').get_json()
+    assert status['state'] == READY and status['ready']
+    assert loader.calls == 1
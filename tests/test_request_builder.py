@@ -0,0 +1,58 @@
+from types import MappingProxyType
+
+import pytest
+
+from AWS_Service.config import config
+from AWS_Service.request_builder import current_profile, freeze, new_body, thaw, update_profile
+
+
+@pytest.fixture(autouse=True)
+def restore_profile(monkeypatch):
+    monkeypatch.setitem(config['bedrock'], 'api_request', config['bedrock']['api_request'])
+
+
+def test_freeze_is_deep_and_thaw_returns_independent_copy():
+    source = {'body': {'max_tokens': 100, 'messages': [{'role': 'user'}]}, 'tags': ('a', 'b')}
+    frozen = freeze(source)
+    assert isinstance(frozen['body'], MappingProxyType)
+    assert frozen['body']['messages'] == (MappingProxyType({'role': 'user'}),)
+    with pytest.raises(TypeError):
+        frozen['body']['max_tokens'] = 1
+    with pytest.raises(TypeError):
+        frozen['body']['messages'][0]['role'] = 'assistant'
+
+    thawed = thaw(frozen)
+    assert thawed == {'body': {'max_tokens': 100, 'messages': [{'role': 'user'}]}, 'tags': ['a', 'b']}
+    thawed['body']['messages'][0]['role'] = 'assistant'
+    assert frozen['body']['messages'][0]['role'] == 'user'
+    source['body']['max_tokens'] = 1  # 冻结时已复制，之后修改原对象不影响快照
+    assert frozen['body']['max_tokens'] == 100
+
+
+def test_overrides_do_not_mutate_shared_profile():
+    profile = current_profile()
+    snapshot = thaw(profile)
+    body = new_body({'max_tokens': 32})
+    assert body['max_tokens'] == 32
+    body['messages'] = [{'role': 'user', 'content': 'hi'}]
+    assert current_profile() is profile and thaw(profile) == snapshot
+    assert new_body()['max_tokens'] == snapshot['body']['max_tokens']
+
+
+def test_update_profile_replaces_snapshot_without_touching_old_one():
+    before = current_profile()
+    default_max_tokens = before['body']['max_tokens']
+    update_profile(max_tokens=default_max_tokens + 1, temperature=0.1)
+    after = current_profile()
+    assert after is not before
+    assert before['body']['max_tokens'] == default_max_tokens
+    assert after['body']['max_tokens'] == default_max_tokens + 1 and after['body']['temperature'] == 0.1
+    assert new_body(profile=before)['max_tokens'] == default_max_tokens
+
+
+def test_plain_dict_profile_is_frozen_on_read():
+    config['bedrock']['api_request'] = {'body': {'max_tokens': 7}}
+    profile = current_profile()
+    assert isinstance(profile, MappingProxyType) and profile['body']['max_tokens'] == 7
+    assert new_body({'max_tokens': 8}) == {'max_tokens': 8}
+    assert config['bedrock']['api_request']['body']['max_tokens'] == 7
@@ -0,0 +1,104 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from RAG_Package.Reranker import MilvusReranker
+
+
+class Spy:
+    """转发所有属性，记录直接调用的参数"""
+    def __init__(self, target):
+        self._target = target
+        self.calls = []
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        return self._target(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+def doc(i, text):
+    return {'text': text, 'id': str(i), 'partition': 'book', 'metadata': {'chunk_id': f"{i}_chunk_0"}}
+
+
+DOCS = [doc(0, 'attention is all you need'), doc(1, 'transformer'), doc(2, 'sample query export longer sample'),
+        doc(3, '什么是 transformer attention')]
+
+
+@pytest.fixture
+def reranker(tiny_bert):
+    model_dir, _ = tiny_bert('reranker')
+    reranker = MilvusReranker(model_dir, device='cpu', backend='torch')
+    reranker.tokenizer = Spy(reranker.tokenizer)
+    reranker.model = Spy(reranker.model)
+    return reranker
+
+
+def reference_scores(reranker, query, docs):
+    """逐对 tokenizer(query, doc) 打分，作为对照"""
+    tokenizer = reranker.tokenizer._target
+    scores = {}
+    for d in docs:
+        inputs = tokenizer(query, d['text'], truncation='only_second', max_length=reranker.max_length,
+                           return_tensors='pt')
+        with torch.no_grad():
+            scores[d['id']] = reranker.model._target(**inputs).logits.item()
+    return scores
+
+
+def test_scores_match_per_pair_tokenisation_and_query_is_tokenised_once(reranker):
+    results = reranker('什么是 attention', DOCS, batch_size=2)
+    assert len(reranker.tokenizer.calls) == 2  # 查询一次 + 全部文档一次批量分词
+    expected = reference_scores(reranker, '什么是 attention', DOCS)
+    assert [r['metadata']['id'] for r in results] == sorted(expected, key=expected.get, reverse=True)
+    for r in results:
+        assert r['score'] == pytest.approx(expected[r['metadata']['id']], abs=1e-5)
+
+
+def test_doc_tokens_are_reused_across_queries(reranker):
+    reranker('attention', DOCS)
+    reranker.tokenizer.calls.clear()
+    reranker('transformer', DOCS)
+    assert len(reranker.tokenizer.calls) == 1  # 只对新查询分词
+    assert len(reranker.token_cache) == len(DOCS)
+
+
+def test_score_cache_hits_and_invalidation(reranker):
+    first = reranker('attention', DOCS)
+    model_calls = len(reranker.model.calls)
+    assert reranker('attention', DOCS) == first
+    assert len(reranker.model.calls) == model_calls  # 完全命中缓存，不再过模型
+
+    reranker('Attention', DOCS)  # 原始查询文本不同（大小写），不能复用分数
+    assert len(reranker.model.calls) > model_calls
+
+    model_calls = len(reranker.model.calls)
+    changed = [doc(1, 'transformer is all you need')] + DOCS[:1]  # 同一ID，内容已变化
+    results = reranker('attention', changed, batch_size=8)
+    assert len(reranker.model.calls) == model_calls + 1
+    [call] = reranker.model.calls[model_calls:]
+    assert call[1]['input_ids'].shape[0] == 1  # 只为内容变化的文档重新打分
+    expected = reference_scores(reranker, 'attention', changed)
+    assert {r['metadata']['id']: r['score'] for r in results} == pytest.approx(expected, abs=1e-5)
+
+
+def test_uncached_pairs_are_batched_by_length(reranker):
+    docs = [doc(i, ' '.join(['sample'] * n)) for i, n in enumerate([9, 1, 5, 3, 7, 2])]
+    reranker('query', docs, batch_size=2)
+    lengths = [call[1]['attention_mask'].sum(dim=1).tolist() for call in reranker.model.calls]
+    assert len(lengths) == 3
+    flat = [n for batch in lengths for n in batch]
+    assert flat == sorted(flat)  # 按长度排序后分批，同批长度相近
+    assert all(call[1]['input_ids'].shape[1] == max(batch) for call, batch in zip(reranker.model.calls, lengths))
+
+
+def test_truncation_and_top_k(reranker):
+    reranker.max_length = 12
+    long_doc = doc(9, ' '.join(['sample'] * 30))
+    results = reranker('query', DOCS + [long_doc], top_k=2, verbose=True)
+    assert len(results) == 2
+    truncated = reranker('query', [long_doc], verbose=True)[0]
+    assert truncated['is_truncated'] and truncated['metadata']['truncated_tokens'] == 30 - (12 - 3 - 1)
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+pytest.importorskip("llama_index.core")
+pytest.importorskip("pymilvus")
+
+from RAG_Package.scale_embedding import parse_content_lists
+
+
+def write_content_lists(tmp_path, count):
+    paths = []
+    for i in range(count):
+        blocks = [{'type': 'text', 'text': f"文件{i} 第{j}段", 'page_idx': 0} for j in range(1 + (i * 37) % 200)]
+        path = tmp_path / f"doc{i}_content_list.json"
+        path.write_text(json.dumps(blocks, ensure_ascii=False), encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def test_process_pool_yields_results_in_input_order(tmp_path):
+    paths = write_content_lists(tmp_path, 12)
+    jobs = [(i, None if i % 4 == 3 else path) for i, path in enumerate(paths)]  # 部分文件无需解析
+    results = list(parse_content_lists(jobs, workers=3, max_pending=4))
+    assert [tag for tag, _ in results] == list(range(12))
+    for i, parsed in results:
+        if i % 4 == 3:
+            assert parsed is None
+        else:
+            text_chunks, raw_data = parsed
+            assert len(text_chunks) == 1 + (i * 37) % 200 and raw_data == []
+            assert {c['metadata']['file_name'] for c in text_chunks} == {f"doc{i}"}
+
+
+def test_in_flight_jobs_are_bounded(tmp_path):
+    paths = write_content_lists(tmp_path, 20)
+    submitted = []
+
+    def jobs():
+        for i, path in enumerate(paths):
+            submitted.append(i)
+            yield i, path
+
+    received = 0
+    for tag, _ in parse_content_lists(jobs(), workers=2, max_pending=3):
+        received += 1
+        assert tag == received - 1
+        assert len(submitted) - received < 3  # 提交的任务最多领先已取出的结果 max_pending 个
+    assert received == 20
+
+
+def test_single_worker_parses_in_process(tmp_path):
+    paths = write_content_lists(tmp_path, 3)
+    results = list(parse_content_lists(((i, p) for i, p in enumerate(paths)), workers=1))
+    assert [tag for tag, _ in results] == [0, 1, 2]
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from AWS_Service.sentences import SentenceSegmenter, split_sentences
+
+CASES = [
+    '你好，世界。Second one! tail',
+    'π约等于3.14。下一句',
+    'See e.g. the paper by Dr. Smith et al. in 2020. Next sentence.',
+    '步骤如下：\n1. 安装依赖\n2. 运行脚本。完成',
+    '代码如下：```python\nx = 1.5\nprint(x)! ok.\n``` 然后结束。',
+    '行内 `a.b()` 调用。好的',
+    '真的吗？！“是的。”他说。',
+    "it`s fine. Really? yes",
+]
+
+
+def segment(text, chunk=None, **kwargs):
+    segmenter = SentenceSegmenter(**kwargs)
+    out = []
+    if chunk is None:
+        out += segmenter.feed(text)
+    else:
+        for start in range(0, len(text), chunk):
+            out += segmenter.feed(text[start:start + chunk])
+    return out + segmenter.flush()
+
+
+@pytest.mark.parametrize('text', CASES)
+def test_concatenation_and_chunk_size_independence(text):
+    whole = segment(text)
+    assert ''.join(whole) == text
+    for chunk in (1, 2, 3, 7):
+        assert segment(text, chunk) == whole
+
+
+def test_random_text_is_chunk_size_independent():
+    rng = random.Random(1)
+    alphabet = 'ab. 。!?\n`3，”'
+    for _ in range(2000):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        max_chars = rng.randint(3, 12)
+        whole = segment(text, max_chars=max_chars)
+        assert ''.join(whole) == text
+        assert segment(text, rng.randint(1, 5), max_chars=max_chars) == whole
+
+
+def test_sentence_boundaries():
+    assert segment('真的吗？！“是的。”他说。') == ['真的吗？！', '“是的。”', '他说。']
+    assert segment('in the U.S. The end. No. 5 is here.') == ['in the U.S.', ' The end.', ' No.', ' 5 is here.']
+    assert split_sentences('好!!再见。') == ['好!!', '再见。']
+
+
+def test_unpaired_backtick_does_not_disable_splitting():
+    assert segment("it`s fine. Really? yes", chunk=1) == ['it`s fine.', ' Really?', ' yes']
+    assert segment('use `a. b` here. ok') == ['use `a. b` here.', ' ok']
+
+
+@pytest.mark.parametrize('text', ['。' * 20000, '!' * 20000, 'x' * 20000])
+def test_long_runs_are_cut_at_max_chars(text):
+    out = segment(text, chunk=1)
+    assert ''.join(out) == text
+    assert max(len(part) for part in out) <= 200
@@ -0,0 +1,55 @@
+import json
+import os
+
+import pytest
+
+from tools.dialogue_database import WalDialogueDB
+from tools.sqlite_dialogue_db import migrate_json_to_sqlite
+
+
+def make_source(path):
+    db = WalDialogueDB(str(path))
+    first = db.create_dialogue("first")
+    db.add_turn(first, "user", "问题一", [])
+    db.add_turn(first, "assistant", "回答一", [{"blob": "abc"}])
+    second = db.create_dialogue("second")
+    db.add_turn(second, "user", "问题二", [])
+    db.close()  # 变更仍在 .wal 中，迁移时需要重放
+    return first, second
+
+
+def test_migration_copies_dialogues_and_turns(tmp_path):
+    source = tmp_path / "db.json"
+    first, second = make_source(source)
+    files_before = {name: (tmp_path / name).read_bytes() for name in os.listdir(tmp_path)}
+
+    target = migrate_json_to_sqlite(str(source), str(tmp_path / "db.sqlite3"))
+    assert [d["id"] for d in target.get_dialogue_metadata()] == [second, first]
+    turns = target.get_turns_in_dialogue(first)
+    assert [(t["speaker"], t["content"]) for t in turns] == [("user", "问题一"), ("assistant", "回答一")]
+    assert turns[1]["images"] == [{"blob": "abc"}]
+
+    # 源库只读：快照与日志都没有被改写
+    assert {name: (tmp_path / name).read_bytes() for name in files_before} == files_before
+
+    migrate_json_to_sqlite(str(source), str(tmp_path / "db.sqlite3"))  # 重复执行不会产生重复记录
+    assert len(target.get_turns_in_dialogue(first)) == 2
+
+
+def test_missing_or_corrupt_source_fails_without_creating_files(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        migrate_json_to_sqlite(str(tmp_path / "missing.json"), str(tmp_path / "db.sqlite3"))
+    assert os.listdir(tmp_path) == []
+
+    (tmp_path / "bad.json").write_text("{not json")
+    with pytest.raises(json.JSONDecodeError):
+        migrate_json_to_sqlite(str(tmp_path / "bad.json"), str(tmp_path / "db.sqlite3"))
+    assert (tmp_path / "bad.json").read_text() == "{not json"
+
+
+def test_read_only_source_rejects_writes(tmp_path):
+    make_source(tmp_path / "db.json")
+    db = WalDialogueDB(str(tmp_path / "db.json"), read_only=True)
+    assert len(db.get_dialogue_metadata()) == 2
+    with pytest.raises(ValueError):
+        db.create_dialogue("new")
@@ -0,0 +1,66 @@
+import os
+import time
+
+from AWS_Service.tts_cache import PcmCache
+
+VOICE = {'VoiceId': 'Zhiyu', 'Engine': 'neural', 'LanguageCode': 'cmn-CN', 'OutputFormat': 'pcm'}
+
+
+def test_key_depends_on_text_and_voice():
+    assert PcmCache.key('你好', VOICE) == PcmCache.key(' 你好\n', VOICE)
+    assert PcmCache.key('你好', VOICE) != PcmCache.key('您好', VOICE)
+    assert PcmCache.key('你好', VOICE) != PcmCache.key('你好', {**VOICE, 'VoiceId': 'Ivy'})
+
+
+def test_get_put_and_stats(tmp_path):
+    cache = PcmCache(str(tmp_path), max_bytes=1000)
+    assert cache.get('a', VOICE) is None
+    cache.put('a', b'\x01' * 100, VOICE)
+    assert cache.get('a', VOICE) == b'\x01' * 100
+    assert cache.get('a', {**VOICE, 'VoiceId': 'Ivy'}) is None
+    stats = cache.stats()
+    assert (stats['files'], stats['bytes'], stats['hits'], stats['misses']) == (1, 100, 1, 2)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = PcmCache(str(tmp_path), max_bytes=300)
+    for text in ('a', 'b', 'c'):
+        cache.put(text, text.encode() * 100, VOICE)
+    cache.get('a', VOICE)  # a 变为最近使用
+    cache.put('d', b'd' * 100, VOICE)
+
+    assert cache.get('b', VOICE) is None
+    assert [cache.get(text, VOICE) is not None for text in ('a', 'c', 'd')] == [True, True, True]
+    assert cache.stats()['bytes'] == 300
+    assert len(list(tmp_path.glob('*/*.pcm'))) == 3
+
+
+def test_oversized_or_empty_data_is_not_cached(tmp_path):
+    cache = PcmCache(str(tmp_path), max_bytes=100)
+    cache.put('big', b'x' * 101, VOICE)
+    cache.put('empty', b'', VOICE)
+    assert cache.stats()['files'] == 0
+
+
+def test_lru_order_survives_restart(tmp_path):
+    cache = PcmCache(str(tmp_path), max_bytes=300)
+    for text in ('a', 'b', 'c'):
+        cache.put(text, text.encode() * 100, VOICE)
+    now = time.time()
+    for age, text in ((30, 'b'), (20, 'c'), (10, 'a')):  # 最久未使用的是 b
+        path = cache._path(cache.key(text, VOICE))
+        os.utime(path, (now - age, now - age))
+
+    restarted = PcmCache(str(tmp_path), max_bytes=300)
+    assert restarted.stats()['bytes'] == 300
+    restarted.put('d', b'd' * 100, VOICE)
+    assert restarted.get('b', VOICE) is None
+    assert restarted.get('a', VOICE) == b'a' * 100
+
+
+def test_missing_file_counts_as_miss(tmp_path):
+    cache = PcmCache(str(tmp_path), max_bytes=1000)
+    cache.put('a', b'a' * 10, VOICE)
+    os.remove(cache._path(cache.key('a', VOICE)))
+    assert cache.get('a', VOICE) is None
+    assert cache.stats()['files'] == 0
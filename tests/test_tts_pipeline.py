@@ -0,0 +1,222 @@
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from AWS_Service import Polly
+from AWS_Service.Polly import NullAudioSink, SpeechPipeline, TTSService
+from AWS_Service.tts_cache import PcmCache
+
+
+class FakePolly:
+    """把文本本身当作PCM返回；delays 指定某句的合成耗时"""
+    def __init__(self, delays=None, size=2048):
+        self.delays = delays or {}
+        self.size = size
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def pcm(self, text):
+        return text.encode('utf-8').ljust(self.size, b'\0')
+
+    def synthesize_speech(self, Text, **kwargs):
+        with self._lock:
+            self.calls.append(Text)
+        time.sleep(self.delays.get(Text, 0))
+        return {'AudioStream': io.BytesIO(self.pcm(Text))}
+
+
+class RecordingSink(NullAudioSink):
+    def __init__(self, realtime=False):
+        super().__init__(realtime)
+        self.data = bytearray()
+
+    def write(self, data):
+        super().write(data)
+        self.data += data
+
+
+def test_playback_follows_feed_order(tmp_path):
+    polly = FakePolly(delays={'one': 0.2, 'two': 0.1})
+    sink = RecordingSink()
+    pipeline = SpeechPipeline(polly, sink, prefetch=2, cache=None).start()
+    for text in ('one', 'two', 'three'):
+        pipeline.feed(text)
+    assert pipeline.close(timeout=5)
+    assert bytes(sink.data) == b''.join(polly.pcm(text) for text in ('one', 'two', 'three'))
+
+
+def test_cancel_stops_playback_quickly():
+    polly = FakePolly(size=32000)  # 每句1秒音频
+    sink = RecordingSink(realtime=True)
+    pipeline = SpeechPipeline(polly, sink, cache=None).start()
+    for i in range(5):
+        pipeline.feed(f"s{i}")
+    time.sleep(0.2)
+    started = time.monotonic()
+    pipeline.cancel()
+    assert pipeline.wait(timeout=2)
+    assert time.monotonic() - started < 1
+    assert sink.bytes_written < 32000
+    pipeline.feed('ignored')
+    assert 'ignored' not in polly.calls
+
+
+def test_repeated_text_is_served_from_cache(tmp_path):
+    cache = PcmCache(str(tmp_path), max_bytes=1 << 20)
+    polly = FakePolly()
+    sink = RecordingSink()
+    service = TTSService(polly=polly, sink=sink, cache=cache)
+    assert service.speak('同一句话。').wait(timeout=5)
+    assert service.speak('同一句话。').wait(timeout=5)
+    assert polly.calls == ['同一句话。']
+    assert cache.stats()['hits'] == 1
+    assert bytes(sink.data) == polly.pcm('同一句话。') * 2
+
+
+def test_jobs_run_in_order_and_unclosed_job_does_not_block_worker(tmp_path):
+    polly = FakePolly()
+    sink = RecordingSink()
+    service = TTSService(polly=polly, sink=sink, cache=None, idle_timeout=0.3)
+    abandoned = service.stream()
+    abandoned.feed('first')  # 调用方出错，既没有 close 也没有 cancel
+    second = service.speak('second')
+    assert second.wait(timeout=5)
+    assert abandoned.wait(0)
+    assert bytes(sink.data) == polly.pcm('first') + polly.pcm('second')
+
+
+def test_interrupt_cancels_pending_jobs():
+    polly = FakePolly(size=32000)
+    sink = RecordingSink(realtime=True)
+    service = TTSService(polly=polly, sink=sink, cache=None)
+    first = service.speak('long answer')
+    queued = service.speak('queued')
+    time.sleep(0.2)
+    latest = service.speak('latest', interrupt=True)
+    assert first.wait(timeout=2) and queued.wait(timeout=2)
+    assert first.cancelled and queued.cancelled
+    assert latest.wait(timeout=5) and not latest.cancelled
+    assert 'queued' not in polly.calls
+
+
+def test_service_uses_one_worker_and_one_sink(monkeypatch):
+    sinks, closers = [], []
+
+    def fake_make_sink():
+        sinks.append(RecordingSink())
+        return sinks[-1]
+
+    monkeypatch.setattr(Polly, 'make_sink', fake_make_sink)
+    monkeypatch.setattr(Polly.atexit, 'register', closers.append)
+    polly = FakePolly(delays={'a': 0.1})
+    service = TTSService(polly=polly, cache=None)
+    jobs = [service.speak(text) for text in ('a', 'b', 'c')]
+    assert all(job.wait(timeout=5) for job in jobs)
+
+    assert len(sinks) == 1 and closers == [sinks[0].close]  # 输出设备只打开一次，退出时关闭
+    assert bytes(sinks[0].data) == b''.join(polly.pcm(text) for text in ('a', 'b', 'c'))
+    workers = [t for t in threading.enumerate() if t.name == 'tts-service' and t is service._worker]
+    assert len(workers) == 1
+
+
+def test_released_job_frees_the_worker():
+    polly = FakePolly()
+    sink = RecordingSink()
+    service = TTSService(polly=polly, sink=sink, cache=None, idle_timeout=None)
+    unfinished = service.stream()
+    unfinished.feed('partial')
+    unfinished.cancel()  # voice_call.Reader.release()：没有播放完的任务要取消
+    nxt = service.speak('next')
+    assert unfinished.wait(timeout=2) and nxt.wait(timeout=5)
+    assert polly.pcm('next') in bytes(sink.data)
+
+
+def test_reader_plays_and_stops(monkeypatch):
+    polly = FakePolly(size=32000)
+    sink = RecordingSink(realtime=True)
+    monkeypatch.setattr(Polly, 'tts_service', TTSService(polly=polly, sink=sink, cache=None))
+    reader = Polly.Reader('第一句。第二句。')
+    assert not reader.is_playing()
+    reader.start()
+    time.sleep(0.2)
+    assert reader.is_playing()
+    reader.stop()
+    reader.join(timeout=2)
+    assert not reader.is_playing()
+    assert sink.bytes_written < 32000 * 2
+
+
+class FakePyAudio:
+    paInt16 = 8
+
+    def __init__(self):
+        self.streams = []
+        self.terminated = False
+
+    def PyAudio(self):
+        return self
+
+    def open(self, **kwargs):
+        self.streams.append(FakeStream())
+        return self.streams[-1]
+
+    def terminate(self):
+        self.terminated = True
+
+
+class FakeStream:
+    def __init__(self):
+        self.written = []
+        self.closed = False
+        self.fail = False
+
+    def write(self, data):
+        if self.fail:
+            raise OSError("设备已断开")
+        self.written.append(data)
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_pyaudio_sink_reuses_stream_and_reopens_after_error(monkeypatch):
+    pyaudio = FakePyAudio()
+    monkeypatch.setitem(sys.modules, 'pyaudio', pyaudio)
+    sink = Polly.PyAudioSink()
+    sink.write(b'1')
+    sink.write(b'2')
+    assert len(pyaudio.streams) == 1 and pyaudio.streams[0].written == [b'1', b'2']
+
+    pyaudio.streams[0].fail = True
+    with pytest.raises(OSError):
+        sink.write(b'3')
+    assert pyaudio.streams[0].closed
+    sink.write(b'4')  # 出错后下次播放重新打开
+    assert len(pyaudio.streams) == 2 and pyaudio.streams[1].written == [b'4']
+
+    sink.close()
+    assert pyaudio.streams[1].closed and pyaudio.terminated
+    sink.close()  # 重复关闭无副作用
+
+
+def test_make_sink():
+    assert isinstance(Polly.make_sink('null'), NullAudioSink)
+    assert isinstance(Polly.make_sink('pyaudio'), Polly.PyAudioSink)
+    with pytest.raises(ValueError):
+        Polly.make_sink('alsa')
+
+
+def test_null_sink_selected_by_environment():
+    code = ("from AWS_Service.Polly import NullAudioSink, TTSService; "
+            "assert isinstance(TTSService().sink, NullAudioSink)")
+    env = dict(os.environ, NEXT_AUDIO_SINK='null')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', code], cwd=root, env=env, check=True, timeout=60)
@@ -0,0 +1,142 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from RAG_Package.vector_store import PAYLOAD_FILE, LocalVectorStore
+
+
+def columns(keys, dim=4, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(len(keys), dim)).astype(np.float32)
+    return [list(keys), [f"text {k}\n第二行" for k in keys], [{'k': k} for k in keys], vectors]
+
+
+def brute_force(vectors, query, limit):
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    return list(np.argsort(distances)[:limit])
+
+
+def test_search_matches_brute_force_and_reads_payload(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=4)
+    keys = [f"k{i}" for i in range(50)]
+    cols = columns(keys)
+    store.insert(cols)
+    query = cols[3][7] + 0.01
+    hits = store.search([query], limit=5)[0]
+    assert [hit['id'] for hit in hits] == [keys[i] for i in brute_force(cols[3], query, 5)]
+    assert hits[0]['entity'] == {'text': 'text k7\n第二行', 'metadata': {'k': 'k7'}}
+    assert abs(hits[0]['distance'] - float(((cols[3][7] - query) ** 2).sum())) < 1e-4
+
+
+def test_payload_is_append_only_and_survives_reopen(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=4)
+    store.insert(columns(['a', 'b']))
+    store.flush()
+    before = (tmp_path / PAYLOAD_FILE).read_bytes()
+    store.upsert(columns(['b', 'c'], seed=1))
+    store.delete(['a'])
+    after = (tmp_path / PAYLOAD_FILE).read_bytes()
+    assert after.startswith(before) and after.count(b'\n') == 4
+    store.flush()
+
+    reopened = LocalVectorStore(str(tmp_path))
+    assert reopened.count() == 2
+    vectors = columns(['b', 'c'], seed=1)[3]
+    assert reopened.search([vectors[1]], limit=1)[0][0]['id'] == 'c'
+    assert {hit['id'] for hit in reopened.search([vectors[0]], limit=10)[0]} == {'b', 'c'}
+
+
+def test_unflushed_rows_are_dropped_on_reopen(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=4)
+    store.insert(columns(['a']))
+    store.flush()
+    store.insert(columns(['b'], seed=1))  # 未 flush
+    reopened = LocalVectorStore(str(tmp_path))
+    assert reopened.count() == 1
+    reopened.insert(columns(['b'], seed=2))
+    assert {hit['id'] for hit in reopened.search([np.zeros(4)], limit=10)[0]} == {'a', 'b'}
+
+
+def test_compaction_rewrites_payload(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=4)
+    keys = [f"k{i}" for i in range(3000)]
+    cols = columns(keys)
+    store.insert(cols)
+    store.delete(keys[:2000])
+    store.flush()
+    assert store._count == 1000
+    with open(tmp_path / PAYLOAD_FILE, 'rb') as f:
+        assert sum(1 for _ in f) == 1000
+    hit = store.search([cols[3][2500]], limit=1)[0][0]
+    assert hit['id'] == 'k2500' and hit['entity']['metadata'] == {'k': 'k2500'}
+    assert LocalVectorStore(str(tmp_path)).search([cols[3][2999]], limit=1)[0][0]['id'] == 'k2999'
+
+
+def test_legacy_payload_json_is_converted(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=4)
+    cols = columns(['a', 'b'])
+    store.insert(cols)
+    store.flush()
+    rows = [json.loads(line) for line in (tmp_path / PAYLOAD_FILE).read_text(encoding='utf-8').splitlines()]
+    (tmp_path / PAYLOAD_FILE).unlink()
+    (tmp_path / 'payload.json').write_text(json.dumps(rows, ensure_ascii=False), encoding='utf-8')
+
+    reopened = LocalVectorStore(str(tmp_path))
+    assert not (tmp_path / 'payload.json').exists()
+    assert reopened.search([cols[3][1]], limit=1)[0][0]['entity']['text'] == 'text b\n第二行'
+
+
+def test_compaction_closes_old_reader_after_in_flight_search(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=4)
+    keys = [f"k{i}" for i in range(3000)]
+    cols = columns(keys)
+    store.insert(cols)
+    store.delete(keys[:2000])
+    old_reader = store._reader
+    read_raw = store._read_raw
+    seen = []
+
+    def compact_during_read(reader, offsets, row):
+        if threading.current_thread().name != 'compactor':
+            if not seen:
+                compactor = threading.Thread(target=store.flush, name='compactor')  # 检索读取命中行之前压缩完成
+                compactor.start()
+                compactor.join()
+                assert store._reader is not old_reader and not old_reader.closed
+            seen.append(reader)
+        return read_raw(reader, offsets, row)
+
+    store._read_raw = compact_during_read
+    hits = store.search([cols[3][2500]], limit=3)[0]
+    assert hits[0]['id'] == 'k2500' and set(seen) == {old_reader}
+    assert old_reader.closed and not store._reader.closed
+    assert store._reader_users == {}
+
+    del store._read_raw
+    new_reader = store._reader
+    extra = [f"n{i}" for i in range(2000)]
+    store.insert(columns(extra, seed=1))
+    store.delete(extra)
+    store.flush()  # 没有在途检索时旧句柄立即关闭
+    assert new_reader.closed
+    assert store.search([cols[3][2950]], limit=1)[0][0]['id'] == 'k2950'
+
+
+def test_write_rejects_mismatched_columns(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=4)
+    keys, texts, metadatas, vectors = columns(['a', 'b'])
+    with pytest.raises(ValueError, match="行数不一致"):
+        store.insert([keys, texts[:1], metadatas, vectors])
+    with pytest.raises(ValueError, match="行数不一致"):
+        store.upsert([keys, texts, metadatas, vectors[:1]])
+    with pytest.raises(ValueError, match="维度不匹配"):
+        store.insert([keys, texts, metadatas, np.zeros((2, 3), dtype=np.float32)])
+    with pytest.raises(ValueError, match="维度不匹配"):
+        store.insert([keys[:1], texts[:1], metadatas[:1], np.zeros(8, dtype=np.float32)])
+    assert store.count() == 0 and (tmp_path / PAYLOAD_FILE).read_bytes() == b''
+
+    store.insert([[], [], [], []])
+    store.insert([keys, texts, metadatas, vectors])
+    assert store.count() == 2
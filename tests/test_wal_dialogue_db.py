@@ -0,0 +1,119 @@
+import json
+import os
+
+import pytest
+
+from tools.dialogue_database import DialogueDB, WalDialogueDB
+
+
+def snapshot(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_changes_survive_restart_via_wal_replay(tmp_path):
+    path = str(tmp_path / "db.json")
+    db = WalDialogueDB(path)
+    dialogue_id = db.create_dialogue("标题")
+    turn_id = db.add_turn(dialogue_id, "user", "你好", [])
+    db.update_dialogue_title(dialogue_id, "新标题")
+    db.close()
+
+    assert snapshot(path)["dialogues"] == {}  # 变更只写入了日志
+    assert len(open(path + ".wal").read().splitlines()) == 3
+
+    reopened = WalDialogueDB(path)
+    assert reopened.data["dialogues"][dialogue_id]["title"] == "新标题"
+    assert list(reopened.data["turns"]) == [turn_id]
+    assert [t["content"] for t in reopened.get_turns_in_dialogue(dialogue_id)] == ["你好"]
+    # 启动时重放后立即压缩：快照包含全部数据，日志被清空
+    assert dialogue_id in snapshot(path)["dialogues"]
+    assert os.path.getsize(path + ".wal") == 0
+    reopened.close()
+
+
+def test_torn_last_record_is_ignored(tmp_path):
+    path = str(tmp_path / "db.json")
+    db = WalDialogueDB(path)
+    dialogue_id = db.create_dialogue("t")
+    db.add_turn(dialogue_id, "user", "完整的记录", [])
+    db.close()
+    with open(path + ".wal", "a") as f:
+        f.write('{"op": "add_turn", "id": "x", "dialo')  # 进程崩溃时写了一半
+
+    reopened = WalDialogueDB(path)
+    assert [t["content"] for t in reopened.get_turns_in_dialogue(dialogue_id)] == ["完整的记录"]
+    reopened.close()
+
+
+def test_compaction_keeps_writes_made_during_and_after_it(tmp_path):
+    path = str(tmp_path / "db.json")
+    db = WalDialogueDB(path, compact_every=10)
+    dialogue_id = db.create_dialogue("t")
+    for i in range(25):
+        db.add_turn(dialogue_id, "user", f"第{i}轮", [])
+    db.close()  # 等待后台压缩结束
+
+    assert not os.path.exists(path + ".wal.compacting")
+    wal_records = len(open(path + ".wal").read().splitlines())
+    assert len(snapshot(path)["turns"]) >= 9  # 至少压缩过一次（第10条记录触发）
+    assert len(snapshot(path)["turns"]) + wal_records >= 25
+
+    reopened = WalDialogueDB(path)
+    assert [t["content"] for t in reopened.get_turns_in_dialogue(dialogue_id)] == [f"第{i}轮" for i in range(25)]
+    reopened.close()
+
+
+def test_leftover_compacting_log_is_replayed(tmp_path):
+    path = str(tmp_path / "db.json")
+    db = WalDialogueDB(path)
+    dialogue_id = db.create_dialogue("t")
+    db.add_turn(dialogue_id, "user", "旧日志", [])
+    db.close()
+    os.replace(path + ".wal", path + ".wal.compacting")  # 模拟压缩途中崩溃
+    db = WalDialogueDB(path)
+    db.add_turn(dialogue_id, "assistant", "新日志", [])
+    db.close()
+
+    reopened = WalDialogueDB(path)
+    assert [t["content"] for t in reopened.get_turns_in_dialogue(dialogue_id)] == ["旧日志", "新日志"]
+    assert not os.path.exists(path + ".wal.compacting")
+    reopened.close()
+
+
+def test_snapshot_stays_compatible_with_dialogue_db(tmp_path):
+    path = str(tmp_path / "db.json")
+    db = WalDialogueDB(path)
+    dialogue_id = db.create_dialogue("t")
+    db.add_turn(dialogue_id, "user", "内容", [])
+    db.compact()
+    db.close()
+    assert [t["content"] for t in DialogueDB(path).get_turns_in_dialogue(dialogue_id)] == ["内容"]
+
+
+def test_failed_snapshot_write_restores_rotated_log(tmp_path, monkeypatch):
+    path = str(tmp_path / "db.json")
+    db = WalDialogueDB(path)
+    dialogue_id = db.create_dialogue("t")
+    db.add_turn(dialogue_id, "user", "压缩前", [])
+
+    def disk_full(snapshot):
+        db.add_turn(dialogue_id, "assistant", "压缩中", [])  # 写快照期间的并发写入
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(db, "_write_snapshot", disk_full)
+    with pytest.raises(OSError):
+        db.compact()
+    monkeypatch.undo()
+
+    assert not os.path.exists(path + ".wal.compacting")  # 不会挡住以后的压缩
+    assert len(open(path + ".wal").read().splitlines()) == 3
+    db.add_turn(dialogue_id, "user", "压缩后", [])
+    db.compact()
+    assert len(snapshot(path)["turns"]) == 3
+    assert os.path.getsize(path + ".wal") == 0
+    db.close()
+
+    reopened = WalDialogueDB(path)
+    assert [t["content"] for t in reopened.get_turns_in_dialogue(dialogue_id)] == ["压缩前", "压缩中", "压缩后"]
+    reopened.close()
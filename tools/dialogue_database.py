@@ -1,4 +1,9 @@
 import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from typing import Dict, List, Optional
 import uuid
 import datetime
@@ -6,6 +11,7 @@ import datetime
 class DialogueDB:
     def __init__(self, file_path: str = "dialogue_db.json"):
         self.file_path = file_path
+        self._lock = threading.RLock()  # 所有变更经 _mutate 串行化
         self._initialize_data()
         self._load_db()
     
@@ -25,37 +31,121 @@ class DialogueDB:
     def _load_db(self):
         """加载数据并验证结构"""
         try:
-            with open(self.file_path, "r") as f:
-                loaded_data = json.load(f)
-                
-                # 验证并修复数据结构
-                if not isinstance(loaded_data, dict):
-                    raise ValueError("Invalid data format")
-                
-                # 确保所有必需的键都存在
-                for key in ["dialogues", "turns", "indexes"]:
-                    if key not in loaded_data:
-                        loaded_data[key] = self._initialize_data()[key]
-                
-                # 确保indexes内的结构正确
-                indexes = loaded_data.get("indexes", {})
-                for subkey in ["dialogue_timestamps", "dialogue_titles", "dialogue_turns"]:
-                    if subkey not in indexes:
-                        indexes[subkey] = self._initialize_data()["indexes"][subkey]
-                
-                self.data = loaded_data
-                
+            self.data = self._read_snapshot()
         except (FileNotFoundError, json.JSONDecodeError, ValueError):
             # 如果文件不存在或数据损坏，初始化新数据
             self._initialize_data()
             self._save_db()
+
+    def _read_snapshot(self) -> Dict:
+        """读取并修复快照文件的结构；文件不存在或损坏时抛出异常，不改动任何文件"""
+        with open(self.file_path, "r") as f:
+            loaded_data = json.load(f)
+
+        # 验证并修复数据结构
+        if not isinstance(loaded_data, dict):
+            raise ValueError("Invalid data format")
+
+        # 确保所有必需的键都存在
+        for key in ["dialogues", "turns", "indexes"]:
+            if key not in loaded_data:
+                loaded_data[key] = {"dialogues": {}, "turns": {}, "indexes": {}}[key]
+
+        # 确保indexes内的结构正确
+        indexes = loaded_data["indexes"]
+        for subkey in ["dialogue_timestamps", "dialogue_titles", "dialogue_turns"]:
+            if subkey not in indexes:
+                indexes[subkey] = [] if subkey == "dialogue_timestamps" else {}
+        return loaded_data
     
     def _save_db(self):
         """保存数据到文件"""
         with open(self.file_path, "w") as f:
             json.dump(self.data, f, indent=2)
-    
-    # 其他方法保持不变...
+
+    def _mutate(self, record: Dict):
+        """应用一条变更记录并持久化（子类可改写 _commit 以更换存储方式）"""
+        with self._lock:
+            self._apply_record(record)
+            self._commit(record)
+
+    def _commit(self, record: Dict):
+        """默认实现：整库重写JSON文件"""
+        self._save_db()
+
+    def _apply_record(self, record: Dict):
+        """将变更记录应用到内存数据（幂等，便于日志重放）"""
+        op = record["op"]
+        dialogues = self.data["dialogues"]
+        turns = self.data["turns"]
+        indexes = self.data["indexes"]
+
+        if op == "create_dialogue":
+            dialogue_id = record["id"]
+            if dialogue_id in dialogues:
+                return
+            dialogues[dialogue_id] = {
+                "title": record["title"],
+                "created_at": record["created_at"],
+                "updated_at": record["created_at"]
+            }
+            indexes["dialogue_timestamps"].append(dialogue_id)
+            indexes["dialogue_turns"][dialogue_id] = []  # 初始化轮次列表
+            if record["title"]:
+                indexes["dialogue_titles"][record["title"]] = dialogue_id
+
+        elif op == "add_turn":
+            turn_id = record["id"]
+            dialogue_id = record["dialogue_id"]
+            if turn_id in turns or dialogue_id not in dialogues:
+                return
+            turns[turn_id] = {
+                "dialogue_id": dialogue_id,
+                "speaker": record["speaker"],
+                "content": record["content"],
+                "images": record["images"],
+                "timestamp": record["timestamp"]
+            }
+            indexes["dialogue_turns"].setdefault(dialogue_id, []).append(turn_id)
+            dialogues[dialogue_id]["updated_at"] = record["timestamp"]
+
+        elif op == "update_title":
+            dialogue_id = record["dialogue_id"]
+            if dialogue_id not in dialogues:
+                return
+            old_title = dialogues[dialogue_id]["title"]
+            dialogues[dialogue_id]["title"] = record["title"]
+            dialogues[dialogue_id]["updated_at"] = record["updated_at"]
+            if old_title in indexes["dialogue_titles"]:
+                indexes["dialogue_titles"].pop(old_title)
+            if record["title"]:  # Only index non-empty titles
+                indexes["dialogue_titles"][record["title"]] = dialogue_id
+
+        elif op == "delete_dialogue":
+            dialogue_id = record["dialogue_id"]
+            if dialogue_id not in dialogues:
+                return
+            for turn_id in indexes["dialogue_turns"].get(dialogue_id, []):
+                turns.pop(turn_id, None)
+            title = dialogues[dialogue_id]["title"]
+            if title in indexes["dialogue_titles"]:
+                indexes["dialogue_titles"].pop(title)
+            if dialogue_id in indexes["dialogue_timestamps"]:
+                indexes["dialogue_timestamps"].remove(dialogue_id)
+            indexes["dialogue_turns"].pop(dialogue_id, None)
+            dialogues.pop(dialogue_id)
+
+        elif op == "delete_turn":
+            turn_id = record["id"]
+            if turn_id not in turns:
+                return
+            dialogue_id = turns[turn_id]["dialogue_id"]
+            if turn_id in indexes["dialogue_turns"].get(dialogue_id, []):
+                indexes["dialogue_turns"][dialogue_id].remove(turn_id)
+            turns.pop(turn_id)
+
+        else:
+            raise ValueError(f"未知的变更类型: {op}")
 
     def _generate_id(self) -> str:
         """Generate a standardized UUID-based ID with timestamp prefix"""
@@ -63,6 +153,10 @@ class DialogueDB:
         unique_id = uuid.uuid4().hex[:8]  # First 8 chars of UUID
         return f"{timestamp}_{unique_id}"
 
+    def has_dialogue(self, dialogue_id: str) -> bool:
+        """对话是否存在"""
+        return dialogue_id in self.data["dialogues"]
+
     def create_dialogue(self, title: str = "") -> str:
         """创建新对话（确保初始化所有必要结构）"""
         dialogue_id = self._generate_id()
@@ -79,22 +173,13 @@ class DialogueDB:
                 "dialogue_turns": {}
             }
         
-        # 添加对话数据
-        now = datetime.datetime.now().isoformat()
-        self.data["dialogues"][dialogue_id] = {
+        # 添加对话数据并更新索引
+        self._mutate({
+            "op": "create_dialogue",
+            "id": dialogue_id,
             "title": title,
-            "created_at": now,
-            "updated_at": now
-        }
-        
-        # 更新索引
-        self.data["indexes"]["dialogue_timestamps"].append(dialogue_id)
-        self.data["indexes"]["dialogue_turns"][dialogue_id] = []  # 初始化轮次列表
-        
-        if title:
-            self.data["indexes"]["dialogue_titles"][title] = dialogue_id
-        
-        self._save_db()
+            "created_at": datetime.datetime.now().isoformat()
+        })
         return dialogue_id
 
 
@@ -119,56 +204,54 @@ class DialogueDB:
         # 生成轮次ID
         turn_id = self._generate_id()
         
-        # 添加轮次数据
-        self.data["turns"][turn_id] = {
+        # 添加轮次数据，同时更新索引和对话的修改时间
+        self._mutate({
+            "op": "add_turn",
+            "id": turn_id,
             "dialogue_id": dialogue_id,
             "speaker": speaker,
             "content": content,
             "images": images or [],
             "timestamp": datetime.datetime.now().isoformat()
-        }
-        
-        # 更新索引
-        self.data["indexes"]["dialogue_turns"][dialogue_id].append(turn_id)
-        
-        # 更新对话的修改时间
-        self.data["dialogues"][dialogue_id]["updated_at"] = datetime.datetime.now().isoformat()
-        
-        self._save_db()
+        })
         return turn_id
 
     def get_dialogue_metadata(self) -> List[Dict[str, str]]:
         """Get all dialogues' metadata in reverse chronological order"""
-        return [
-            {
-                "id": dialogue_id,
-                "title": self.data["dialogues"][dialogue_id]["title"],
-                "created_at": self.data["dialogues"][dialogue_id]["created_at"],
-                "updated_at": self.data["dialogues"][dialogue_id]["updated_at"]
-            }
-            for dialogue_id in reversed(self.data["indexes"]["dialogue_timestamps"])
-        ]
+        with self._lock:  # 与后台写入/压缩并发时也读到一致的状态
+            return [
+                {
+                    "id": dialogue_id,
+                    "title": self.data["dialogues"][dialogue_id]["title"],
+                    "created_at": self.data["dialogues"][dialogue_id]["created_at"],
+                    "updated_at": self.data["dialogues"][dialogue_id]["updated_at"]
+                }
+                for dialogue_id in reversed(self.data["indexes"]["dialogue_timestamps"])
+            ]
 
     def get_turns_in_dialogue(self, dialogue_id: str) -> List[Dict]:
         """Get all turns in a dialogue in chronological order"""
-        if dialogue_id not in self.data["indexes"]["dialogue_turns"]:
-            return []
-        
-        return [
-            self.data["turns"][turn_id]
-            for turn_id in self.data["indexes"]["dialogue_turns"][dialogue_id]
-        ]
+        with self._lock:
+            if dialogue_id not in self.data["indexes"]["dialogue_turns"]:
+                return []
+
+            # 返回副本，调用方在锁外使用时不受后续变更影响
+            return [
+                dict(self.data["turns"][turn_id])
+                for turn_id in self.data["indexes"]["dialogue_turns"][dialogue_id]
+            ]
 
     def search_dialogues_by_title(self, title_query: str) -> List[Dict[str, str]]:
         """Search dialogues by title (case-insensitive partial match)"""
         results = []
-        for title, dialogue_id in self.data["indexes"]["dialogue_titles"].items():
-            if title_query.lower() in title.lower():
-                results.append({
-                    "id": dialogue_id,
-                    "title": title,
-                    "created_at": self.data["dialogues"][dialogue_id]["created_at"]
-                })
+        with self._lock:
+            for title, dialogue_id in self.data["indexes"]["dialogue_titles"].items():
+                if title_query.lower() in title.lower():
+                    results.append({
+                        "id": dialogue_id,
+                        "title": title,
+                        "created_at": self.data["dialogues"][dialogue_id]["created_at"]
+                    })
         return results
 
     def delete_dialogue(self, dialogue_id: str):
@@ -176,31 +259,15 @@ class DialogueDB:
         if dialogue_id not in self.data["dialogues"]:
             return
         
-        # Remove all turns
-        for turn_id in self.data["indexes"]["dialogue_turns"][dialogue_id]:
-            self.data["turns"].pop(turn_id, None)
-        
-        # Remove from indexes
-        title = self.data["dialogues"][dialogue_id]["title"]
-        if title in self.data["indexes"]["dialogue_titles"]:
-            self.data["indexes"]["dialogue_titles"].pop(title)
-        
-        self.data["indexes"]["dialogue_timestamps"].remove(dialogue_id)
-        self.data["indexes"]["dialogue_turns"].pop(dialogue_id)
-        
-        # Remove dialogue
-        self.data["dialogues"].pop(dialogue_id)
-        self._save_db()
+        # Remove all turns, index entries and the dialogue itself
+        self._mutate({"op": "delete_dialogue", "dialogue_id": dialogue_id})
 
     def delete_turn(self, turn_id: str):
         """Delete a specific turn"""
         if turn_id not in self.data["turns"]:
             return
         
-        dialogue_id = self.data["turns"][turn_id]["dialogue_id"]
-        self.data["indexes"]["dialogue_turns"][dialogue_id].remove(turn_id)
-        self.data["turns"].pop(turn_id)
-        self._save_db()
+        self._mutate({"op": "delete_turn", "id": turn_id})
 
     def get_all_dialogues_sorted(self) -> List[Dict]:
         """获取所有对话(按创建时间排序，从早到晚)"""
@@ -227,23 +294,149 @@ class DialogueDB:
         if dialogue_id not in self.data["dialogues"]:
             return False
         
-        # Get the old title for index updating
-        old_title = self.data["dialogues"][dialogue_id]["title"]
-        
-        # Update the dialogue record
-        self.data["dialogues"][dialogue_id]["title"] = new_title
-        self.data["dialogues"][dialogue_id]["updated_at"] = datetime.datetime.now().isoformat()
-        
-        # Update the title index if needed
-        if old_title in self.data["indexes"]["dialogue_titles"]:
-            self.data["indexes"]["dialogue_titles"].pop(old_title)
-        
-        if new_title:  # Only index non-empty titles
-            self.data["indexes"]["dialogue_titles"][new_title] = dialogue_id
-        
-        self._save_db()
+        # Update the dialogue record and the title index
+        self._mutate({
+            "op": "update_title",
+            "dialogue_id": dialogue_id,
+            "title": new_title,
+            "updated_at": datetime.datetime.now().isoformat()
+        })
         return True
 
+class WalDialogueDB(DialogueDB):
+    """
+    追加写日志（write-ahead log）存储引擎
+    每次变更只向 <file_path>.wal 追加一行JSON记录，加载时在快照之上重放日志；
+    日志达到一定条数后由后台线程压缩为新的快照（即原JSON文件格式，与DialogueDB兼容）
+    """
+    def __init__(self, file_path: str = "dialogue_db.json", compact_every: int = 500, fsync: bool = False,
+                 read_only: bool = False):
+        """
+        :param read_only: 只读打开（如迁移的数据源）：快照必须存在，重放日志但不压缩、不创建或改写任何文件
+        """
+        self.read_only = read_only
+        self.wal_path = file_path + ".wal"
+        self.compacting_path = file_path + ".wal.compacting"
+        self.compact_every = compact_every  # 日志累计多少条记录后触发压缩
+        self.fsync = fsync  # 是否每条记录都落盘（更安全但更慢）
+        self._wal = None
+        self._wal_records = 0
+        self._compaction_thread = None
+        super().__init__(file_path)
+
+    def _load_db(self):
+        """加载快照，然后按顺序重放（可能残留的）压缩中日志和当前日志"""
+        if self.read_only:
+            self.data = self._read_snapshot()
+            for path in (self.compacting_path, self.wal_path):
+                self._replay(path)
+            return
+
+        super()._load_db()
+        replayed = 0
+        for path in (self.compacting_path, self.wal_path):
+            replayed += self._replay(path)
+
+        if replayed or os.path.exists(self.compacting_path):
+            # 启动时同步压缩一次，清理上次运行遗留的日志
+            self._write_snapshot(json.dumps(self.data))
+            if os.path.exists(self.compacting_path):
+                os.remove(self.compacting_path)
+            open(self.wal_path, "w").close()
+
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+
+    def _replay(self, path: str) -> int:
+        """重放单个日志文件，返回应用的记录数（末尾写了一半的记录会被忽略）"""
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # 进程崩溃时最后一行可能不完整
+                self._apply_record(record)
+                count += 1
+        return count
+
+    def _commit(self, record: Dict):
+        """追加一条日志记录（调用方已持有锁）"""
+        if self.read_only:
+            raise ValueError(f"数据库以只读方式打开，不能修改: {self.file_path}")
+        if self._wal is None:
+            # _load_db 初始化空库时会走到这里，此时直接写快照即可
+            self._save_db()
+            return
+        self._wal.write(json.dumps(record) + "\n")
+        self._wal.flush()
+        if self.fsync:
+            os.fsync(self._wal.fileno())
+        self._wal_records += 1
+        if self._wal_records >= self.compact_every:
+            self._start_compaction()
+
+    def _start_compaction(self):
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self.compact, daemon=True)
+        self._compaction_thread.start()
+
+    def compact(self):
+        """将当前内存状态写成快照，并丢弃已经包含在快照里的日志"""
+        with self._lock:
+            if os.path.exists(self.compacting_path):
+                return  # 上一次压缩尚未完成
+            snapshot = json.dumps(self.data)
+            # 轮换日志：之后的变更写入新的日志文件
+            self._wal.close()
+            os.replace(self.wal_path, self.compacting_path)
+            self._wal = open(self.wal_path, "a", encoding="utf-8")
+            rotated, self._wal_records = self._wal_records, 0
+
+        # 耗时的落盘在锁外完成，不阻塞新的写入
+        try:
+            self._write_snapshot(snapshot)
+        except BaseException:
+            self._restore_rotated_wal(rotated)
+            raise
+        os.remove(self.compacting_path)
+
+    def _restore_rotated_wal(self, rotated: int):
+        """快照写入失败：把轮换出去的日志并回当前日志之前，下次写入时重新尝试压缩"""
+        with self._lock:
+            self._wal.close()
+            with open(self.compacting_path, "a", encoding="utf-8") as merged, \
+                    open(self.wal_path, "r", encoding="utf-8") as tail:
+                shutil.copyfileobj(tail, merged)
+                merged.flush()
+                os.fsync(merged.fileno())
+            os.replace(self.compacting_path, self.wal_path)
+            self._wal = open(self.wal_path, "a", encoding="utf-8")
+            self._wal_records += rotated
+
+    def _write_snapshot(self, snapshot: str):
+        """原子地替换快照文件"""
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.file_path)
+
+    def close(self):
+        """等待后台压缩结束并关闭日志文件"""
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+
 class DialogueSession:
     def __init__(self, db: DialogueDB, dialogue_id: str = None):
         self.db = db
@@ -251,7 +444,7 @@ class DialogueSession:
     
     def set_dialogue(self, dialogue_id: str):
         """设置当前对话"""
-        if dialogue_id in self.db.data["dialogues"]:
+        if self.db.has_dialogue(dialogue_id):
             self.current_dialogue = dialogue_id
             return True
         return False
@@ -279,51 +472,115 @@ class DialogueSession:
 
 
 
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+def open_dialogue_db(db_path: str):
+    """根据文件后缀选择存储后端：SQLite文件用SqliteDialogueDB，其余用追加写日志的JSON库"""
+    if db_path.endswith(SQLITE_SUFFIXES):
+        from tools.sqlite_dialogue_db import SqliteDialogueDB
+        return SqliteDialogueDB(db_path)
+    return WalDialogueDB(db_path)
+
+DEFAULT_SESSION = "default"  # 未携带会话标识的请求共用的会话
+
 class DialogueManager:
-    def __init__(self, db_path: str = "dialogue_db.json"):
-        self.db = DialogueDB(db_path)  # 初始化数据库连接
-        self.current_dialogue_id = None  # 当前选中的对话ID
-    
+    """
+    对话管理：每个客户端会话（浏览器标签页/学生）拥有独立的“当前对话”游标，
+    写入同一对话时按对话加锁，保证并发请求的轮次不会写错对话或交错
+    """
+    def __init__(self, db_path: str = "dialogue_db.json", max_sessions: int = 4096):
+        self.db = open_dialogue_db(db_path)  # 初始化数据库连接
+        self.max_sessions = max_sessions  # 最多保留的会话游标数，超出后淘汰最久未使用的
+        self._sessions = OrderedDict()  # session_id -> DialogueSession
+        self._dialogue_locks = {}  # dialogue_id -> [Lock, 持有或等待的线程数]，无人使用时删除
+        self._lock = threading.Lock()
+
+    # (0) 会话与锁
+    def session(self, session_id: str = DEFAULT_SESSION) -> DialogueSession:
+        """获取（必要时创建）某个客户端会话的游标"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = DialogueSession(self.db)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    @contextmanager
+    def dialogue_lock(self, dialogue_id: str):
+        """同一对话的写入串行化；锁只在有线程持有或等待时保留，不随对话数量增长"""
+        with self._lock:
+            entry = self._dialogue_locks.get(dialogue_id)
+            if entry is None:
+                entry = self._dialogue_locks[dialogue_id] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._dialogue_locks[dialogue_id]
+
+    @property
+    def current_dialogue_id(self) -> Optional[str]:
+        """默认会话的当前对话ID（兼容旧用法）"""
+        return self.session().current_dialogue
+
+    @current_dialogue_id.setter
+    def current_dialogue_id(self, dialogue_id: Optional[str]):
+        self.session().current_dialogue = dialogue_id
+
     # (1) 对话选择功能
-    def create_dialogue(self, title: str = "") -> str:
+    def create_dialogue(self, title: str = "", session_id: str = DEFAULT_SESSION) -> str:
         """创建新对话并设为当前对话"""
-        self.current_dialogue_id = self.db.create_dialogue(title)
-        return self.current_dialogue_id
+        return self.session(session_id).create_new_dialogue(title)
     
-    def select_dialogue(self, dialogue_id: str) -> bool:
+    def select_dialogue(self, dialogue_id: str, session_id: str = DEFAULT_SESSION) -> bool:
         """选择现有对话"""
-        if dialogue_id in self.db.data["dialogues"]:
-            self.current_dialogue_id = dialogue_id
-            return True
-        return False
+        return self.session(session_id).set_dialogue(dialogue_id)
     
     # (2) 获取对话轮次
-    def get_current_turns(self) -> List[Dict]:
+    def get_current_turns(self, session_id: str = DEFAULT_SESSION) -> List[Dict]:
         """获取当前对话的所有轮次(时间顺序)"""
-        if not self.current_dialogue_id:
+        return self.session(session_id).get_current_dialogue_turns()
+
+    def get_turns(self, dialogue_id: str) -> List[Dict]:
+        """获取任意对话的轮次，不移动任何会话的游标"""
+        if not dialogue_id:
             return []
-        return self.db.get_turns_in_dialogue(self.current_dialogue_id)
+        return self.db.get_turns_in_dialogue(dialogue_id)
     
     # (3) 添加轮次
-    def add_turn(self, speaker: str, content: str, images: Optional[List[str]] = None) -> str:
+    def add_turn(self, speaker: str, content: str, images: Optional[List[str]] = None,
+                 session_id: str = DEFAULT_SESSION) -> str:
         """向当前对话添加轮次"""
-        if not self.current_dialogue_id:
+        dialogue_id = self.session(session_id).get_current_dialogue_id()
+        if not dialogue_id:
             raise ValueError("请先创建或选择对话")
-        return self.db.add_turn(self.current_dialogue_id, speaker, content, images or [])
+        with self.dialogue_lock(dialogue_id):
+            return self.db.add_turn(dialogue_id, speaker, content, images or [])
+
+    def add_turns(self, dialogue_id: str, turns: List[Dict]) -> List[str]:
+        """
+        向指定对话连续添加多个轮次（如一问一答），期间持有该对话的锁，
+        保证同一对话的并发请求不会交错写入
+        :param turns: 元素为 {speaker, content, images}
+        """
+        with self.dialogue_lock(dialogue_id):
+            return [
+                self.db.add_turn(dialogue_id, turn["speaker"], turn["content"], turn.get("images") or [])
+                for turn in turns
+            ]
     
     # (4) 获取所有对话 - 修正后的版本
     def get_all_dialogues(self) -> List[Dict]:
         """获取所有对话信息(按创建时间排序)"""
-        dialogues = []
-        for dialogue_id in self.db.data["indexes"]["dialogue_timestamps"]:
-            if dialogue_id in self.db.data["dialogues"]:
-                meta = self.db.data["dialogues"][dialogue_id]
-                dialogues.append({
-                    "id": dialogue_id,
-                    "title": meta["title"],
-                    "created_at": meta["created_at"],
-                    "updated_at": meta["updated_at"]
-                })
+        dialogues = self.db.get_dialogue_metadata()  # 从近到远
+        dialogues.reverse()
         return dialogues
     
     # 实用功能
@@ -335,11 +592,24 @@ class DialogueManager:
             if keyword.lower() in dialogue["title"].lower()
         ]
     
-    def delete_current_dialogue(self):
-        """删除当前对话"""
-        if self.current_dialogue_id:
-            self.db.delete_dialogue(self.current_dialogue_id)
-            self.current_dialogue_id = None
+    def delete_dialogue(self, dialogue_id: str) -> bool:
+        """删除对话，并清空所有以它为当前对话的会话游标；对话不存在时返回 False"""
+        if not dialogue_id or not self.db.has_dialogue(dialogue_id):
+            return False
+        with self.dialogue_lock(dialogue_id):
+            self.db.delete_dialogue(dialogue_id)
+        with self._lock:
+            for session in self._sessions.values():
+                if session.current_dialogue == dialogue_id:
+                    session.current_dialogue = None
+        return True
+
+    def delete_current_dialogue(self, session_id: str = DEFAULT_SESSION) -> Optional[str]:
+        """删除当前对话，返回被删除的对话ID"""
+        dialogue_id = self.session(session_id).get_current_dialogue_id()
+        if self.delete_dialogue(dialogue_id):
+            return dialogue_id
+        return None
 
     def update_title(self, dialogue_id,new_title):
-        self.db.update_dialogue_title(dialogue_id, new_title)
\ No newline at end of file
+        self.db.update_dialogue_title(dialogue_id, new_title)
@@ -0,0 +1,148 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+_CJK_RE = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+SUMMARY_PROMPT = (
+    "下面是一段师生对话的已有摘要和新增的对话轮次，请把它们合并成一份新的摘要，"
+    "保留学生的问题、关键结论、公式和尚未解决的疑问，不超过{limit}字：\n"
+    "【已有摘要】\n{summary}\n"
+    "【新增对话】\n{turns}"
+)
+SUMMARY_SYSTEM = "你是对话摘要助手，只输出合并后的摘要正文，不要回答对话中的问题，也不要添加额外说明。"
+MAX_SUMMARIES = 1024  # 最多缓存的对话摘要数，超出后淘汰最久未使用的
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计token数：中日韩字符约1个token，其余字符约4个字符1个token"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def format_turn(turn: Dict) -> Dict:
+    """数据库中的轮次 -> Bedrock messages 格式"""
+    return {'role': turn['speaker'], 'content': [{'type': 'text', 'text': turn['content']}]}
+
+class ConversationMemory:
+    """
+    按token预算装载对话记忆：
+    - 最近的轮次原样保留，直到用完预算
+    - 更早的轮次折叠进摘要；摘要按对话缓存，新轮次被挤出窗口时只增量合并这部分
+    - 每次摘要请求只合并不超过 budget_tokens - summary_tokens 的新轮次，轮次很多时分多次合并，请求大小有上限
+    """
+    def __init__(self, summarize: Callable[..., str], budget_tokens: int = 4000,
+                 summary_tokens: int = 800, min_recent_turns: int = 2, max_summaries: int = MAX_SUMMARIES):
+        self.summarize = summarize  # 生成摘要的函数，如 bedrock.invoke_model，需接受 overrides 参数
+        self.budget_tokens = budget_tokens  # 记忆部分的总预算（摘要 + 原文轮次）
+        self.summary_tokens = summary_tokens  # 为摘要预留的预算
+        self.min_recent_turns = min_recent_turns  # 至少原样保留的轮次数
+        self.max_summaries = max_summaries
+        self._summaries = OrderedDict()  # key -> (已折叠的轮次数, 最后一个折叠轮次的时间戳, 摘要)，按最近使用排序
+        self._lock = threading.Lock()
+
+    def _split_point(self, turns: List[Dict]) -> int:
+        """从后往前装入原文轮次，返回第一个原样保留轮次的下标"""
+        available = self.budget_tokens - self.summary_tokens
+        used = 0
+        split = len(turns)
+        for i in range(len(turns) - 1, -1, -1):
+            cost = estimate_tokens(turns[i]['content'])
+            kept = len(turns) - i - 1
+            if used + cost > available and kept >= self.min_recent_turns:
+                break
+            used += cost
+            split = i
+        # 摘要以 user/assistant 一问一答的形式插入，窗口需要从 user 轮次开始以保持角色交替
+        while 0 < split < len(turns) and turns[split]['speaker'] != 'user':
+            split += 1
+        return split
+
+    def _chunks(self, turns: List[Dict]) -> List[Tuple[int, str]]:
+        """
+        把待合并的轮次分成若干段，每段不超过 budget_tokens - summary_tokens（超长的单个轮次截断）
+        :return: [(本段轮次数, 本段文本)]
+        """
+        limit = max(self.budget_tokens - self.summary_tokens, 1)
+        chunks, lines, used = [], [], 0
+        for turn in turns:
+            line = f"{turn['speaker']}: {turn['content']}"
+            if estimate_tokens(line) > limit:
+                line = line[:limit]  # 每个字符至多计1个token
+            cost = estimate_tokens(line)
+            if lines and used + cost > limit:
+                chunks.append((len(lines), '\n'.join(lines)))
+                lines, used = [], 0
+            lines.append(line)
+            used += cost
+        if lines:
+            chunks.append((len(lines), '\n'.join(lines)))
+        return chunks
+
+    def _store(self, key: str, entry: Tuple[int, str, str]):
+        with self._lock:
+            self._summaries[key] = entry
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.max_summaries:
+                self._summaries.popitem(last=False)
+
+    def _summary_for(self, key: str, folded: List[Dict]) -> str:
+        """获取（必要时增量更新）前 len(folded) 个轮次的摘要"""
+        if not folded:
+            return ''
+        fingerprint = folded[-1].get('timestamp')
+        with self._lock:
+            cached = self._summaries.get(key)
+            if cached:
+                self._summaries.move_to_end(key)
+
+        summary, start = '', 0
+        if cached:
+            count, cached_fingerprint, cached_summary = cached
+            if count == len(folded) and cached_fingerprint == fingerprint:
+                return cached_summary
+            if count < len(folded) and folded[count - 1].get('timestamp') == cached_fingerprint:
+                summary, start = cached_summary, count  # 只合并新挤出窗口的轮次
+
+        overrides = {'system': SUMMARY_SYSTEM, 'max_tokens': self.summary_tokens}
+        for count, chunk in self._chunks(folded[start:]):
+            summary = self.summarize(SUMMARY_PROMPT.format(
+                limit=self.summary_tokens, summary=summary or '（无）', turns=chunk
+            ), overrides=overrides).strip()
+            start += count
+            self._store(key, (start, folded[start - 1].get('timestamp'), summary))  # 逐段缓存，中途失败时已合并的部分不必重做
+        return summary
+
+    def build(self, key: str, turns: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """
+        :param key: 缓存键（当前对话ID，若引用了其他对话则为 "引用对话ID+当前对话ID"）
+        :param turns: 按时间顺序排列的全部轮次
+        :return: (Bedrock messages 列表, token用量统计)
+        """
+        split = self._split_point(turns)
+        summary = self._summary_for(key, turns[:split])
+
+        messages = []
+        if summary:
+            messages.append({'role': 'user', 'content': [{'type': 'text', 'text': f"以下是我们此前对话的摘要：\n{summary}"}]})
+            messages.append({'role': 'assistant', 'content': [{'type': 'text', 'text': "好的，我会结合这些背景继续回答。"}]})
+        messages += [format_turn(turn) for turn in turns[split:]]
+
+        summary_tokens = estimate_tokens(summary)
+        recent_tokens = sum(estimate_tokens(turn['content']) for turn in turns[split:])
+        usage = {
+            'budget_tokens': self.budget_tokens,
+            'memory_tokens': summary_tokens + recent_tokens,
+            'summary_tokens': summary_tokens,
+            'recent_tokens': recent_tokens,
+            'folded_turns': split,
+            'recent_turns': len(turns) - split,
+        }
+        return messages, usage
+
+    def forget(self, dialogue_id: str):
+        """对话被删除时丢弃与它相关的摘要缓存：缓存键为 "引用对话ID+当前对话ID"，任一部分匹配即丢弃"""
+        with self._lock:
+            for key in [key for key in self._summaries if dialogue_id in key.split('+')]:
+                del self._summaries[key]
@@ -0,0 +1,84 @@
+import base64
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Dict, List
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+IMAGE_URL = '/api/image/{blob}'  # 按摘要读取图片的接口地址
+
+# 常见图片格式的文件头，用于在读取时推断 media_type
+_MAGIC_NUMBERS = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+class ImageBlobStore:
+    """
+    内容寻址的图片存储：图片按sha256去重后只在磁盘上保存一份，
+    对话轮次中只记录引用 {media_type, blob}，需要时再按摘要流式读取
+    """
+    def __init__(self, root: str = "./tools/image_blobs"):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest: str) -> Path:
+        """摘要对应的文件路径（按前两位分目录，避免单目录文件过多）"""
+        if not _DIGEST_RE.match(digest):
+            raise ValueError(f"非法的图片摘要: {digest}")
+        return self.root / digest[:2] / digest
+
+    def exists(self, digest: str) -> bool:
+        try:
+            return self.path(digest).is_file()
+        except ValueError:
+            return False
+
+    def put_bytes(self, data: bytes) -> str:
+        """保存二进制图片，返回摘要；已存在的图片不会重复写入"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_name(f"{digest}.{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)  # 原子替换，并发写入同一图片也安全
+        return digest
+
+    def put(self, image: Dict) -> Dict:
+        """
+        保存前端上传的图片 {media_type, data(base64)}，返回引用 {media_type, blob}
+        已经是引用的图片原样返回
+        """
+        if 'blob' in image:
+            return image
+        base64_str = image['data']
+        if ',' in base64_str:  # 移除前缀信息（如 data:image/png;base64,）
+            base64_str = base64_str.split(',', 1)[1]
+        digest = self.put_bytes(base64.b64decode(base64_str))
+        return {'media_type': image.get('media_type', 'image/jpeg'), 'blob': digest}
+
+    def put_all(self, images: List[Dict]) -> List[Dict]:
+        return [self.put(image) for image in images or []]
+
+    def media_type(self, digest: str) -> str:
+        """根据文件头推断图片类型"""
+        with open(self.path(digest), 'rb') as f:
+            head = f.read(12)
+        for magic, media_type in _MAGIC_NUMBERS:
+            if head.startswith(magic):
+                return media_type
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            return 'image/webp'
+        return 'application/octet-stream'
+
+def with_image_urls(turns: List[Dict]) -> List[Dict]:
+    """轮次中的图片引用附上读取地址，由前端按需加载；旧数据中内联的 base64 图片原样返回"""
+    return [{**turn, 'images': [
+        {**image, 'url': IMAGE_URL.format(blob=image['blob'])} if 'blob' in image else image
+        for image in turn.get('images', [])
+    ]} for turn in turns]
@@ -0,0 +1,150 @@
+"""
+推理后端基准：比较 torch / onnx / onnx-int8 三种后端下嵌入与重排的延迟和召回
+
+以 torch 后端的结果为基准：
+- 嵌入：单条查询延迟分位数、批量入库吞吐、与基准向量的平均余弦相似度，
+        以及在同一语料上检索 top-k 与基准 top-k 的重合率（recall@k）
+- 重排：每个查询对基准检索出的候选重排的延迟分位数，以及重排后 top-k 与基准的重合率
+
+语料取自 text_chunks.json 的随机样本；查询可以用 --queries 指定（每行一条），默认取样本文本块的开头
+    python -m tools.inference_benchmark --backends torch,onnx-int8 --corpus 2000 --queries-count 100
+    python -m tools.inference_benchmark --skip-rerank --threads 8
+"""
+import argparse
+import gc
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+
+from RAG_Package.inference_backend import BACKENDS, INFERENCE_THREADS, check_backend, load_embedder
+
+EMBED_MODEL = './local_models/bge-m3'
+RERANK_MODEL = './local_models/bge-reranker-large'
+CHUNKS_PATH = './JsonDataBase/text_chunks.json'
+
+
+def quantile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else (values[0] if values else 0)
+
+
+def load_samples(corpus_size: int, queries_path: str, query_count: int, seed: int):
+    chunks = [c for c in json.loads(Path(CHUNKS_PATH).read_text(encoding='utf-8')) if c.get('text', '').strip()]
+    random.Random(seed).shuffle(chunks)
+    corpus = chunks[:corpus_size]
+    if queries_path:
+        queries = [line.strip() for line in Path(queries_path).read_text(encoding='utf-8').splitlines() if line.strip()]
+    else:
+        queries = [c['text'].strip()[:40] for c in corpus[:query_count]]
+    return corpus, queries[:query_count]
+
+
+def top_k(query_vectors, corpus_vectors, k: int):
+    scores = np.asarray(query_vectors) @ np.asarray(corpus_vectors).T
+    return [list(row) for row in np.argsort(-scores, axis=1)[:, :k]]
+
+
+def overlap(results, reference, k: int) -> float:
+    return float(np.mean([len(set(a[:k]) & set(b[:k])) / k for a, b in zip(results, reference)]))
+
+
+def bench_embedding(backend: str, corpus, queries, threads: int, batch_size: int):
+    embedder = load_embedder(EMBED_MODEL, backend=backend, threads=threads, embed_batch_size=batch_size)
+    embedder.get_text_embedding('预热')
+
+    latencies = []
+    query_vectors = []
+    for query in queries:
+        start = time.perf_counter()
+        query_vectors.append(embedder.get_text_embedding(query))
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    corpus_vectors = embedder.get_text_embedding_batch([c['text'] for c in corpus])
+    elapsed = time.perf_counter() - start
+
+    del embedder
+    gc.collect()
+    return {
+        'latencies': latencies,
+        'throughput': len(corpus) / elapsed,
+        'query_vectors': np.asarray(query_vectors, dtype=np.float32),
+        'corpus_vectors': np.asarray(corpus_vectors, dtype=np.float32),
+    }
+
+
+def bench_rerank(backend: str, queries, candidates, threads: int, k: int):
+    from RAG_Package.Reranker import MilvusReranker
+    reranker = MilvusReranker(model_name=RERANK_MODEL, backend=backend, threads=threads)
+    reranker(query='预热', retrieved_documents=candidates[0][:2])
+
+    latencies, rankings = [], []
+    for query, docs in zip(queries, candidates):
+        start = time.perf_counter()
+        reranked = reranker(query=query, retrieved_documents=docs, top_k=k)
+        latencies.append(time.perf_counter() - start)
+        rankings.append([doc['metadata']['id'] for doc in reranked])
+
+    del reranker
+    gc.collect()
+    return {'latencies': latencies, 'rankings': rankings}
+
+
+def main(backends, corpus_size: int, queries_path: str, query_count: int, k: int, rerank_candidates: int,
+         threads: int, batch_size: int, skip_rerank: bool, seed: int):
+    for backend in backends:
+        check_backend(backend)
+    if 'torch' not in backends:
+        backends = ['torch'] + backends  # torch 结果作为召回基准
+
+    corpus, queries = load_samples(corpus_size, queries_path, query_count, seed)
+    print(f"📚 语料 {len(corpus)} 条，查询 {len(queries)} 条，线程 {threads}，recall@{k}")
+
+    embed_results = {backend: bench_embedding(backend, corpus, queries, threads, batch_size) for backend in backends}
+    reference = embed_results['torch']
+    reference_top = top_k(reference['query_vectors'], reference['corpus_vectors'], max(k, rerank_candidates))
+
+    print("\n🔎 嵌入")
+    for backend, result in embed_results.items():
+        cosine = float(np.mean(np.sum(result['corpus_vectors'] * reference['corpus_vectors'], axis=1)))
+        recall = overlap(top_k(result['query_vectors'], result['corpus_vectors'], k), reference_top, k)
+        print(f"   {backend:<10} 单条 p50={quantile(result['latencies'], 50) * 1000:.1f}ms "
+              f"p95={quantile(result['latencies'], 95) * 1000:.1f}ms  "
+              f"批量 {result['throughput']:.1f} 条/s  余弦={cosine:.4f}  recall@{k}={recall:.3f}")
+
+    if skip_rerank:
+        return
+
+    candidates = [
+        [{'text': corpus[i]['text'], 'id': str(i), 'partition': corpus[i]['metadata'].get('file_name'),
+          'metadata': corpus[i]['metadata']} for i in row[:rerank_candidates]]
+        for row in reference_top
+    ]
+    rerank_results = {backend: bench_rerank(backend, queries, candidates, threads, k) for backend in backends}
+    reference_rank = rerank_results['torch']['rankings']
+
+    print(f"\n🏅 重排（每个查询 {rerank_candidates} 个候选）")
+    for backend, result in rerank_results.items():
+        print(f"   {backend:<10} p50={quantile(result['latencies'], 50) * 1000:.1f}ms "
+              f"p95={quantile(result['latencies'], 95) * 1000:.1f}ms  "
+              f"top{k}重合率={overlap(result['rankings'], reference_rank, k):.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='嵌入/重排推理后端基准')
+    parser.add_argument('--backends', default=','.join(BACKENDS), help='逗号分隔，torch 始终作为基准参与')
+    parser.add_argument('--corpus', type=int, default=2000, help='语料样本数')
+    parser.add_argument('--queries', default=None, help='查询文件，每行一条')
+    parser.add_argument('--queries-count', type=int, default=100)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--rerank-candidates', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=INFERENCE_THREADS)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--skip-rerank', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    main([b.strip() for b in args.backends.split(',') if b.strip()], args.corpus, args.queries, args.queries_count,
+         args.k, args.rerank_candidates, args.threads, args.batch_size, args.skip_rerank, args.seed)
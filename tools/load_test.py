@@ -0,0 +1,156 @@
+"""
+压测工具：用本地桩（stub）替换 Bedrock，比较同步（Flask）与异步（ASGI）两种服务模式的吞吐
+
+1. 启动被测服务（使用临时数据库，Bedrock调用被替换为固定延迟的桩）：
+   python -m tools.load_test serve --mode wsgi --port 5001
+   python -m tools.load_test serve --mode asgi --port 5002
+2. 施压并输出吞吐与延迟分位数：
+   python -m tools.load_test run --url http://127.0.0.1:5001 --endpoint submit --concurrency 32 --requests 256
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StubBedrockRuntime:
+    """
+    模拟 bedrock-runtime 客户端：按固定延迟返回 Claude 3 格式的响应，
+    流式接口按句子切片逐块返回
+    """
+    def __init__(self, first_token_delay: float = 0.3, chunk_delay: float = 0.05, chunks: int = 10):
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.text = "这是压测桩返回的一句话。"
+
+    def invoke_model(self, body, modelId, accept, contentType):
+        time.sleep(self.first_token_delay + self.chunk_delay * self.chunks)
+        payload = {
+            'content': [{'type': 'text', 'text': self.text * self.chunks}],
+            'usage': {'input_tokens': len(body) // 4, 'output_tokens': 16 * self.chunks},
+        }
+        return {'body': io.BytesIO(json.dumps(payload).encode())}
+
+    def invoke_model_with_response_stream(self, body, modelId, accept, contentType):
+        def events():
+            time.sleep(self.first_token_delay)
+            for _ in range(self.chunks):
+                time.sleep(self.chunk_delay)
+                chunk = {'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': self.text}}
+                yield {'chunk': {'bytes': json.dumps(chunk).encode()}}
+        return {'body': events()}
+
+
+def serve(mode: str, host: str, port: int, stub: StubBedrockRuntime):
+    # 数据库指向临时文件，避免压测数据写进真实对话库
+    os.environ.setdefault('NEXT_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='next_load_'), 'load_db.json'))
+
+    import AWS_Service.BedrockWrapper as bedrock_wrapper
+    bedrock_wrapper.bedrock_runtime = stub
+
+    if mode == 'wsgi':
+        from main import app
+        app.run(host=host, port=port, threaded=True)
+    else:
+        import asyncio
+        from hypercorn.asyncio import serve as hypercorn_serve
+        from hypercorn.config import Config
+        from asgi_main import app
+        config = Config()
+        config.bind = [f"{host}:{port}"]
+        asyncio.run(hypercorn_serve(app, config))
+
+
+def _post(url: str, payload: dict, session: str, stream: bool = False):
+    """发送一次POST请求，返回 (首字节延迟, 总延迟)"""
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), method='POST',
+        headers={'Content-Type': 'application/json', 'X-Session-Id': session}
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=120) as response:
+        first = None
+        if stream:
+            for line in response:
+                if first is None and line.startswith(b'data: {"text"'):
+                    first = time.perf_counter() - start
+        else:
+            response.read()
+    total = time.perf_counter() - start
+    return (first if first is not None else total), total
+
+
+def run(url: str, endpoint: str, concurrency: int, requests: int):
+    url = url.rstrip('/')
+    stream = endpoint == 'submit_stream'
+    latencies, first_bytes, errors = [], [], []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker(index: int):
+        session = f"load-{index}"
+        _post(f"{url}/api/create_dialogue", {'title': session}, session)
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            try:
+                first, total = _post(f"{url}/api/{endpoint}",
+                                     {'text': '请介绍一下卷积神经网络', 'images': [], 'reference_id': None},
+                                     session, stream)
+                with lock:
+                    first_bytes.append(first)
+                    latencies.append(total)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    def quantile(values, q):
+        return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else (values[0] if values else 0)
+
+    print(f"📊 {endpoint} @ {url}  并发={concurrency}  请求={requests}")
+    print(f"   吞吐: {len(latencies) / elapsed:.2f} req/s  耗时: {elapsed:.2f}s  失败: {len(errors)}")
+    if latencies:
+        print(f"   总延迟  p50={quantile(latencies, 50):.3f}s  p95={quantile(latencies, 95):.3f}s  p99={quantile(latencies, 99):.3f}s")
+    if stream and first_bytes:
+        print(f"   首句延迟 p50={quantile(first_bytes, 50):.3f}s  p95={quantile(first_bytes, 95):.3f}s")
+    for error in errors[:5]:
+        print(f"   ❌ {error}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='NeXT 服务压测工具')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = sub.add_parser('serve', help='以桩Bedrock启动被测服务')
+    serve_parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='wsgi')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=5001)
+    serve_parser.add_argument('--first-token-delay', type=float, default=0.3)
+    serve_parser.add_argument('--chunk-delay', type=float, default=0.05)
+    serve_parser.add_argument('--chunks', type=int, default=10)
+
+    run_parser = sub.add_parser('run', help='对服务施压')
+    run_parser.add_argument('--url', default='http://127.0.0.1:5001')
+    run_parser.add_argument('--endpoint', choices=['submit', 'submit_stream'], default='submit')
+    run_parser.add_argument('--concurrency', type=int, default=16)
+    run_parser.add_argument('--requests', type=int, default=128)
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args.mode, args.host, args.port,
+              StubBedrockRuntime(args.first_token_delay, args.chunk_delay, args.chunks))
+    else:
+        run(args.url, args.endpoint, args.concurrency, args.requests)
@@ -0,0 +1,201 @@
+import json
+import sqlite3
+import sys
+import threading
+import uuid
+import datetime
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dialogues (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,  -- 创建顺序
+    id         TEXT NOT NULL UNIQUE,
+    title      TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_dialogues_title ON dialogues(title);
+
+CREATE TABLE IF NOT EXISTS turns (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,  -- 同一时间戳下的插入顺序
+    id          TEXT NOT NULL UNIQUE,
+    dialogue_id TEXT NOT NULL REFERENCES dialogues(id) ON DELETE CASCADE,
+    speaker     TEXT NOT NULL,
+    content     TEXT NOT NULL,
+    images      TEXT NOT NULL DEFAULT '[]',  -- JSON数组
+    timestamp   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_turns_dialogue_time ON turns(dialogue_id, timestamp, seq);
+"""
+
+class SqliteDialogueDB:
+    """
+    基于SQLite的对话数据库，与DialogueDB提供相同的方法
+    每个线程使用独立连接，开启WAL日志模式，可被多个工作进程共享同一个数据库文件
+    """
+    def __init__(self, file_path: str = "dialogue_db.sqlite3"):
+        self.file_path = file_path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（懒创建）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.file_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _generate_id(self) -> str:
+        """Generate a standardized UUID-based ID with timestamp prefix"""
+        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        unique_id = uuid.uuid4().hex[:8]  # First 8 chars of UUID
+        return f"{timestamp}_{unique_id}"
+
+    def has_dialogue(self, dialogue_id: str) -> bool:
+        """对话是否存在"""
+        row = self._conn().execute(
+            "SELECT 1 FROM dialogues WHERE id = ?", (dialogue_id,)
+        ).fetchone()
+        return row is not None
+
+    def create_dialogue(self, title: str = "") -> str:
+        """创建新对话"""
+        dialogue_id = self._generate_id()
+        now = datetime.datetime.now().isoformat()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO dialogues (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (dialogue_id, title, now, now)
+            )
+        return dialogue_id
+
+    def add_turn(self, dialogue_id: str, speaker: str, content: str, images: List[str] = None) -> str:
+        """添加对话轮次"""
+        if not self.has_dialogue(dialogue_id):
+            raise ValueError(f"对话 {dialogue_id} 不存在")
+
+        turn_id = self._generate_id()
+        now = datetime.datetime.now().isoformat()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO turns (id, dialogue_id, speaker, content, images, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                (turn_id, dialogue_id, speaker, content, json.dumps(images or []), now)
+            )
+            conn.execute("UPDATE dialogues SET updated_at = ? WHERE id = ?", (now, dialogue_id))
+        return turn_id
+
+    def get_dialogue_metadata(self) -> List[Dict[str, str]]:
+        """Get all dialogues' metadata in reverse chronological order"""
+        rows = self._conn().execute(
+            "SELECT id, title, created_at, updated_at FROM dialogues ORDER BY seq DESC"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_turns_in_dialogue(self, dialogue_id: str) -> List[Dict]:
+        """Get all turns in a dialogue in chronological order"""
+        rows = self._conn().execute(
+            "SELECT dialogue_id, speaker, content, images, timestamp FROM turns "
+            "WHERE dialogue_id = ? ORDER BY timestamp, seq",
+            (dialogue_id,)
+        ).fetchall()
+        turns = []
+        for row in rows:
+            turn = dict(row)
+            turn["images"] = json.loads(turn["images"])
+            turns.append(turn)
+        return turns
+
+    def search_dialogues_by_title(self, title_query: str) -> List[Dict[str, str]]:
+        """Search dialogues by title (case-insensitive partial match)"""
+        pattern = "%" + title_query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        rows = self._conn().execute(
+            "SELECT id, title, created_at FROM dialogues "
+            "WHERE title != '' AND title LIKE ? ESCAPE '\\' ORDER BY seq",
+            (pattern,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_dialogue(self, dialogue_id: str):
+        """Delete a dialogue and all its turns"""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM dialogues WHERE id = ?", (dialogue_id,))  # turns 级联删除
+
+    def delete_turn(self, turn_id: str):
+        """Delete a specific turn"""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM turns WHERE id = ?", (turn_id,))
+
+    def update_dialogue_title(self, dialogue_id: str, new_title: str) -> bool:
+        """Update the title of a dialogue.
+
+        Returns:
+            bool: True if the update was successful, False if the dialogue wasn't found
+        """
+        now = datetime.datetime.now().isoformat()
+        with self._conn() as conn:
+            cur = conn.execute(
+                "UPDATE dialogues SET title = ?, updated_at = ? WHERE id = ?",
+                (new_title, now, dialogue_id)
+            )
+        return cur.rowcount > 0
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def migrate_json_to_sqlite(json_path: str, sqlite_path: str) -> SqliteDialogueDB:
+    """
+    一次性迁移：把JSON布局（dialogues / turns / indexes）的数据库导入SQLite
+    保留原有的对话ID、轮次ID、时间戳和顺序；重复执行时已存在的记录会被跳过
+    源文件只读打开（不会被创建或改写），不存在或损坏时抛出异常
+    """
+    from tools.dialogue_database import WalDialogueDB
+
+    source = WalDialogueDB(json_path, read_only=True)  # 同时重放可能存在的 .wal 日志
+    data = source.data
+    source.close()
+
+    target = SqliteDialogueDB(sqlite_path)
+    dialogue_count, turn_count = 0, 0
+    with target._conn() as conn:
+        for dialogue_id in data["indexes"]["dialogue_timestamps"]:
+            meta = data["dialogues"].get(dialogue_id)
+            if meta is None:
+                continue
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO dialogues (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (dialogue_id, meta["title"], meta["created_at"], meta["updated_at"])
+            )
+            dialogue_count += cur.rowcount
+
+            for turn_id in data["indexes"]["dialogue_turns"].get(dialogue_id, []):
+                turn = data["turns"].get(turn_id)
+                if turn is None:
+                    continue
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO turns (id, dialogue_id, speaker, content, images, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                    (turn_id, dialogue_id, turn["speaker"], turn["content"],
+                     json.dumps(turn.get("images", [])), turn["timestamp"])
+                )
+                turn_count += cur.rowcount
+
+    print(f"✅ 已迁移 {dialogue_count} 个对话，{turn_count} 个轮次到 {sqlite_path}")
+    return target
+
+
+if __name__ == "__main__":
+    # 用法: python -m tools.sqlite_dialogue_db ./tools/test_db.json ./tools/test_db.sqlite3
+    if len(sys.argv) != 3:
+        print("用法: python -m tools.sqlite_dialogue_db <源JSON路径> <目标SQLite路径>")
+        sys.exit(1)
+    migrate_json_to_sqlite(sys.argv[1], sys.argv[2])